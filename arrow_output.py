@@ -0,0 +1,118 @@
+import os
+from itertools import product
+import pyarrow as pa
+from localization import MOON_PHASE_NAMES, SOLAR_MARKER_NAMES
+from astronomy.lunar_phases import alignment_name
+
+BATCH_ROWS = 1 << 16
+
+FORMATS = ("parquet", "arrow", "feather")
+
+MAX_DICTIONARY = 1 << 10 # name columns with more possible values are written as plain strings
+
+def alignment_names(moon_names : tuple[str, ...]) -> list[str]:
+    """Every value Moon_Phases_Aligned can take with these moons, "" first."""
+    names = {""}
+    for syzygies in product((None, "new", "full"), repeat=len(moon_names)):
+        new = sum(1 << i for i, s in enumerate(syzygies) if s == "new")
+        full = sum(1 << i for i, s in enumerate(syzygies) if s == "full")
+        names.add(alignment_name(moon_names, new, full))
+    return sorted(names)
+
+def name_columns(calendar_spec) -> dict[str, list[str]]:
+    """Every value each name column of a calendar_spec.CalendarSpec's calendar can take, so each column keeps one dictionary across batches."""
+    registry = calendar_spec.registry
+    columns = {f"{moon.key}_Phase_Name": list(MOON_PHASE_NAMES.values()) for moon in registry.moons}
+    if len(registry.moons) >= 2 and 3 ** len(registry.enabled) <= MAX_DICTIONARY:
+        columns["Moon_Phases_Aligned"] = alignment_names(tuple(moon.name for moon in registry.enabled))
+    columns["Solar_Marker"] = [""] + list(SOLAR_MARKER_NAMES.values())
+    solar_calendar = calendar_spec.solar_calendar
+    columns["Solar_Month"] = [str(name) for name in solar_calendar.month_names[False]] + [solar_calendar.leap_month_name, "None"]
+    columns["Lunisolar_Month"] = list(calendar_spec.lunisolar.month_names)
+    for calendar in registry.calendars():
+        columns[f"{calendar.name}_Month"] = calendar.month_names
+    return columns
+
+def column_type(header : str, names : dict[str, list[str]]):
+    if header in names:
+        return pa.dictionary(pa.int16(), pa.string())
+    if header.endswith("_Raw") or header.endswith("_Time"):
+        return pa.float64()
+    if header in ("User_Defined_Events", "Moon_Phases_Aligned"):
+        return pa.string()
+    return pa.int64() # Day, *_Year, *_Month_#, *_Day
+
+def schema_for(headers : list[str], names : dict[str, list[str]]) -> pa.Schema:
+    return pa.schema([pa.field(h, column_type(h, names)) for h in headers])
+
+def open_writer(path : str, output_format : str, schema : pa.Schema):
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        return pq.ParquetWriter(path, schema)
+    if output_format == "arrow":
+        return pa.ipc.new_file(path, schema)
+    if output_format == "feather":
+        # Feather v2 is the Arrow IPC file format, compressed
+        return pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression="lz4"))
+    raise ValueError(f"Unknown output format: {output_format}")
+
+class BatchWriter:
+    """Collects typed rows and writes them as record batches of at most batch_rows rows. names are the name columns (see name_columns)."""
+    def __init__(self, path : str, output_format : str, headers : list[str], names : dict[str, list[str]], batch_rows : int = BATCH_ROWS):
+        self.headers = headers
+        self.schema = schema_for(headers, names)
+        self.batch_rows = batch_rows
+        self.columns = {h: [] for h in headers}
+        self.rows = 0
+        self.names = names
+        self.dictionaries = {h: pa.array(values, pa.string()) for h, values in names.items()}
+        self.indices = {h: {name: i for i, name in enumerate(values)} for h, values in names.items()}
+        self.writer = open_writer(path, output_format, self.schema)
+
+    def write_row(self, row : dict):
+        for h in self.headers:
+            self.columns[h].append(row.get(h))
+        self.rows += 1
+        if self.rows >= self.batch_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        arrays = []
+        for field in self.schema:
+            values = self.columns[field.name]
+            if field.name in self.names:
+                index = self.indices[field.name]
+                indices = pa.array([None if v is None else index[v] for v in values], pa.int16())
+                arrays.append(pa.DictionaryArray.from_arrays(indices, self.dictionaries[field.name]))
+            else:
+                arrays.append(pa.array(values, field.type))
+        self.writer.write_batch(pa.record_batch(arrays, schema=self.schema))
+        self.columns = {h: [] for h in self.headers}
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+def merge_files(paths, output_file : str, output_format : str):
+    """Concatenate files written by BatchWriter (consumed lazily, in order) into one, removing them."""
+    writer = None
+    for path in paths:
+        if output_format == "parquet":
+            import pyarrow.parquet as pq
+            source = pq.ParquetFile(path)
+            batches = source.iter_batches(batch_size=BATCH_ROWS)
+            schema = source.schema_arrow
+        else:
+            source = pa.ipc.open_file(path)
+            batches = (source.get_batch(i) for i in range(source.num_record_batches))
+            schema = source.schema
+        if writer is None:
+            writer = open_writer(output_file, output_format, schema)
+        for batch in batches:
+            writer.write_batch(batch)
+        os.remove(path)
+    if writer is not None:
+        writer.close()
@@ -1,21 +1,136 @@
-class Moon:
-    def __init__(self, synodic_month : float = 29.53):
-        self.synodic_month = synodic_month
+from astronomy.core_math import phase, accumulated_phase, rational_period
+
+class Body:
+    """
+    A body whose phase advances 1/period every day. The phase is kept as the exact remainder
+    of ticks * denominator by the period's numerator (see core_math.rational_period), so it
+    only depends on how many days have been ticked. legacy=True accumulates the float phase
+    day by day instead, as the calendar always did, drifting slightly over long runs.
+    """
+    def __init__(self, period : float, legacy : bool = False):
+        self.legacy = legacy
+        self.num, self.den = rational_period(period)
+        self.remainder = 0 # ticks * den mod num
         self.phase = 0
         self.prev_phase = 0
 
     def tick_day(self):
         self.prev_phase = self.phase
-        per_day_tick = 1 / self.synodic_month
-        self.phase = (self.phase + per_day_tick) % 1.0
+        if self.legacy:
+            self.phase = accumulated_phase(self.phase, self.period)
+            return
+        self.remainder = (self.remainder + self.den) % self.num
+        self.phase = self.remainder / self.num
+
+    def next_phase(self):
+        """The phase the next tick_day() will move to."""
+        if self.legacy:
+            return accumulated_phase(self.phase, self.period)
+        return (self.remainder + self.den) % self.num / self.num
+
+    def seek(self, day : int):
+        """Jump to the phase the body has after ticking through `day`."""
+        self.remainder = (day + 1) * self.den % self.num
+        self.prev_phase = phase(day, self.period)
+        self.phase = phase(day + 1, self.period)
+
+class Moon(Body):
+    def __init__(self, synodic_month : float = 29.53, legacy : bool = False):
+        self.synodic_month = synodic_month
+        super().__init__(synodic_month, legacy)
+
+    @property
+    def period(self):
+        return self.synodic_month
 
-class Sun:
-    def __init__(self, solar_year : float = 365.24):
+class Sun(Body):
+    def __init__(self, solar_year : float = 365.24, legacy : bool = False):
         self.solar_year = solar_year
-        self.phase = 0
-        self.prev_phase = 0
+        super().__init__(solar_year, legacy)
+
+    @property
+    def period(self):
+        return self.solar_year
+
+class MoonSet:
+    """
+    Any number of moons, their exact remainders and phases held side by side in lists and
+    advanced together, so a tick is one pass over the moons whatever their number. Phases are
+    bit-identical to ticking a Moon per period. moons[i] is a Moon-like view of one of them,
+    for the calendars that follow a single moon.
+    """
+    def __init__(self, synodic_months : list[float], legacy : bool = False):
+        self.synodic_months = list(synodic_months)
+        self.legacy = legacy
+        rationals = [rational_period(period) for period in self.synodic_months]
+        self.nums = [num for num, _ in rationals]
+        self.dens = [den for _, den in rationals]
+        self.remainders = [0] * len(rationals)
+        self.phases = [0] * len(rationals)
+        self.prev_phases = [0] * len(rationals)
+        self.views = [MoonView(self, i) for i in range(len(rationals))]
+
+    def __len__(self):
+        return len(self.views)
+
+    def __getitem__(self, i : int) -> "MoonView":
+        return self.views[i]
 
     def tick_day(self):
-        self.prev_phase = self.phase
-        per_day_tick = 1 / self.solar_year
-        self.phase = (self.phase + per_day_tick) % 1.0
+        self.prev_phases = self.phases
+        if self.legacy:
+            self.phases = [accumulated_phase(p, period) for p, period in zip(self.phases, self.synodic_months)]
+            return
+        self.remainders = [(r + den) % num for r, den, num in zip(self.remainders, self.dens, self.nums)]
+        self.phases = [r / num for r, num in zip(self.remainders, self.nums)]
+
+    def seek(self, day : int):
+        """Jump to the phases the moons have after ticking through `day`."""
+        self.remainders = [(day + 1) * den % num for den, num in zip(self.dens, self.nums)]
+        self.prev_phases = [phase(day, period) for period in self.synodic_months]
+        self.phases = [phase(day + 1, period) for period in self.synodic_months]
+
+class MoonView:
+    """One moon of a MoonSet, read like a Moon."""
+    __slots__ = ("moons", "index")
+
+    def __init__(self, moons : MoonSet, index : int):
+        self.moons = moons
+        self.index = index
+
+    @property
+    def synodic_month(self):
+        return self.moons.synodic_months[self.index]
+
+    period = synodic_month
+
+    @property
+    def legacy(self):
+        return self.moons.legacy
+
+    @property
+    def num(self):
+        return self.moons.nums[self.index]
+
+    @property
+    def den(self):
+        return self.moons.dens[self.index]
+
+    @property
+    def remainder(self):
+        return self.moons.remainders[self.index]
+
+    @property
+    def phase(self):
+        return self.moons.phases[self.index]
+
+    @property
+    def prev_phase(self):
+        return self.moons.prev_phases[self.index]
+
+    def next_phase(self):
+        """The phase the next tick_day() will move to."""
+        moons, i = self.moons, self.index
+        if moons.legacy:
+            return accumulated_phase(moons.phases[i], moons.synodic_months[i])
+        return (moons.remainders[i] + moons.dens[i]) % moons.nums[i] / moons.nums[i]
@@ -1,6 +1,30 @@
+import math
+from fractions import Fraction
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def rational_period(period : float) -> tuple[int, int]:
+    """
+    A period as the exact fraction (numerator, denominator) its decimal form spells, e.g. 29.51 -> (2951, 100).
+    Phases are then exact: the phase on day d is (d * denominator mod numerator) / numerator.
+    """
+    f = Fraction(repr(float(period)))
+    return f.numerator, f.denominator
+
+@lru_cache(maxsize=None)
+def rational_target(target : float) -> tuple[int, int]:
+    """A target phase as an exact fraction (numerator, denominator)."""
+    t = Fraction(target)
+    return t.numerator, t.denominator
+
 def phase(day : int, period : float):
-    """Raw phase in [0,1)."""
-    return (day / period) % 1.0
+    """Raw phase in [0,1) after `day` ticks. Exact, so the same day always gives the same float."""
+    num, den = rational_period(period)
+    return (day * den % num) / num
+
+def accumulated_phase(phase : float, period : float):
+    """The legacy daily step: the float phase one tick later, drifting a little every day."""
+    return (phase + 1 / period) % 1.0
 
 def phase_crossed(prev : float, curr : float, target : float):
     """
@@ -11,4 +35,36 @@ def phase_crossed(prev : float, curr : float, target : float):
         return prev < target <= curr
     else:
         # wraparound (e.g. 0.95 -> 0.02)
-        return prev < target or target <= curr
\ No newline at end of file
+        return prev < target or target <= curr
+
+def crossings(ticks : int, period : float, target : float, steps : int = 1):
+    """
+    Number of times a body that has ticked `ticks` days (or steps of 1/steps of a day) has crossed target.
+    Closed form of counting phase_crossed(phase(d), phase(d + 1), target) over d < ticks, in exact integers.
+    """
+    num, den = rational_period(period)
+    tn, td = rational_target(target)
+    return (ticks * den * td - tn * num * steps) // (num * td * steps) - (-tn) // td
+
+def crossing_time(ticks : int, period : float, target : float, steps : int = 1) -> float:
+    """
+    Exact instant of the latest crossing of target at or before `ticks` days (or steps of 1/steps of
+    a day), in fractional days on the scale of event_search.Crossing.time: day d runs from d - 1 to d.
+    """
+    num, den = rational_period(period)
+    tn, td = rational_target(target)
+    k = crossings(ticks, period, target, steps)
+    return ((k + (-tn) // td) * td + tn) * num / (td * den) - 1
+
+def crossing_tick(k : int, period : float, target : float):
+    """
+    Tick count at which the k-th (1-based) crossing of target happens,
+    i.e. the k-th crossing is seen on simulated day crossing_tick(...) - 1.
+    """
+    ticks = math.ceil((k + math.floor(-target) + target) * period)
+    # the estimate can be off by one tick through float rounding, settle it against crossings()
+    while crossings(ticks, period, target) >= k:
+        ticks -= 1
+    while crossings(ticks, period, target) < k:
+        ticks += 1
+    return ticks
@@ -0,0 +1,135 @@
+import heapq
+import math
+from itertools import product
+from constants import SOLAR_MARKERS
+from astronomy.core_math import crossings, rational_period, rational_target
+
+# --- the phases each kind of event is a crossing of ---
+MOON_TARGETS = {"new": (0.0,), "full": (0.5,), "syzygy": (0.0, 0.5)}
+SUN_TARGETS = {
+    **{marker.name: (target,) for target, marker in SOLAR_MARKERS.items()},
+    "solstice": (0.0, 0.5),
+    "equinox": (0.25, 0.75),
+    "marker": tuple(SOLAR_MARKERS),
+}
+
+class Crossing:
+    """One crossing of a target phase: its exact instant in (fractional) days, the day it is seen on, and what it is."""
+    __slots__ = ("time", "day", "event")
+
+    def __init__(self, time : float, day : int, event : str):
+        self.time = time
+        self.day = day
+        self.event = event
+
+    def __lt__(self, other : "Crossing") -> bool:
+        return self.time < other.time
+
+    def __repr__(self):
+        return f"Crossing({self.event}, day {self.day}, t={self.time:.4f})"
+
+class CrossingSeries:
+    """
+    The crossings of one target phase by a body with the given period, indexed by k >= 1 in closed form.
+    The k-th crossing happens at instant t (days, day d spanning ticks d..d+1) and is seen on day
+    ceil(t + 1) - 1, exactly as phase_crossed() sees it in the daily loop; both come from exact integers.
+    """
+    def __init__(self, period : float, target : float, event : str):
+        self.period = period
+        self.target = target
+        self.event = event
+        self.num, self.den = rational_period(period)
+        self.tn, self.td = rational_target(target)
+        self.base = (-self.tn) // self.td # floor(-target)
+        self.scale = self.td * self.den
+
+    def crossing(self, k : int) -> Crossing:
+        ticks = ((k + self.base) * self.td + self.tn) * self.num # the k-th crossing happens after ticks / scale ticks
+        return Crossing(ticks / self.scale - 1, -(-ticks // self.scale) - 1, self.event)
+
+    def first_on_or_after_day(self, day : int) -> int:
+        return crossings(max(day, 0), self.period, self.target) + 1
+
+    def first_at_or_after(self, time : float) -> int:
+        """Index of the first crossing at or after an instant (k >= 1)."""
+        k = max(math.ceil(((time + 1) * self.scale / self.num - self.tn) / self.td - self.base), 1)
+        # the float estimate can be off by one, settle it
+        while k > 1 and self.crossing(k - 1).time >= time:
+            k -= 1
+        while self.crossing(k).time < time:
+            k += 1
+        return k
+
+    def stream(self, start_day : int = 0):
+        """Every crossing seen on start_day or later, in order."""
+        k = self.first_on_or_after_day(start_day)
+        while True:
+            yield self.crossing(k)
+            k += 1
+
+    def between(self, start : float, stop : float) -> list[Crossing]:
+        """Crossings at instants in [start, stop]."""
+        found = []
+        k = self.first_at_or_after(start)
+        while (c := self.crossing(k)).time <= stop:
+            found.append(c)
+            k += 1
+        return found
+
+    def on_day(self, day : int) -> list[Crossing]:
+        """Crossings seen on a day (at most one unless the period is under a day)."""
+        found = []
+        k = self.first_on_or_after_day(day)
+        while (c := self.crossing(k)).day == day:
+            found.append(c)
+            k += 1
+        return found
+
+def parse_event(spec : str, periods : dict[str, float]) -> list[CrossingSeries]:
+    """
+    The crossing series of an event spec such as "MoonA:full", "MoonB:syzygy",
+    "Sun:SummerSolstice" or "Sun:solstice". periods maps body names to their periods.
+    """
+    body, _, kind = spec.partition(":")
+    if body not in periods:
+        raise ValueError(f"Unknown body {body!r}, expected one of {sorted(periods)}")
+    targets = SUN_TARGETS if body == "Sun" else MOON_TARGETS
+    if kind not in targets:
+        raise ValueError(f"Unknown {body} event {kind!r}, expected one of {sorted(targets)}")
+    return [CrossingSeries(periods[body], target, spec) for target in targets[kind]]
+
+def event_stream(series : list[CrossingSeries], start_day : int = 0):
+    """Crossings of any of an event's series, merged in time order."""
+    return heapq.merge(*(s.stream(start_day) for s in series))
+
+def find_alignments(events : list[list[CrossingSeries]], start_day : int = 0, end_day : int | None = None,
+                    tolerance : float | None = None):
+    """
+    Yield (day, crossings) for every time all `events` (see parse_event) happen together, from
+    start_day up to end_day (forever if None): seen on the same day, or with a tolerance, at instants
+    at most `tolerance` days apart. day is the first day any of them is seen on. With a single
+    event, every crossing of it is yielded.
+    The rarest event drives the search: for each of its crossings the few crossings of the other
+    events that could go with it are worked out in closed form, so the search costs O(k) per
+    crossing of the rarest event, however many days or crossings of the other events it spans.
+    Results come in the order of the driving crossings.
+    """
+    rates = [sum(1 / s.period for s in series) for series in events]
+    driver = rates.index(min(rates))
+    others = [series for i, series in enumerate(events) if i != driver]
+    slack = math.ceil(tolerance) if tolerance is not None else 0
+
+    for crossing in event_stream(events[driver], start_day - slack):
+        if end_day is not None and crossing.day >= end_day + slack:
+            return
+        if tolerance is None:
+            candidates = [[c for s in series for c in s.on_day(crossing.day)] for series in others]
+        else:
+            candidates = [[c for s in series for c in s.between(crossing.time - tolerance, crossing.time + tolerance)] for series in others]
+        for combination in product(*candidates):
+            found = combination[:driver] + (crossing,) + combination[driver:] # in the order of `events`
+            if tolerance is not None and max(c.time for c in found) - min(c.time for c in found) > tolerance:
+                continue
+            day = min(c.day for c in found)
+            if day >= start_day and (end_day is None or day < end_day):
+                yield day, found
@@ -0,0 +1,63 @@
+import click
+from concurrent.futures import ProcessPoolExecutor
+from calendar_gen import resolved_spec, calendar_spec_for, engine_for, write_days
+from scheduler import event_days
+from moon_registry import moon_registry
+from output_files import output_compression
+
+def timeline_key(spec : dict) -> tuple:
+    """The bodies a resolved spec's calendar is driven by: profiles with the same key share one event timeline."""
+    return (
+        tuple(moon.synodic_month for moon in moon_registry(spec).enabled),
+        spec["astronomical_year"],
+    )
+
+def group_profiles(specs : list[dict]) -> dict[tuple, list[int]]:
+    """Indexes of the specs sharing each timeline key, in manifest order."""
+    groups = {}
+    for i, spec in enumerate(specs):
+        groups.setdefault(timeline_key(spec), []).append(i)
+    return groups
+
+def render_profile(spec : dict, timeline, output_format : str) -> str:
+    """Worker: write one resolved spec's calendar, driven by its group's precomputed event timeline (CSV compressed by extension)."""
+    state = engine_for(spec).state_at(-1)
+    compression = output_compression(spec["output_file"]) if output_format == "csv" else None
+    if output_format == "tlog":
+        from transition_store import write_store
+        write_store(spec["output_file"], spec, state, spec["sim_days"])
+    elif spec.get("legacy_phases"):
+        # accumulated float phases only come out of ticking every day
+        write_days(spec["output_file"], state, spec["sim_days"], "python", output_format, compression=compression)
+    elif state.spec.rows_per_day > 1:
+        write_days(spec["output_file"], state, spec["sim_days"], "numpy", output_format, compression=compression)
+    else:
+        write_days(spec["output_file"], state, spec["sim_days"], "events", output_format, timeline, compression=compression)
+    return spec["output_file"]
+
+def generate_batch(specs : list[dict], workers : int = 1, output_format : str = "csv") -> list[str]:
+    """
+    Generate every spec (keyed like main.DEFAULTS) of a batch. The astronomical timeline is
+    worked out once per group of profiles sharing the same bodies and handed to each of
+    their renders, which run across a process pool when workers > 1. Returns the files written,
+    in the order of specs.
+    """
+    resolved = []
+    for spec in specs:
+        resolved.append(resolved_spec(spec))
+        calendar_spec = calendar_spec_for(resolved[-1], output_format=output_format) # fail on invalid moons or events before any rendering
+        if output_format == "tlog" and (calendar_spec.include_event_times or calendar_spec.rows_per_day > 1):
+            raise click.ClickException(f"{spec['output_file']}: the transition store holds whole days without event times; use another --format.")
+
+    groups = group_profiles(resolved)
+    timelines = [None] * len(resolved)
+    for key, members in groups.items():
+        timeline = event_days(*key, max(resolved[i]["sim_days"] for i in members))
+        for i in members:
+            timelines[i] = timeline
+    click.echo(f"{len(resolved)} profiles in {len(groups)} timeline groups")
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(render_profile, resolved, timelines, [output_format] * len(resolved)))
+    return [render_profile(spec, timeline, output_format) for spec, timeline in zip(resolved, timelines)]
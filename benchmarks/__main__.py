@@ -0,0 +1,69 @@
+import json
+import click
+from benchmarks.profiles import PROFILES
+from benchmarks.suite import SIZES, ENGINES, STAGE_ENGINES, STAGE_DAYS, execute, run_suite, save_results, load_results
+from benchmarks.compare import compare_results, environment_differences, format_changes, key_label
+
+DEFAULT_RESULTS = "benchmarks/results.json"
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+@click.group()
+def cli():
+    """CalendarGen benchmarks: end-to-end generation and per-stage timings, and comparing them with a baseline."""
+    pass
+
+@cli.command()
+@click.option('--profile', 'profiles', multiple=True, type=click.Choice(sorted(PROFILES)), help='Profile to run (repeatable, default: all)')
+@click.option('--engine', 'engines', multiple=True, type=click.Choice(ENGINES), help='Engine of the end-to-end runs (repeatable, default: python)')
+@click.option('--days', 'sizes', multiple=True, type=int, help='Days of an end-to-end run (repeatable, default: 1e4, 1e6 and 1e8)')
+@click.option('--stage-days', default=STAGE_DAYS, type=int, help='Days each stage is timed over')
+@click.option('--repeat', default=3, type=int, help='Runs of each stage and short end-to-end run; the best is kept')
+@click.option('--no-end-to-end', is_flag=True, help='Only time the stages')
+@click.option('--no-stages', is_flag=True, help='Only run end-to-end')
+@click.option('--output', '-o', default=DEFAULT_RESULTS, help='JSON file to write the results to')
+def run(profiles, engines, sizes, stage_days, repeat, no_end_to_end, no_stages, output):
+    """Run the benchmarks and write their results as JSON."""
+    results = run_suite(
+        profiles or sorted(PROFILES),
+        [] if no_end_to_end else engines or ["python"],
+        sizes or SIZES,
+        [] if no_stages else STAGE_ENGINES,
+        stage_days,
+        repeat,
+        echo=click.echo,
+    )
+    save_results(output, results)
+    click.echo(f"✓ Results written to {output}")
+
+@cli.command()
+@click.option('--baseline', default=DEFAULT_BASELINE, type=click.Path(exists=True),
+              help='Results to compare against (make one for your machine with run -o benchmarks/baseline.json)')
+@click.option('--results', default=DEFAULT_RESULTS, type=click.Path(exists=True), help='Results to check')
+@click.option('--threshold', default=0.10, type=float, help='Fraction a time may grow by before it is a regression')
+@click.option('--memory-threshold', default=0.10, type=float, help='Fraction a peak memory may grow by before it is a regression')
+def compare(baseline, results, threshold, memory_threshold):
+    """Compare results with a baseline, exiting with status 1 if anything regressed."""
+    baseline_results, current_results = load_results(baseline), load_results(results)
+    for difference in environment_differences(baseline_results, current_results):
+        click.echo(f"⚠ Measured differently, {difference}")
+    changes, missing, added = compare_results(baseline_results, current_results, threshold, memory_threshold)
+    for line in format_changes(changes):
+        click.echo(line)
+    for key in missing:
+        click.echo(f"⚠ Not in the results: {key_label(key)}")
+    for key in added:
+        click.echo(f"⚠ Not in the baseline: {key_label(key)}")
+    regressions = [change for change in changes if change.regression]
+    if regressions:
+        click.echo(f"✗ {len(regressions)} regression(s)", err=True)
+        raise SystemExit(1)
+    click.echo("✓ No regressions")
+
+@cli.command(hidden=True)
+@click.argument('case')
+def case(case):
+    """Run one case (JSON, see suite.run_case) and print its results as the last line."""
+    click.echo(json.dumps(execute(json.loads(case))))
+
+if __name__ == "__main__":
+    cli()
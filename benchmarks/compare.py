@@ -0,0 +1,71 @@
+MIN_SECONDS = 0.01 # timings shorter than this are too noisy to flag
+MIN_MEMORY_KB = 1024 # and so are memory increases smaller than this
+
+# kind -> (time metric, memory metric)
+METRICS = {
+    "end_to_end": ("seconds", "peak_rss_kb"),
+    "stage": ("ns_per_day", "peak_kb"),
+}
+
+def result_key(result : dict) -> tuple:
+    if result["kind"] == "end_to_end":
+        return result["kind"], result["profile"], result["engine"], result["days"]
+    return result["kind"], result["profile"], result["engine"], result["stage"]
+
+def key_label(key : tuple) -> str:
+    kind, profile, engine, what = key
+    return f"{profile} {engine} {what:,} days" if kind == "end_to_end" else f"{profile} {engine} {what}"
+
+class Change:
+    """One metric of one result in a baseline and the current results."""
+    def __init__(self, key : tuple, metric : str, baseline : float, current : float, regression : bool):
+        self.key = key
+        self.metric = metric
+        self.baseline = baseline
+        self.current = current
+        self.regression = regression
+
+    @property
+    def ratio(self) -> float:
+        if not self.baseline:
+            return 1.0 if not self.current else float("inf")
+        return self.current / self.baseline
+
+def compare_results(baseline : dict, current : dict, threshold : float = 0.10, memory_threshold : float = 0.10) -> tuple[list[Change], list[tuple], list[tuple]]:
+    """
+    Compare the results of two runs (see suite.run_suite) measured alike. A time is a regression
+    if it grew by more than `threshold` (a fraction), a peak memory if it grew by more than
+    `memory_threshold`; changes too small to measure reliably are never regressions.
+    Returns (changes, keys only in the baseline, keys only in the current results).
+    """
+    before = {result_key(r): r for r in baseline["results"]}
+    after = {result_key(r): r for r in current["results"]}
+    changes = []
+    for key, new in after.items():
+        old = before.get(key)
+        if old is None:
+            continue
+        time_metric, memory_metric = METRICS[key[0]]
+        slower = new[time_metric] > old[time_metric] * (1 + threshold) and new["seconds"] >= MIN_SECONDS
+        changes.append(Change(key, time_metric, old[time_metric], new[time_metric], slower))
+        if old.get(memory_metric) is not None and new.get(memory_metric) is not None:
+            bigger = new[memory_metric] > old[memory_metric] * (1 + memory_threshold) and new[memory_metric] - old[memory_metric] >= MIN_MEMORY_KB
+            changes.append(Change(key, memory_metric, old[memory_metric], new[memory_metric], bigger))
+    missing = [key for key in before if key not in after]
+    added = [key for key in after if key not in before]
+    return changes, missing, added
+
+# environment fields that make timings incomparable when they differ
+ENVIRONMENT_FIELDS = ("python", "numpy", "platform", "cpus")
+
+def environment_differences(baseline : dict, current : dict) -> list[str]:
+    """The environment fields two runs were measured with that differ, as "field: baseline -> current"."""
+    before, after = baseline.get("environment", {}), current.get("environment", {})
+    return [f"{field}: {before.get(field)} -> {after.get(field)}" for field in ENVIRONMENT_FIELDS if before.get(field) != after.get(field)]
+
+def format_changes(changes : list[Change]) -> list[str]:
+    lines = [f"{'benchmark':45} {'metric':12} {'baseline':>14} {'current':>14} {'change':>8}"]
+    for change in changes:
+        flag = "  REGRESSION" if change.regression else ""
+        lines.append(f"{key_label(change.key):45} {change.metric:12} {change.baseline:>14,.3f} {change.current:>14,.3f} {change.ratio - 1:>+8.1%}{flag}")
+    return lines
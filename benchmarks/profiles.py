@@ -0,0 +1,30 @@
+from main import DEFAULTS
+
+# --- the profiles benchmarks run, as full specs keyed like main.DEFAULTS ---
+
+# Moon A and Moon B as in the default profile (so the built-in events still match), plus four more
+MAXIMAL_MOONS = [
+    {"key": "MoonA", "name": "Big", "synodic_month": DEFAULTS["moon_a_month"],
+     "lunar_calendar": {"name": "LunarA", "months_per_year": DEFAULTS["lunar_a_months_per_year"], "day_start": DEFAULTS["lunar_a_day_start"]}},
+    {"key": "MoonB", "name": "Small", "synodic_month": DEFAULTS["moon_b_month"],
+     "lunar_calendar": {"name": "LunarB", "months_per_year": DEFAULTS["lunar_b_months_per_year"], "day_start": DEFAULTS["lunar_b_day_start"]}},
+    {"name": "Tiny", "synodic_month": 7.3, "lunar_calendar": {"months_per_year": 50, "day_start": 10}},
+    {"name": "Far", "synodic_month": 61.9, "lunar_calendar": {"months_per_year": 6}},
+    {"name": "Swift", "synodic_month": 3.7},
+    {"name": "Pale", "synodic_month": 43.2},
+]
+
+def default_profile() -> dict:
+    return dict(DEFAULTS)
+
+def maximal_profile() -> dict:
+    """Every feature on, with six moons and four lunar calendars (but no event times, to compare with older baselines)."""
+    spec = dict(DEFAULTS)
+    spec.update({key: True for key in spec if key.startswith("include_") and key != "include_event_times"})
+    spec["moons"] = MAXIMAL_MOONS
+    return spec
+
+PROFILES = {
+    "default": default_profile,
+    "maximal": maximal_profile,
+}
@@ -0,0 +1,114 @@
+import csv
+import os
+import time
+import tracemalloc
+from itertools import repeat
+from calendar_gen import engine_for, spec_headers
+from column_plan import ColumnPlan
+from instrument import Instrumentation, STAGES as RUN_STAGES
+
+# --- the stages timed: those of an instrumented run (see instrument.py), with CSV writing on its own ---
+STAGES = tuple(stage for stage in RUN_STAGES if stage != "output") + ("csv_write",)
+
+class PeakTracker(Instrumentation):
+    """Instead of timing calls, the largest growth of traced memory during any one call, per stage."""
+    def __init__(self):
+        super().__init__(memory=True)
+        self.peaks : dict[str, int] = {}
+
+    def wrap(self, stage, fn, rows = None):
+        def wrapped(*args, **kwargs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                name = stage(args) if callable(stage) else stage
+                self.peaks[name] = max(self.peaks.get(name, 0), tracemalloc.get_traced_memory()[1] - before)
+        return wrapped
+
+def wrapper_overhead(samples : int = 100_000) -> float:
+    """Seconds Instrumentation adds to the time of a call."""
+    instrumentation = Instrumentation()
+    nothing = instrumentation.wrap("nothing", lambda *args: None)
+    for _ in range(samples):
+        nothing(None, None)
+    return instrumentation.totals["nothing"][0] / samples
+
+def instrumented_times(run, overhead : float, write = None) -> dict[str, float]:
+    """Seconds per stage of run(write) under an Instrumentation, less the time the timing itself takes."""
+    instrumentation = Instrumentation()
+    with instrumentation.active():
+        run(instrumentation.wrap("csv_write", write) if write else None)
+    return {stage: max(seconds - calls * overhead, 0.0) for stage, (seconds, calls) in instrumentation.totals.items() if calls}
+
+def stage_results(times : dict[str, float], peaks : dict[str, int], days : int) -> list[dict]:
+    return [
+        {"stage": stage, "days": days, "seconds": times[stage], "ns_per_day": times[stage] / days * 1e9, "peak_kb": peaks.get(stage, 0) // 1024}
+        for stage in STAGES if stage in times
+    ]
+
+def write_csv(rows):
+    with open(os.devnull, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerows(rows)
+
+def seconds(fn, *args) -> float:
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+# --- python engine: the ColumnPlan steps ---
+
+def plan_run(spec : dict, days : int, rows : list | None = None):
+    """Tick and fill `days` rows, keeping copies of them in `rows` if given."""
+    state = engine_for(spec).state_at(-1)
+    plan = ColumnPlan(spec_headers(state.spec), state)
+    for _ in range(days):
+        state.tick()
+        row = plan.fill(state)
+        if rows is not None:
+            rows.append(list(row))
+
+def python_stages(spec : dict, days : int, repeats : int, traced_days : int) -> list[dict]:
+    """Time spent in each stage of ticking and filling `days` rows, and in writing them as CSV."""
+    overhead = wrapper_overhead()
+    runs = [instrumented_times(lambda write: plan_run(spec, days), overhead) for _ in range(repeats)]
+    best = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+    rows = []
+    plan_run(spec, days, rows)
+    best["csv_write"] = min(seconds(write_csv, rows) for _ in range(repeats))
+
+    tracker = PeakTracker()
+    with tracker.active():
+        plan_run(spec, min(days, traced_days))
+        tracker.wrap("csv_write", write_csv)(rows[:traced_days])
+    return stage_results(best, tracker.peaks, days)
+
+# --- numpy engine: the block functions ---
+
+def numpy_run(spec : dict, blocks : int, write):
+    """Compute `blocks` blocks with the numpy engine and write them with write(rows)."""
+    import numpy_engine
+    state = engine_for(spec).state_at(-1)
+    order = spec_headers(state.spec)
+    for _ in range(blocks):
+        columns = numpy_engine.compute_block(state, numpy_engine.BLOCK_DAYS)
+        write(zip(*[columns.get(h) or repeat("", numpy_engine.BLOCK_DAYS) for h in order]))
+
+def numpy_stages(spec : dict, days : int, repeats : int) -> list[dict]:
+    """Time spent in each of the numpy engine's block functions over whole blocks of days (at least one)."""
+    from numpy_engine import BLOCK_DAYS
+    blocks = max(days // BLOCK_DAYS, 1)
+    overhead = wrapper_overhead()
+    runs = [instrumented_times(lambda write: numpy_run(spec, blocks, write), overhead, write_csv) for _ in range(repeats)]
+    best = {stage: min(run.get(stage, 0.0) for run in runs) for stage in runs[0]}
+
+    tracker = PeakTracker()
+    with tracker.active():
+        numpy_run(spec, 1, tracker.wrap("csv_write", write_csv))
+    return stage_results(best, tracker.peaks, blocks * BLOCK_DAYS)
+
+def run_stages(spec : dict, engine : str, days : int, repeats : int = 3, traced_days : int = 2000) -> list[dict]:
+    if engine == "numpy":
+        return numpy_stages(spec, days, repeats)
+    return python_stages(spec, days, repeats, traced_days)
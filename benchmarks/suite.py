@@ -0,0 +1,96 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from benchmarks.profiles import PROFILES
+from instrument import peak_rss_kb
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SIZES = (10_000, 1_000_000, 100_000_000) # days of the end-to-end runs
+ENGINES = ("python", "numpy", "events")
+STAGE_ENGINES = ("python", "numpy") # the engines with stages of their own
+STAGE_DAYS = 50_000
+REPEAT_BELOW = 1_000_000 # end-to-end runs shorter than this are repeated and the best kept
+
+def end_to_end(profile : str, engine : str, days : int) -> dict:
+    """Generate `days` days of a profile as CSV to os.devnull, without checkpoints, timing generate_calendar as a whole."""
+    from calendar_gen import generate_calendar
+    spec = PROFILES[profile]()
+    spec.update(output_file=os.devnull, sim_days=days)
+    start = time.perf_counter()
+    generate_calendar(**spec, engine=engine, checkpoint_every=0)
+    elapsed = time.perf_counter() - start
+    return {"kind": "end_to_end", "profile": profile, "engine": engine, "days": days, "seconds": elapsed,
+            "days_per_second": days / elapsed, "peak_rss_kb": peak_rss_kb()}
+
+def execute(case : dict) -> list[dict]:
+    """Run one case (see run_case) in this process."""
+    if case["kind"] == "end_to_end":
+        return [end_to_end(case["profile"], case["engine"], case["days"])]
+    from benchmarks.stages import run_stages
+    stages = run_stages(PROFILES[case["profile"]](), case["engine"], case["days"], case["repeat"])
+    return [{"kind": "stage", "profile": case["profile"], "engine": case["engine"], **stage} for stage in stages]
+
+def run_case(case : dict) -> list[dict]:
+    """
+    Run a case in a fresh interpreter, so the settings one profile applies don't leak into the
+    next and the peak RSS measured is the case's own.
+    """
+    result = subprocess.run([sys.executable, "-m", "benchmarks", "case", json.dumps(case)], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Benchmark case {case} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": numpy_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def run_suite(profiles, engines, sizes, stage_engines, stage_days : int, repeat : int, echo = print) -> dict:
+    """
+    End-to-end runs of every profile, engine and size, then the stages of every profile and
+    stage engine. Returns {"environment": ..., "results": [...]}; echo reports each result as it comes.
+    """
+    results = []
+    for profile in profiles:
+        for engine in engines:
+            for days in sizes:
+                case = {"kind": "end_to_end", "profile": profile, "engine": engine, "days": days}
+                runs = [run_case(case)[0] for _ in range(repeat if days < REPEAT_BELOW else 1)]
+                best = min(runs, key=lambda r: r["seconds"])
+                echo(f"{profile:8} {engine:7} {days:>11,} days  {best['seconds']:9.3f}s  {best['days_per_second']:>12,.0f} days/s  peak {best['peak_rss_kb'] or 0:>9,} KiB")
+                results.append(best)
+        for engine in stage_engines:
+            stages = run_case({"kind": "stage", "profile": profile, "engine": engine, "days": stage_days, "repeat": repeat})
+            for stage in stages:
+                echo(f"{profile:8} {engine:7} {stage['stage']:27}  {stage['ns_per_day']:9.0f} ns/day  peak {stage['peak_kb']:>9,} KiB")
+            results.extend(stages)
+    return {"environment": environment(), "results": results}
+
+def save_results(path : str, results : dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+def load_results(path : str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -1,14 +1,19 @@
 import csv
 import click
-from astronomy.celestial_bodies import Moon, Sun
-from calendars.lunar_calendar import LunarCalendarState, compute_lunar_calendars
+from itertools import repeat, islice
 import config
-from astronomy.lunar_phases import compute_phases as compute_lunar_phases
-from astronomy.solar_phases import compute_phases as compute_solar_phases
-from calendars.solar_calendar import compute_solar_calendar
-from calendars.lunisolar_calendar import compute_lunisolar_state_tick as tick_ls_state, LunisolarState, compute_lunisolar_calendar
-from user_defined_events import compute_user_defined_events as compute_events
+from constants import RESOLUTIONS
+from localization import SOLAR_MARKER_NAMES
+from moon_registry import MoonRegistry, moon_registry
 from calendars.date import Date
+from calendars.solar_calendar import solar_calendar
+from calendars.lunisolar_calendar import LUNISOLAR_RULES
+from calendar_spec import CalendarSpec
+from engine import CalendarEngine, DayState, DayRecord, build_record
+from scheduler import scheduler_for, timeline_spans, advance_state
+from column_plan import ColumnPlan
+from output_files import open_output, output_compression
+from user_defined_events import USER_DEFINED_EVENTS, EventIndex, load_events
 
 def ask_yes_no(prompt: str) -> bool:
     while True:
@@ -19,76 +24,342 @@ def ask_yes_no(prompt: str) -> bool:
             return False
         print("Please enter 'y' or 'n'.")
 
-def check_incompatible_setting(interactive: bool = True):
+def check_incompatible_setting(spec : dict, interactive : bool = True):
     """
-    Check for incompatible settings and fix them.
+    Check a spec's include_* flags for incompatible settings and fix them in place.
     If interactive=True, ask the user. If False, use sensible defaults.
     """
     # --- Lunisolar calendar requires Moon A ---
-    if config.INCLUDE_LUNISOLAR_CALENDAR and not config.INCLUDE_FIRST_MOON:
+    if spec["include_lunisolar_calendar"] and not spec["include_first_moon"]:
         if interactive and ask_yes_no("Lunisolar Calendar requires Moon A. Enable it?"):
-            config.INCLUDE_FIRST_MOON = True
+            spec["include_first_moon"] = True
         else:
             click.echo("Lunisolar Calendar requires Moon A, but it's disabled. Disabling Lunisolar Calendar.")
-            config.INCLUDE_LUNISOLAR_CALENDAR = False
+            spec["include_lunisolar_calendar"] = False
 
     # --- Double syzygies require both moons ---
-    if config.INCLUDE_DOUBLE_SYZYGIES and not (config.INCLUDE_FIRST_MOON and config.INCLUDE_SECOND_MOON):
+    if spec["include_double_syzygies"] and not (spec["include_first_moon"] and spec["include_second_moon"]):
         if interactive and ask_yes_no("Double Syzygies require both moons. Enable them?"):
-            config.INCLUDE_FIRST_MOON = True
-            config.INCLUDE_SECOND_MOON = True
+            spec["include_first_moon"] = True
+            spec["include_second_moon"] = True
         else:
             click.echo("Double Syzygies require both moons. Disabling Double Syzygies.")
-            config.INCLUDE_DOUBLE_SYZYGIES = False
+            spec["include_double_syzygies"] = False
 
     # --- Lunar Calendar A requires Moon A ---
-    if config.INCLUDE_LUNAR_CALENDAR_A and not config.INCLUDE_FIRST_MOON:
+    if spec["include_lunar_calendar_a"] and not spec["include_first_moon"]:
         if interactive and ask_yes_no("Lunar Calendar A requires Moon A. Enable it?"):
-            config.INCLUDE_FIRST_MOON = True
+            spec["include_first_moon"] = True
         else:
             click.echo("Lunar Calendar A requires Moon A, but it's disabled. Disabling Lunar Calendar A.")
-            config.INCLUDE_LUNAR_CALENDAR_A = False
+            spec["include_lunar_calendar_a"] = False
 
     # --- Lunar Calendar B requires Moon B ---
-    if config.INCLUDE_LUNAR_CALENDAR_B and not config.INCLUDE_SECOND_MOON:
+    if spec["include_lunar_calendar_b"] and not spec["include_second_moon"]:
         if interactive and ask_yes_no("Lunar Calendar B requires Moon B. Enable it?"):
-            config.INCLUDE_SECOND_MOON = True
+            spec["include_second_moon"] = True
         else:
             click.echo("Lunar Calendar B requires Moon B, but it's disabled. Disabling Lunar Calendar B.")
-            config.INCLUDE_LUNAR_CALENDAR_B = False
+            spec["include_lunar_calendar_b"] = False
 
     # --- Lunar phases require at least one moon ---
-    if config.INCLUDE_LUNAR_PHASES and not (config.INCLUDE_FIRST_MOON or config.INCLUDE_SECOND_MOON):
+    if spec["include_lunar_phases"] and not (spec["include_first_moon"] or spec["include_second_moon"]):
         click.echo("Lunar Phases require at least one moon, but none are enabled. Disabling Lunar Phases.")
-        config.INCLUDE_LUNAR_PHASES = False
-
-HEADERS = [
-    "Day",
-    "User_Defined_Events",
-    "MoonA_Phase_Raw",
-    "MoonA_Phase_Name",
-    "MoonB_Phase_Raw",
-    "MoonB_Phase_Name",
-    "Moon_Phases_Aligned",
-    "Solar_Phase_Raw",
-    "Solar_Marker",
-    "Solar_Year",
-    "Solar_Month_#",
-    "Solar_Month",
-    "Solar_Day",
-    "Lunisolar_Year",
-    "Lunisolar_Month_#",
-    "Lunisolar_Month",
-    "Lunisolar_Day",
-    "LunarA_Year",
-    "LunarA_Month_#",
-    "LunarA_Month",
-    "LunarA_Day",
-    "LunarB_Year",
-    "LunarB_Month_#",
-    "LunarB_Month",
-    "LunarB_Day"
-]
+        spec["include_lunar_phases"] = False
+
+def headers(registry : MoonRegistry, event_times : bool = False, resolution : str = "day") -> list[str]:
+    """
+    The CSV columns of a calendar with the registry's moons, disabled ones included. event_times adds
+    a *_Time column after each event column, and sub-day resolutions the hour (and minute) of each row.
+    """
+    timed = lambda column: (column,) if event_times else ()
+    moon_columns = [f"{moon.key}_{column}" for moon in registry.moons for column in ("Phase_Raw", "Phase_Name", *timed("Syzygy_Time"))]
+    if len(registry.moons) >= 2:
+        moon_columns.append("Moon_Phases_Aligned")
+    date_columns = ("Year", "Month_#", "Month", "Day", *timed("Month_Start_Time"))
+    lunar_columns = [f"{calendar.name}_{column}" for calendar in registry.calendars() for column in date_columns]
+    return [
+        "Day",
+        *{"day": (), "hour": ("Hour",), "minute": ("Hour", "Minute")}[resolution],
+        "User_Defined_Events",
+        *moon_columns,
+        "Solar_Phase_Raw",
+        "Solar_Marker",
+        *timed("Solar_Marker_Time"),
+        "Solar_Year",
+        "Solar_Month_#",
+        "Solar_Month",
+        "Solar_Day",
+        *(f"Lunisolar_{column}" for column in date_columns),
+        *lunar_columns,
+    ]
+
+def spec_headers(calendar_spec : CalendarSpec) -> list[str]:
+    """The CSV columns of the calendar a CalendarSpec describes."""
+    return headers(calendar_spec.registry, calendar_spec.include_event_times, calendar_spec.resolution)
+
+def check_moons(spec : dict, registry : MoonRegistry):
+    """The checks of check_incompatible_setting that depend on a profile's own "moons" list."""
+    if spec["include_lunisolar_calendar"] and registry.lunisolar is None:
+        click.echo("The moon the Lunisolar Calendar follows is disabled. Disabling Lunisolar Calendar.")
+        spec["include_lunisolar_calendar"] = False
+    if spec["include_lunar_phases"] and not registry.enabled:
+        click.echo("Lunar Phases require at least one moon, but none are enabled. Disabling Lunar Phases.")
+        spec["include_lunar_phases"] = False
+
+def resolved_spec(spec : dict, interactive : bool = False) -> dict:
+    """Copy of spec with incompatible include_* flags resolved, asking the user about them if interactive."""
+    resolved = dict(spec)
+    check_incompatible_setting(resolved, interactive=interactive)
+    check_moons(resolved, moon_registry(resolved))
+    return resolved
+
+def check_calendar(calendar_spec : CalendarSpec, engine : str | None = None, output_format : str | None = None):
+    """Settings a CalendarSpec can't be generated with, by `engine` or as `output_format` too if given."""
+    registry, rules = calendar_spec.registry, calendar_spec.lunisolar
+    if calendar_spec.include_lunisolar_calendar:
+        moon = registry.enabled[registry.lunisolar]
+        if calendar_spec.astronomical_year / moon.synodic_month + 1 > len(rules.month_names):
+            raise ValueError(f"The Lunisolar Calendar can't follow {moon.key}: its years would have more months than the {len(rules.month_names)} month names")
+    names = {calendar.name for calendar in registry.calendars()}
+    unknown = {calendar for calendar in calendar_spec.events.calendars if isinstance(calendar, str) and calendar not in names}
+    if unknown:
+        raise ValueError(f"Events refer to unknown calendars: {sorted(unknown)}")
+    if calendar_spec.resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown resolution {calendar_spec.resolution!r}: use one of {list(RESOLUTIONS)}")
+    if calendar_spec.legacy_phases and (calendar_spec.include_event_times or calendar_spec.rows_per_day > 1):
+        raise ValueError("Event times and sub-day resolutions follow the exact phases; they can't be combined with legacy phases")
+    if calendar_spec.legacy_phases and engine == "events":
+        raise ValueError("The events engine seeks exact phases; use --engine python or numpy with legacy phases")
+    if calendar_spec.legacy_phases and output_format == "tlog":
+        raise ValueError("A transition store is expanded with exact phases; it can't be written with legacy phases")
+
+def calendar_spec_for(spec : dict, engine : str | None = None, output_format : str | None = None) -> CalendarSpec:
+    """
+    The CalendarSpec of a spec keyed like main.DEFAULTS, its flags resolved without asking
+    (pass an already resolved spec to keep the answers of an interactive run), checked
+    against `engine` and `output_format` too if given.
+    """
+    spec = resolved_spec(spec)
+    events_file = spec.get("events_file")
+    calendar_spec = CalendarSpec(
+        moon_registry(spec),
+        spec["astronomical_year"],
+        solar_calendar(spec["solar_calendar_offset"]),
+        LUNISOLAR_RULES,
+        EventIndex(load_events(events_file) if events_file else USER_DEFINED_EVENTS.items()),
+        include_lunar_phases=spec["include_lunar_phases"],
+        include_solar_phases=spec["include_solar_phases"],
+        include_raw_phase_figures=spec["include_raw_phase_figures"],
+        include_solar_calendar=spec["include_solar_calendar"],
+        include_lunisolar_calendar=spec["include_lunisolar_calendar"],
+        include_user_defined_events=spec["include_user_defined_events"],
+        legacy_phases=spec.get("legacy_phases", False),
+        include_event_times=spec.get("include_event_times", False),
+        resolution=spec.get("resolution", "day"),
+    )
+    check_calendar(calendar_spec, engine, output_format)
+    return calendar_spec
+
+def engine_for(spec : dict) -> CalendarEngine:
+    """CalendarEngine for a spec keyed like main.DEFAULTS (see calendar_spec_for)."""
+    return CalendarEngine(calendar_spec_for(spec))
+
+def fast_forward(state : DayState, days : int):
+    """Advance `state` by `days` exactly as tick() would, without producing output."""
+    try:
+        from numpy_engine import fast_forward as numpy_fast_forward
+    except ImportError:
+        for _ in range(days):
+            state.tick()
+        return
+    numpy_fast_forward(state, days)
+
+def seed_state(spec : dict, window_start : int, day : int, engine : str = "python") -> DayState:
+    """
+    State after `day` of a window starting at window_start, bit-identical to what
+    generating the window serially reaches. Phases are a pure function of the day, so this
+    is a direct seek, unless legacy phases are on: the python and numpy engines then print
+    accumulated float phases, which only replaying the days reproduces exactly.
+    """
+    calendar_engine = engine_for(spec)
+    if engine == "events" or not calendar_engine.legacy_phases:
+        return calendar_engine.state_at(day)
+    state = calendar_engine.state_at(window_start - 1)
+    fast_forward(state, day - state.day)
+    return state
+
+def states_after(state : DayState, end_day : int, engine : str = "python", timeline = None):
+    """
+    Advance `state` one day at a time up to end_day, yielding it (the same object) after every day.
+    The events engine can be handed a precomputed timeline (scheduler.event_days) of the state's bodies.
+    """
+    if engine == "events":
+        # tick the calendar states only on days with an astronomical event
+        spans = scheduler_for(state).spans(end_day) if timeline is None else timeline_spans(timeline, state.day + 1, end_day)
+        for first_day, stop_day, events in spans:
+            for day in range(first_day, stop_day):
+                advance_state(state, eventful=bool(events) and day == first_day)
+                yield state
+        return
+
+    while state.day + 1 < end_day:
+        state.tick()
+        yield state
+
+def records_after(state : DayState, end_day : int, engine : str = "python", timeline = None):
+    """Yield a DayRecord for every day after `state` up to end_day, advancing `state` as it goes."""
+    return map(build_record, states_after(state, end_day, engine, timeline))
+
+def check_window(start_day : int, end_day : int):
+    """ValueError unless [start_day, end_day) is a window of days, possibly empty."""
+    if end_day < start_day:
+        raise ValueError(f"The window ends (day {end_day}) before it starts (day {start_day})")
+
+def iter_days(spec : dict, start : int = 0, end : int | None = None, engine : str = "python"):
+    """
+    Lazily yield a DayRecord for every day in [start, end) of the calendar described by `spec`,
+    a dict keyed like main.DEFAULTS. end defaults to spec["sim_days"].
+    Nothing is kept between days, so callers can stop early or stream any number of days.
+    """
+    spec = resolved_spec(spec)
+    if end is None:
+        end = spec["sim_days"]
+    check_window(start, end)
+    yield from records_after(engine_for(spec).state_at(start - 1), end, engine)
+
+def date_values(row : dict, prefix : str, date : Date, month_name):
+    row[f"{prefix}_Year"] = date.year
+    row[f"{prefix}_Month_#"] = date.month
+    row[f"{prefix}_Month"] = month_name
+    row[f"{prefix}_Day"] = date.day
+
+def row_values(record : DayRecord) -> dict:
+    """The typed value of every column a record fills, keyed by header. Unfilled columns are absent."""
+    calendar_spec = record.spec
+    include_raw = calendar_spec.include_raw_phase_figures
+    row = {"Day": record.day}
+    if record.events is not None:
+        row["User_Defined_Events"] = ", ".join(record.events)
+    if record.moons is not None:
+        for moon, phase, phase_name in zip(record.moons, record.moon_phases, record.moon_phase_names):
+            row[f"{moon.key}_Phase_Name"] = phase_name
+            if include_raw:
+                row[f"{moon.key}_Phase_Raw"] = round(phase, 6)
+    if record.moons_aligned is not None:
+        row["Moon_Phases_Aligned"] = record.moons_aligned
+    if record.solar_phase is not None:
+        if include_raw:
+            row["Solar_Phase_Raw"] = record.solar_phase
+        row["Solar_Marker"] = SOLAR_MARKER_NAMES[record.solar_marker] if record.solar_marker is not None else ""
+    if record.solar_year is not None:
+        row["Solar_Year"] = record.solar_year
+        row["Solar_Month"] = str(calendar_spec.solar_calendar.month_name(record.solar_date))
+        if record.solar_date is not None:
+            row["Solar_Month_#"] = record.solar_date.month
+            row["Solar_Day"] = record.solar_date.day
+    if record.lunisolar_date is not None:
+        date_values(row, "Lunisolar", record.lunisolar_date, calendar_spec.lunisolar.month_name(record.lunisolar_date.year - 1, record.lunisolar_date.month - 1))
+    for calendar, date in record.lunar_dates:
+        if date is not None:
+            date_values(row, calendar.name, date, calendar.month_names[date.month - 1])
+    if record.event_times:
+        for header, time in record.event_times.items():
+            row[header] = round(time, 6)
+    return row
+
+def format_row(record : DayRecord, columns : list[str]) -> list[str]:
+    """The CSV row of a record, in the order of columns (see headers())."""
+    row = row_values(record)
+    return [str(row[h]) if h in row else "" for h in columns]
+
+def write_numpy_blocks(writer, state : DayState, days : int, checkpointer = None, f = None):
+    """
+    Write the next `days` days after `state` using the vectorized numpy engine, checkpointing between blocks.
+    Sub-day resolutions get blocks of fewer days, so a block has about as many rows whatever the resolution.
+    """
+    try:
+        from numpy_engine import compute_block, BLOCK_DAYS
+    except ImportError:
+        raise click.ClickException("The numpy engine requires numpy (pip install numpy).")
+
+    columns_order = spec_headers(state.spec)
+    steps = state.spec.rows_per_day
+    while days > 0:
+        n = min(max(BLOCK_DAYS // steps, 1), days)
+        columns = compute_block(state, n, steps)
+        writer.writerows(zip(*[columns.get(h) or repeat("", n * steps) for h in columns_order]))
+        days -= n
+        if checkpointer and checkpointer.due(state):
+            checkpointer.save(state, f)
+
+def write_batches(output_file : str, output_format : str, calendar_spec : CalendarSpec, records):
+    """Write records as typed, dictionary-encoded columns in record batches (parquet, arrow or feather)."""
+    try:
+        from arrow_output import BatchWriter, name_columns
+    except ImportError:
+        raise click.ClickException(f"{output_format} output requires pyarrow (pip install pyarrow).")
+
+    writer = BatchWriter(output_file, output_format, spec_headers(calendar_spec), name_columns(calendar_spec))
+    for record in records:
+        writer.write_row(row_values(record))
+    writer.close()
+
+def write_days(output_file : str, state : DayState, end_day : int, engine : str = "python", output_format : str = "csv", timeline = None,
+               append : bool = False, checkpointer = None, compression : str | None = None, header : bool = True):
+    """
+    Write the days after `state` up to end_day, with a header. timeline is passed on to states_after.
+    With append, CSV rows are added to the end of an existing file instead (no header), and
+    without header the header is left out anyway. CSV is compressed with `compression` if given
+    (see output_files.py). A checkpoint.Checkpointer saves the state of CSV output every so many days.
+    """
+    if output_format != "csv":
+        if engine == "numpy":
+            raise click.ClickException("The numpy engine only writes CSV.")
+        write_batches(output_file, output_format, state.spec, records_after(state, end_day, engine, timeline))
+        return
+
+    with open_output(output_file, compression, append) as f:
+        writer = csv.writer(f)
+        columns = spec_headers(state.spec)
+        if header and not append:
+            writer.writerow(columns)
+
+        if engine == "numpy":
+            write_numpy_blocks(writer, state, end_day - state.day - 1, checkpointer, f)
+        elif checkpointer is None:
+            plan = ColumnPlan(columns, state)
+            writer.writerows(map(plan.fill, states_after(state, end_day, engine, timeline)))
+        else:
+            plan = ColumnPlan(columns, state)
+            states = states_after(state, end_day, engine, timeline)
+            while state.day + 1 < end_day:
+                writer.writerows(map(plan.fill, islice(states, checkpointer.every)))
+                checkpointer.save(state, f)
+
+def checkpoint_run(spec : dict, start_day : int, end_day : int, engine : str) -> dict:
+    """What a checkpoint must have been made by for a run to resume from it."""
+    from result_cache import normalized_settings
+    return {"settings": normalized_settings(resolved_spec(spec), engine), "start_day": start_day, "end_day": end_day, "engine": engine}
+
+def resume_state(spec : dict, output_file : str, start_day : int, end_day : int, engine : str, output_format : str) -> DayState | None:
+    """
+    The state of output_file's last checkpoint, with the output cut back to what the checkpoint covers,
+    or None (with nothing changed) if it has no checkpoint.
+    """
+    from checkpoint import read_checkpoint
+    try:
+        checkpoint = read_checkpoint(output_file, checkpoint_run(spec, start_day, end_day, engine), engine_for(spec))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    if checkpoint is None:
+        click.echo(f"No checkpoint for {output_file}, starting from the beginning.")
+        return None
+    state, offset = checkpoint
+    with open(output_file, "r+b") as f:
+        f.truncate(offset)
+    click.echo(f"Resuming {output_file} after day {state.day}")
+    return state
 
 def generate_calendar(
     output_file: str,
@@ -112,77 +383,118 @@ def generate_calendar(
     include_solar_phases: bool,
     include_lunar_phases: bool,
     include_user_defined_events: bool,
-    interactive: bool = False
+    interactive: bool = False,
+    events_file: str | None = None,
+    legacy_phases: bool = False,
+    start_day: int = 0,
+    end_day: int | None = None,
+    engine: str = "python",
+    output_format: str = "csv",
+    workers: int = 1,
+    keep_shards: bool = False,
+    cache: bool = False,
+    checkpoint_every: int | None = None,
+    resume: bool = False,
+    moons: list[dict] | None = None,
+    lunisolar_moon: str | None = None,
+    compression: str | None = None,
+    shard_rows: int | None = None,
+    shard_years: int | None = None,
+    include_event_times: bool = False,
+    resolution: str = "day"
 ):
     """
     Generate calendar with the given settings.
+    Only days in [start_day, end_day) are written; end_day defaults to sim_days.
+    engine="numpy" computes whole blocks of days as arrays instead of one day at a time,
+    engine="events" jumps between astronomical events instead of checking for them every day.
+    output_format is "csv" or one of the columnar formats "parquet", "arrow" and "feather",
+    or "tlog" for a transition store (see transition_store.py).
+    workers > 1 splits the days into chunks generated by a process pool; the chunks are
+    merged in order unless keep_shards is set.
+    events_file replaces the built-in USER_DEFINED_EVENTS (see user_defined_events.load_events).
+    moons, if given, replaces Moon A and Moon B (the moon_a_*/moon_b_*/lunar_a_*/lunar_b_* settings
+    and their include_* flags) with any number of moons (see moon_registry.parse_moons);
+    lunisolar_moon is the key of the moon the lunisolar calendar follows, the first one by default.
+    legacy_phases makes the python and numpy engines accumulate float phases day by day as older
+    versions did, instead of computing each day's phase exactly.
+    cache serves CSV output from the result cache (see result_cache.py), computing only the days
+    it doesn't hold yet; other formats and keep_shards can't be cached.
+    Serial CSV runs save a checkpoint every checkpoint_every days next to the output, if asked to
+    (none by default); resume continues from the last one, appending to the output, and keeps
+    checkpointing, every config.CHECKPOINT_DAYS days unless checkpoint_every says otherwise.
+    CSV output is compressed with `compression` ("gzip", "zstd", "xz" or "none"), by default
+    the one its extension implies (.gz, .zst, .xz).
+    shard_rows or shard_years split the output into one file per that many days or astronomical
+    years, listed in a manifest (see sharding.py); resume then skips the shards already written.
+    include_event_times adds the exact instant of every syzygy, solar marker and month start next to
+    it (see engine.event_times). resolution "hour" or "minute" writes a row for every hour or minute
+    of every day instead of one per day, with the numpy engine.
+    Returns the files written (the manifest, for sharded output).
     """
-    # --- Apply settings to config module ---
-    config.INCLUDE_FIRST_MOON = include_first_moon
-    config.INCLUDE_SECOND_MOON = include_second_moon
-    config.INCLUDE_DOUBLE_SYZYGIES = include_double_syzygies
-    config.INCLUDE_SOLAR_CALENDAR = include_solar_calendar
-    config.INCLUDE_LUNISOLAR_CALENDAR = include_lunisolar_calendar
-    config.INCLUDE_LUNAR_CALENDAR_A = include_lunar_calendar_a
-    config.INCLUDE_LUNAR_CALENDAR_B = include_lunar_calendar_b
-    config.INCLUDE_RAW_PHASE_FIGURES = include_raw_phase_figures
-    config.INCLUDE_SOLAR_PHASES = include_solar_phases
-    config.INCLUDE_LUNAR_PHASES = include_lunar_phases
-    config.INCLUDE_USER_DEFINED_EVENTS = include_user_defined_events
-
-    # --- Check for incompatible settings ---
-    check_incompatible_setting(interactive=interactive)
-
-    # --- Initialize celestial bodies and states ---
-    moon_a = Moon(moon_a_month) if config.INCLUDE_FIRST_MOON else None
-    moon_b = Moon(moon_b_month) if config.INCLUDE_SECOND_MOON else None
-    sun = Sun(astronomical_year)
-    ls_state = LunisolarState() if config.INCLUDE_LUNISOLAR_CALENDAR else None
-    lc_state_a = LunarCalendarState(lunar_a_months_per_year, lunar_a_day_start) if config.INCLUDE_LUNAR_CALENDAR_A else None
-    lc_state_b = LunarCalendarState(lunar_b_months_per_year, lunar_b_day_start) if config.INCLUDE_LUNAR_CALENDAR_B else None
-
-    # --- Write to CSV ---
-    with open(output_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(HEADERS)
-
-        for day in range(sim_days):
-            # --- tick moons and sun ---
-            moon_a.tick_day() if moon_a else None
-            moon_b.tick_day() if moon_b else None
-            sun.tick_day()
-
-            # --- tick lunar calendars ---
-            if lc_state_a and moon_a:
-                lc_state_a.tick(moon_a, day)
-            if lc_state_b and moon_b:
-                lc_state_b.tick(moon_b, day)
-                    
-            # --- update lunisolar state ---
-            if ls_state and moon_a:
-                tick_ls_state(ls_state, moon_a, sun)
-
-            dates : list[Date] = []
-
-            # --- build row ---
-            row = {"Day": str(day)}
-            if config.INCLUDE_LUNAR_PHASES:
-                compute_lunar_phases(row, moon_a, moon_b, config.INCLUDE_RAW_PHASE_FIGURES)
-            if config.INCLUDE_SOLAR_PHASES:
-                compute_solar_phases(row, sun, config.INCLUDE_RAW_PHASE_FIGURES)
-            if config.INCLUDE_SOLAR_CALENDAR:
-                solar_date = compute_solar_calendar(row, day)
-                dates.append(solar_date) if solar_date else None
-            if ls_state: 
-                Lunisolar_date = compute_lunisolar_calendar(row, ls_state)
-                dates.append(Lunisolar_date) if Lunisolar_date else None
-            if lc_state_a or lc_state_b:
-                lunar_date_a, lunar_date_b = compute_lunar_calendars(row, lc_state_a, lc_state_b)
-                dates.append(lunar_date_a) if lunar_date_a else None
-                dates.append(lunar_date_b) if lunar_date_b else None
-            if config.INCLUDE_USER_DEFINED_EVENTS:
-                compute_events(row, dates)
-
-            writer.writerow([row.get(h, "") for h in HEADERS])
-
-    click.echo(f"✓ Calendar written to {output_file}")
\ No newline at end of file
+    # --- every setting, keyed like main.DEFAULTS, with incompatible ones resolved; checked by building its CalendarSpec ---
+    spec = resolved_spec(dict(locals()), interactive=interactive)
+    calendar_spec = calendar_spec_for(spec, engine, output_format)
+
+    if end_day is None:
+        end_day = sim_days
+    check_window(start_day, end_day)
+
+    sharded = bool(shard_rows or shard_years)
+    if output_format == "csv":
+        compression = output_compression(output_file, compression)
+    elif compression not in (None, "none"):
+        raise click.ClickException("Only CSV output can be compressed.")
+    else:
+        compression = None
+    if cache and (output_format != "csv" or keep_shards):
+        raise click.ClickException("The result cache only serves merged CSV output; it can't be combined with another --format or --keep-shards.")
+    if sharded and (output_format == "tlog" or cache or keep_shards):
+        raise click.ClickException("Sharded output can't be combined with --format tlog, --cache or --keep-shards.")
+    if resume and not sharded and (output_format != "csv" or workers > 1 or cache):
+        raise click.ClickException("Only serial CSV generation without --cache, or sharded generation, can be resumed.")
+    if output_format == "tlog" and (calendar_spec.include_event_times or calendar_spec.rows_per_day > 1):
+        raise click.ClickException("The transition store holds whole days without event times; use another --format.")
+    if calendar_spec.rows_per_day > 1 and engine != "numpy":
+        raise click.ClickException("Sub-day resolutions are generated by the numpy engine (--engine numpy).")
+
+    served = False
+    if cache:
+        from result_cache import ResultCache
+        served = ResultCache().generate(spec, output_file, start_day, end_day, engine, workers, compression)
+
+    if served:
+        written = [output_file]
+    elif sharded:
+        from sharding import generate_shards
+        path = generate_shards(spec, output_file, start_day, end_day, engine, output_format, compression,
+                               shard_rows, shard_years, workers, resume)
+        written = [path]
+    elif output_format == "tlog":
+        # only the days where something changes, walked event by event (engine and workers don't apply)
+        from transition_store import write_store
+        write_store(output_file, spec, CalendarEngine(calendar_spec).state_at(start_day - 1), end_day)
+        written = [output_file]
+    elif workers > 1:
+        from parallel import generate_parallel
+        written = generate_parallel(spec, output_file, start_day, end_day, workers, engine, output_format, keep_shards, compression)
+    else:
+        # --- Initialize celestial bodies and states at the start of the window, or where a checkpoint left off ---
+        state, checkpointer, append = None, None, False
+        if checkpoint_every is None:
+            checkpoint_every = config.CHECKPOINT_DAYS if resume else 0
+        if output_format == "csv" and checkpoint_every > 0:
+            from checkpoint import Checkpointer
+            checkpointer = Checkpointer(output_file, checkpoint_run(spec, start_day, end_day, engine), checkpoint_every)
+        if resume:
+            state, append = resume_state(spec, output_file, start_day, end_day, engine, output_format), True
+        if state is None:
+            state, append = CalendarEngine(calendar_spec).state_at(start_day - 1), False
+        write_days(output_file, state, end_day, engine, output_format, append=append, checkpointer=checkpointer, compression=compression)
+        if checkpointer:
+            checkpointer.finish()
+        written = [output_file]
+
+    for path in written:
+        click.echo(f"✓ Calendar written to {path}")
+    return written
@@ -0,0 +1,131 @@
+import threading
+from collections import OrderedDict
+import config
+from calendars.enums import Calendar
+from calendars.lunisolar_calendar import lunisolar_calendar
+from calendars.lunar_calendar import LunarCalendarState
+from moon_registry import calendar_named, calendar_name
+from engine import build_record
+from calendar_gen import resolved_spec, engine_for, records_after, row_values
+
+class UnknownCalendar(LookupError):
+    """A calendar name the profile has no calendar for."""
+
+class CalendarQuery:
+    """
+    Answers day -> every calendar's date, date -> day and next-event queries about one profile.
+    A day is computed on its own with state_at() the first time its solar year is asked about;
+    once a year is asked about again its rows are computed at once by the events engine into a
+    year table, of which the most recently used `year_tables` are kept. Dates are turned into
+    days in closed form by each calendar's day_of(). Phases are exact, as with state_at().
+    Queries can run in several threads at once: the year table LRU and counters are kept under a
+    lock, and days and tables are computed outside it.
+    """
+    def __init__(self, spec : dict, year_tables : int | None = None):
+        self.spec = resolved_spec(spec)
+        self.engine = engine_for(self.spec)
+        self.calendar_spec = self.engine.spec
+        self.solar_calendar = self.calendar_spec.solar_calendar
+        self.events = self.calendar_spec.events
+        self.year_tables = config.SERVER_YEAR_TABLES if year_tables is None else year_tables
+        self.tables : OrderedDict[int, list[dict]] = OrderedDict()
+        self.seen : OrderedDict[int, None] = OrderedDict() # years asked about once, not yet worth a table
+        self.hits = 0
+        self.misses = 0
+        self.direct = 0 # days computed on their own
+        self.lock = threading.Lock()
+
+    def table(self, year : int) -> tuple[int, list[dict]]:
+        """First day and rows of (0-based) solar year `year`, clipped to day 0."""
+        first = max(self.solar_calendar.year_start(year), 0)
+        with self.lock:
+            rows = self.tables.get(year)
+            if rows is not None:
+                self.hits += 1
+                self.tables.move_to_end(year)
+                return first, rows
+            self.misses += 1
+        stop = self.solar_calendar.year_start(year + 1)
+        rows = [row_values(record) for record in records_after(self.engine.state_at(first - 1), stop, "events")]
+        with self.lock:
+            self.tables[year] = rows
+            if len(self.tables) > self.year_tables:
+                self.tables.popitem(last=False)
+        return first, rows
+
+    def day(self, day : int) -> dict:
+        """Every column of a day (>= 0), keyed by header."""
+        if day < 0:
+            raise ValueError("Days start at 0.")
+        year, _, _ = self.solar_calendar.locate(day)
+        with self.lock:
+            direct = year not in self.tables and year not in self.seen
+            if direct:
+                self.seen[year] = None
+                self.direct += 1
+                if len(self.seen) > 16 * self.year_tables:
+                    self.seen.popitem(last=False)
+            else:
+                self.seen.pop(year, None)
+        if direct:
+            return row_values(build_record(self.engine.state_at(day)))
+        first, rows = self.table(year)
+        return rows[day - first]
+
+    def calendar(self, name : str) -> Calendar | str:
+        """The calendar with a name; UnknownCalendar if this profile has no such calendar."""
+        calendar = calendar_named(name)
+        if calendar not in (Calendar.Solar, Calendar.Lunisolar) and calendar not in [c.calendar for c in self.engine.registry.calendars()]:
+            raise UnknownCalendar(name)
+        return calendar
+
+    def enabled(self, calendar : Calendar | str) -> bool:
+        engine = self.engine
+        if calendar == Calendar.Solar:
+            return self.calendar_spec.include_solar_calendar
+        if calendar == Calendar.Lunisolar:
+            return engine.include_lunisolar_calendar
+        return engine.registry.find_calendar(calendar) is not None
+
+    def day_of(self, calendar : Calendar | str, year : int, month : int, day : int) -> int | None:
+        """The day a date (as displayed, day may be LAST_DAY) falls on, None if the calendar never shows it."""
+        if not self.enabled(calendar):
+            return None
+        engine = self.engine
+        registry = engine.registry
+        if calendar == Calendar.Solar:
+            found = self.solar_calendar.day_of(year, month, day)
+        elif calendar == Calendar.Lunisolar:
+            found = lunisolar_calendar(registry.enabled[registry.lunisolar].synodic_month, engine.astronomical_year, self.calendar_spec.lunisolar).day_of(year, month, day)
+        else:
+            i, definition = registry.find_calendar(calendar)
+            found = LunarCalendarState(definition.months_per_year, definition.day_start).day_of(registry.enabled[i].synodic_month, year, month, day)
+        return found if found is not None and found >= 0 else None
+
+    def next_event(self, name : str, from_day : int = 0, horizon : int = 1000) -> int | None:
+        """
+        The first day on or after from_day with the user-defined event `name`, looking at most
+        `horizon` years ahead in the event's calendar. None if it doesn't occur by then.
+        """
+        if not self.calendar_spec.include_user_defined_events:
+            return None
+        today = self.day(from_day)
+        best = None
+        for entries in self.events.by_key.values():
+            for _, event_name, date in entries:
+                if event_name != name:
+                    continue
+                year = today.get(f"{calendar_name(date.calendar)}_Year", 1)
+                for y in range(year, year + horizon):
+                    if not date.occurs_in(y):
+                        continue
+                    day = self.day_of(date.calendar, y, date.month, date.day)
+                    if day is not None and day >= from_day:
+                        if best is None or day < best:
+                            best = day
+                        break
+        return best
+
+    def event_names(self) -> list[str]:
+        names = {name for entries in self.events.by_key.values() for _, name, _ in entries}
+        return sorted(names)
@@ -0,0 +1,63 @@
+from constants import RESOLUTIONS
+from moon_registry import MoonRegistry
+from calendars.solar_calendar import SolarCalendar
+from calendars.lunisolar_calendar import LunisolarRules
+from user_defined_events import EventIndex
+
+class CalendarSpec:
+    """
+    Everything generating one calendar reads, resolved once and frozen: the moons and the sun's
+    year, the solar calendar (month lengths and names, leap rule and offset), the lunisolar rules
+    and month names, the events matched against, which features are on and how many rows a day
+    gets (resolution, see constants.RESOLUTIONS). Every DayState carries
+    its spec to the compute functions, so calendars with different settings can be generated at
+    the same time (threads, asyncio executors) without any module state between them. Built from a
+    settings dict by calendar_gen.calendar_spec_for(); the registry, calendars and events it holds
+    are shared read-only.
+    """
+    __slots__ = (
+        "registry", "astronomical_year",
+        "solar_calendar", "lunisolar", "events",
+        "include_lunar_phases", "include_solar_phases", "include_raw_phase_figures",
+        "include_solar_calendar", "include_lunisolar_calendar", "include_user_defined_events",
+        "legacy_phases", "include_event_times", "resolution",
+    )
+
+    def __init__(
+        self,
+        registry : MoonRegistry,
+        astronomical_year : float,
+        solar_calendar : SolarCalendar,
+        lunisolar : LunisolarRules,
+        events : EventIndex,
+        include_lunar_phases : bool = True,
+        include_solar_phases : bool = True,
+        include_raw_phase_figures : bool = True,
+        include_solar_calendar : bool = True,
+        include_lunisolar_calendar : bool = True,
+        include_user_defined_events : bool = True,
+        legacy_phases : bool = False,
+        include_event_times : bool = False,
+        resolution : str = "day",
+    ):
+        values = dict(locals())
+        # the lunisolar calendar can only follow an enabled moon
+        values["include_lunisolar_calendar"] = include_lunisolar_calendar and registry.lunisolar is not None
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    @property
+    def rows_per_day(self) -> int:
+        """Rows written for every day at the spec's resolution (see constants.RESOLUTIONS)."""
+        return RESOLUTIONS[self.resolution]
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CalendarSpec is immutable (can't set {name}); use replace()")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"CalendarSpec is immutable (can't delete {name})")
+
+    def replace(self, **changes) -> "CalendarSpec":
+        """A copy of the spec with some fields changed."""
+        return CalendarSpec(**{name: changes.pop(name, getattr(self, name)) for name in self.__slots__}, **changes)
+
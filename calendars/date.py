@@ -1,11 +1,14 @@
 from calendars.enums import Calendar
 
+LAST_DAY = -1 # AnnualDate day that matches the last day of the month, whatever its length
+
 class Date():
-    def __init__(self, calendar : Calendar, year : int, month : int, day : int):
+    def __init__(self, calendar : Calendar, year : int, month : int, day : int, is_last_day : bool = False):
         self.calendar = calendar
         self.year = year
         self.month = month
         self.day = day
+        self.is_last_day = is_last_day
 
     def get_date(self):
         return f"{self.year}-{self.month:02d}-{self.day:02d}"
@@ -22,10 +25,29 @@ class CalendarAgnosticDate():
         self.day = date.day
 
 class AnnualDate():
-    def __init__(self, calendar : Calendar, month : int, day : int):
+    """
+    A recurring date. day may be LAST_DAY. The date recurs every `every_years` years
+    counted from first_year (or year 1), optionally only up to last_year.
+    """
+    def __init__(self, calendar : Calendar, month : int, day : int, every_years : int = 1, first_year : int | None = None, last_year : int | None = None):
         self.calendar = calendar
         self.month = month
         self.day = day
+        self.every_years = every_years
+        self.first_year = first_year
+        self.last_year = last_year
+
+    def occurs_in(self, year : int) -> bool:
+        first = self.first_year if self.first_year is not None else 1
+        if year < first and self.first_year is not None:
+            return False
+        if self.last_year is not None and year > self.last_year:
+            return False
+        return (year - first) % self.every_years == 0
 
     def matches(self, date : Date) -> bool:
-        return self.calendar == date.calendar and self.month == date.month and self.day == date.day
+        if self.calendar != date.calendar or self.month != date.month:
+            return False
+        if self.day != date.day and not (self.day == LAST_DAY and date.is_last_day):
+            return False
+        return self.occurs_in(date.year)
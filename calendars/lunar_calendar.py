@@ -1,7 +1,6 @@
-from localization import LUNAR_A_MONTHS_NAMES, LUNAR_B_MONTHS_NAMES
-from astronomy.core_math import phase_crossed
+from astronomy.core_math import phase_crossed, crossings, crossing_tick
 from astronomy.celestial_bodies import Moon
-from calendars.date import Date
+from calendars.date import Date, LAST_DAY
 from calendars.enums import Calendar
 
 class LunarCalendarState:
@@ -26,31 +25,48 @@ class LunarCalendarState:
             self.month = 0
             self.year += 1
 
-def compute_lunar_calendars(row : dict[str, str], lc_state_a : LunarCalendarState | None, lc_state_b : LunarCalendarState | None):
-    dateA = None
-    if lc_state_a and lc_state_a.started:
-        month = lc_state_a.month
-        month_name = LUNAR_A_MONTHS_NAMES[month]
-        
-        row["LunarA_Year"] = str(lc_state_a.year + 1)
-        row["LunarA_Month_#"] = str(month + 1)
-        row["LunarA_Month"] = month_name
-        row["LunarA_Day"] = str(lc_state_a.day + 1)
+    def seek(self, moon : Moon, day : int):
+        """Set the state to what tick() would have produced after days 0..day, without replaying them."""
+        period = moon.synodic_month
+        fulls = crossings(day + 1, period, 0.5)
+        fulls_before_start = crossings(max(self.start_day, 0), period, 0.5)
+        months = fulls - fulls_before_start # the first full moon on or after start_day both starts the calendar and ticks a month
+        if months <= 0:
+            self.year, self.month, self.day = 0, 0, 0
+            self.started = False
+            return
+        self.started = True
+        self.year, self.month = divmod(months, self.month_num)
+        self.day = day - (crossing_tick(fulls, period, 0.5) - 1)
 
-        dateA = Date(Calendar.LunarA, lc_state_a.year + 1, month + 1, lc_state_a.day + 1)
-    
-    dateB = None
-    if lc_state_b and lc_state_b.started:
-        month = lc_state_b.month
-        month_name = LUNAR_B_MONTHS_NAMES[month]
-        
-        row["LunarB_Year"] = str(lc_state_b.year + 1)
-        row["LunarB_Month_#"] = str(month + 1)
-        row["LunarB_Month"] = month_name
-        row["LunarB_Day"] = str(lc_state_b.day + 1)
+    def months(self, synodic_month : float, end_day : int | None = None):
+        """(start day, year, month, number of its first day, days) of every month shown from day 0 on (up to end_day if given), in order."""
+        if end_day is None:
+            end_day = float("inf")
+        fulls_before_start = crossings(max(self.start_day, 0), synodic_month, 0.5)
+        months = 1 # the first full moon on or after start_day both starts the calendar and ticks a month
+        start = crossing_tick(fulls_before_start + 1, synodic_month, 0.5) - 1
+        while start < end_day:
+            stop = crossing_tick(fulls_before_start + months + 1, synodic_month, 0.5) - 1
+            year, month = divmod(months, self.month_num)
+            yield start, year + 1, month + 1, 1, stop - start
+            start = stop
+            months += 1
 
-        dateB = Date(Calendar.LunarB, lc_state_b.year + 1, month + 1, lc_state_b.day + 1)
+    def day_of(self, synodic_month : float, year : int, month : int, day : int) -> int | None:
+        """The simulated day of a date as displayed (1-based, day may be LAST_DAY), None if there is no such date."""
+        months = (year - 1) * self.month_num + month - 1
+        if months < 1 or not 1 <= month <= self.month_num:
+            return None
+        fulls = months + crossings(max(self.start_day, 0), synodic_month, 0.5)
+        first = crossing_tick(fulls, synodic_month, 0.5) - 1
+        length = crossing_tick(fulls + 1, synodic_month, 0.5) - 1 - first
+        day0 = length - 1 if day == LAST_DAY else day - 1
+        return first + day0 if 0 <= day0 < length else None
 
-    return dateA, dateB
-
-    
+    def date(self, calendar : Calendar, moon : Moon | None = None) -> Date | None:
+        """Today's date; with the moon it follows, the date also knows whether it is the last day of its month."""
+        if not self.started:
+            return None
+        is_last_day = moon is not None and phase_crossed(moon.phase, moon.next_phase(), 0.5)
+        return Date(calendar, self.year + 1, self.month + 1, self.day + 1, is_last_day)
@@ -1,10 +1,13 @@
+import threading
+from bisect import bisect_right
+from functools import lru_cache
 from constants import SOLAR_MARKERS
-from settings import STARTING_MOON_PHASE, STARTING_SOLAR_MARKER
+from settings import STARTING_MOON_PHASE, STARTING_SOLAR_MARKER, LUNISOLAR_SCHEME, LUNISOLAR_COMMON_MONTHS, LUNISOLAR_CYCLE_YEARS, LUNISOLAR_CYCLE_LEAP_YEARS, LUNISOLAR_INTERCALARY_MONTH
 from localization import LUNISOLAR_MONTH_NAMES
-from astronomy.core_math import phase_crossed
-from astronomy.enums import SyzygyType
+from astronomy.core_math import phase_crossed, crossings, crossing_tick
+from astronomy.enums import SolarMarker, SyzygyType
 from astronomy.celestial_bodies import Moon, Sun
-from calendars.date import Date
+from calendars.date import Date, LAST_DAY
 from calendars.enums import Calendar
 
 class LunisolarState:
@@ -14,35 +17,208 @@ class LunisolarState:
         self.day = 0
         self.awaiting_new_year = False
 
-def compute_lunisolar_state_tick(ls_state : LunisolarState, moon : Moon, sun : Sun):
-    ls_state.day += 1 # tick a day
+class LunisolarRules:
+    """
+    How a lunisolar calendar counts: the solar marker that makes a new year due, the syzygy that
+    opens a month, the year scheme ("observational" or "cycle", with the cycle's common months,
+    length, leap years and intercalary month) and the month names. Defaults are settings.py's and
+    localization.py's. Read-only once built; calendars with different rules can run side by side.
+    """
+    def __init__(self, starting_solar_marker : SolarMarker = STARTING_SOLAR_MARKER, starting_moon_phase : SyzygyType = STARTING_MOON_PHASE,
+                 scheme : str = LUNISOLAR_SCHEME, common_months : int = LUNISOLAR_COMMON_MONTHS, cycle_years : int = LUNISOLAR_CYCLE_YEARS,
+                 cycle_leap_years = LUNISOLAR_CYCLE_LEAP_YEARS, intercalary_month : int = LUNISOLAR_INTERCALARY_MONTH,
+                 month_names = LUNISOLAR_MONTH_NAMES):
+        if scheme not in ("observational", "cycle"):
+            raise ValueError(f"Unknown lunisolar scheme: {scheme}")
+        self.starting_solar_marker = starting_solar_marker
+        self.starting_moon_phase = starting_moon_phase
+        self.scheme = scheme
+        self.common_months = common_months
+        self.cycle_years = cycle_years
+        self.cycle_leap_years = tuple(cycle_leap_years)
+        self.intercalary_month = intercalary_month
+        self.month_names = tuple(month_names)
+        self.marker_phase = {value: key for key, value in SOLAR_MARKERS.items()}[starting_solar_marker] # sun phase of the marker that opens a year
+        self.month_phase = 0.5 if starting_moon_phase == SyzygyType.Full else 0.0 # moon phase that opens a month
+
+    def starts_month(self, prev_phase : float, curr_phase : float) -> bool:
+        mp = None
+        if phase_crossed(prev_phase, curr_phase, 0.5):
+            mp = SyzygyType.Full
+        elif phase_crossed(prev_phase, curr_phase, 0):
+            mp = SyzygyType.New
+        return mp == self.starting_moon_phase
+
+    def cycle_months(self, year : int) -> int:
+        """Months in full year `year` (ls_state.year >= 1) under the cycle scheme."""
+        leap = (year - 1) % self.cycle_years + 1 in self.cycle_leap_years
+        return self.common_months + 1 if leap else self.common_months
+
+    def new_year_due(self, ls_state : LunisolarState) -> bool:
+        """Whether the month that just started opens a new year. The partial first year always waits for the solar marker."""
+        if self.scheme == "cycle" and ls_state.year > 0:
+            return ls_state.month >= self.cycle_months(ls_state.year)
+        return ls_state.awaiting_new_year
+
+    def month_name_index(self, year : int, month : int) -> int:
+        """Index into month_names of a (0-based) month; an intercalary month inside the year shifts the months after it."""
+        if self.scheme != "cycle" or year == 0 or month < self.intercalary_month or self.cycle_months(year) == self.common_months:
+            return month
+        return self.common_months if month == self.intercalary_month else month - 1
+
+    def month_name(self, year : int, month : int) -> str:
+        return self.month_names[self.month_name_index(year, month)]
 
-    inverted_dict = {value: key for key, value in SOLAR_MARKERS.items()}
-    looking_for = inverted_dict[STARTING_SOLAR_MARKER]
+LUNISOLAR_RULES = LunisolarRules()
 
-    if phase_crossed(sun.prev_phase, sun.phase, looking_for):
+def compute_lunisolar_state_tick(ls_state : LunisolarState, moon : Moon, sun : Sun, rules : LunisolarRules):
+    ls_state.day += 1 # tick a day
+
+    if phase_crossed(sun.prev_phase, sun.phase, rules.marker_phase):
         ls_state.awaiting_new_year = True
     
-    mp = None
-    if phase_crossed(moon.prev_phase, moon.phase, 0.5):
-        mp = SyzygyType.Full
-    elif phase_crossed(moon.prev_phase, moon.phase, 0):
-        mp = SyzygyType.New
-    if mp == STARTING_MOON_PHASE: # if at the start of a month, tick months and reset days
+    if rules.starts_month(moon.prev_phase, moon.phase): # if at the start of a month, tick months and reset days
         ls_state.month += 1
         ls_state.day = 0
-        if ls_state.awaiting_new_year:
+        if rules.new_year_due(ls_state):
             ls_state.month = 0
             ls_state.year += 1
             ls_state.awaiting_new_year = False
 
-def compute_lunisolar_calendar(row : dict[str, str], ls_state : LunisolarState):
-    month = ls_state.month
-    month_name = LUNISOLAR_MONTH_NAMES[month]
-    
-    row["Lunisolar_Year"] = str(ls_state.year + 1)
-    row["Lunisolar_Month_#"] = str(month + 1)
-    row["Lunisolar_Month"] = month_name
-    row["Lunisolar_Day"] = str(ls_state.day + 1)
+class LunisolarYear:
+    """One lunisolar year: the day it starts on, the length of each month and the position of its intercalary month (None if it has none)."""
+    __slots__ = ("year", "start_day", "month_lengths", "intercalary")
+
+    def __init__(self, year : int, start_day : int, month_lengths : list[int], intercalary : int | None):
+        self.year = year
+        self.start_day = start_day
+        self.month_lengths = month_lengths
+        self.intercalary = intercalary
+
+class LunisolarCalendar:
+    """
+    The lunisolar years of one moon and sun, worked out a year at a time from the closed-form
+    syzygy and marker days and cached. Months are counted by the global index of the syzygy
+    that opens them (0 for the month the simulation starts in), so dating a day is a closed-form
+    count of syzygies and of the markers before its month, or of whole cycles under the cycle
+    scheme, whatever the day.
+    Assumes a year is longer than a month, so every solar marker is followed by a new year before the next one.
+    The cache only grows, under a lock, so threads can share a calendar.
+    """
+    def __init__(self, synodic_month : float, solar_year : float, rules : LunisolarRules):
+        self.synodic_month = synodic_month
+        self.solar_year = solar_year
+        self.rules = rules
+        self.years : dict[int, LunisolarYear] = {}
+        self.lock = threading.RLock()
+        if rules.scheme == "cycle":
+            # months in the first j years of a cycle, j = 0..cycle_years
+            self.cycle_prefix = [0]
+            for year in range(1, rules.cycle_years + 1):
+                self.cycle_prefix.append(self.cycle_prefix[-1] + rules.cycle_months(year))
+
+    def month_start_day(self, month_index : int) -> int:
+        return crossing_tick(month_index, self.synodic_month, self.rules.month_phase) - 1 if month_index > 0 else 0
+
+    def marker_month(self, k : int) -> int:
+        """Index of the first month starting on or after the day of the k-th (1-based) marker."""
+        marker_day = crossing_tick(k, self.solar_year, self.rules.marker_phase) - 1
+        return crossings(marker_day, self.synodic_month, self.rules.month_phase) + 1
+
+    def opening_month(self, year : int) -> int:
+        """Index of the month opening `year` (0-based); year 0 opens with the simulation."""
+        if year == 0:
+            return 0
+        if self.rules.scheme == "cycle" and year > 1:
+            cycles, rem = divmod(year - 1, self.rules.cycle_years)
+            return self.marker_month(1) + cycles * self.cycle_prefix[-1] + self.cycle_prefix[rem]
+        return self.marker_month(year)
+
+    def month_year(self, month_index : int) -> int:
+        """The year (0-based) month `month_index` belongs to."""
+        if month_index == 0:
+            return 0
+        if self.rules.scheme == "cycle":
+            first = self.marker_month(1)
+            if month_index < first:
+                return 0
+            cycles, rem = divmod(month_index - first, self.cycle_prefix[-1])
+            return 1 + cycles * self.rules.cycle_years + bisect_right(self.cycle_prefix, rem) - 1
+        # a year opens with the first month on or after each marker, so a month is in the year of the markers seen by its first day
+        return crossings(self.month_start_day(month_index) + 1, self.solar_year, self.rules.marker_phase)
+
+    def year(self, year : int) -> LunisolarYear:
+        entry = self.years.get(year)
+        if entry is None:
+            rules = self.rules
+            first, stop = self.opening_month(year), self.opening_month(year + 1)
+            starts = [self.month_start_day(j) for j in range(first, stop + 1)]
+            months = stop - first
+            if year == 0:
+                intercalary = None
+            elif rules.scheme == "cycle":
+                intercalary = rules.intercalary_month if months > rules.common_months else None
+            else:
+                intercalary = rules.common_months if months > rules.common_months else None
+            entry = LunisolarYear(year, starts[0], [b - a for a, b in zip(starts, starts[1:])], intercalary)
+            with self.lock:
+                entry = self.years.setdefault(year, entry)
+        return entry
+
+    def locate(self, day : int) -> tuple[int, int, int]:
+        """(year, month, day) of LunisolarState after ticking through `day`."""
+        month_index = crossings(day + 1, self.synodic_month, self.rules.month_phase)
+        year = self.month_year(month_index)
+        month = month_index - self.opening_month(year)
+        if month_index > 0:
+            return year, month, day - self.month_start_day(month_index)
+        return year, month, day + 1 # the first month starts counting at 1, not at a syzygy
+
+    def months(self, end_day : int | None = None):
+        """(start day, year, month, number of its first day, days) of every month shown from day 0 on (up to end_day if given), in order."""
+        if end_day is None:
+            end_day = float("inf")
+        year = 0
+        while self.year(year).start_day < end_day:
+            entry = self.year(year)
+            start = entry.start_day
+            for month, length in enumerate(entry.month_lengths):
+                if start < end_day:
+                    # the first month starts counting at 1, not at a syzygy, so day 0 is its day 2
+                    yield start, year + 1, month + 1, 2 if year == 0 and month == 0 else 1, length
+                start += length
+            year += 1
+
+    def day_of(self, year : int, month : int, day : int) -> int | None:
+        """The simulated day of a date as displayed (1-based, day may be LAST_DAY), None if there is no such date."""
+        if year < 1:
+            return None
+        entry = self.year(year - 1)
+        if not 1 <= month <= len(entry.month_lengths):
+            return None
+        first = entry.start_day + sum(entry.month_lengths[:month - 1])
+        length = entry.month_lengths[month - 1]
+        shift = 1 if year == 1 and month == 1 else 0 # the first month starts counting at 1, not at a syzygy
+        day0 = length - 1 if day == LAST_DAY else day - 1 - shift
+        return first + day0 if 0 <= day0 < length else None
+
+    def seek(self, ls_state : LunisolarState, day : int):
+        """Set ls_state to what compute_lunisolar_state_tick would have produced after days 0..day, without replaying them."""
+        ls_state.year, ls_state.month, ls_state.day = self.locate(day)
+        # a marker since the syzygy that opened the year means the next new year is pending
+        opened = self.month_start_day(self.opening_month(ls_state.year)) + 1 if ls_state.year > 0 else 0
+        marker_phase = self.rules.marker_phase
+        ls_state.awaiting_new_year = crossings(day + 1, self.solar_year, marker_phase) > crossings(opened, self.solar_year, marker_phase)
+
+@lru_cache(maxsize=None)
+def lunisolar_calendar(synodic_month : float, solar_year : float, rules : LunisolarRules) -> LunisolarCalendar:
+    return LunisolarCalendar(synodic_month, solar_year, rules)
+
+def seek_lunisolar_state(ls_state : LunisolarState, moon : Moon, sun : Sun, day : int, rules : LunisolarRules):
+    """Set ls_state to what compute_lunisolar_state_tick would have produced after days 0..day, without replaying them."""
+    lunisolar_calendar(moon.synodic_month, sun.solar_year, rules).seek(ls_state, day)
 
-    return Date(Calendar.Lunisolar, ls_state.year + 1, month + 1, ls_state.day + 1)
\ No newline at end of file
+def lunisolar_date(ls_state : LunisolarState, rules : LunisolarRules, moon : Moon | None = None):
+    """Today's date; with the moon, the date also knows whether it is the last day of its month."""
+    is_last_day = moon is not None and rules.starts_month(moon.phase, moon.next_phase())
+    return Date(Calendar.Lunisolar, ls_state.year + 1, ls_state.month + 1, ls_state.day + 1, is_last_day)
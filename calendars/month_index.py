@@ -0,0 +1,50 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from calendars.date import LAST_DAY
+
+MONTH_KEY = 1 << 10 # key of a month: year * MONTH_KEY + month
+
+class MonthIndex:
+    """
+    The months of one calendar as sorted arrays: the day each starts on, its (year, month) key,
+    the number its first day is shown with and its length. Dating a day is a bisect into the
+    start days and finding a date's day a bisect into the keys, both ascending. Months are
+    pulled from `months` (an endless iterator of (start, year, month, first_day, length),
+    see e.g. SolarCalendar.months) only as far as extend() is asked to go.
+    """
+    def __init__(self, months):
+        self.months = iter(months)
+        self.pending = next(self.months, None) # the first month not indexed yet
+        self.starts = array("q")
+        self.keys = array("q")
+        self.first_days = array("q")
+        self.lengths = array("q")
+
+    def extend(self, end_day : int = 0, key : int = 0):
+        """Index every month starting before end_day and every month up to the one with the given key."""
+        while self.pending is not None and (self.pending[0] < end_day or key and (not self.keys or self.keys[-1] < key)):
+            start, year, month, first_day, length = self.pending
+            self.starts.append(start)
+            self.keys.append(year * MONTH_KEY + month)
+            self.first_days.append(first_day)
+            self.lengths.append(length)
+            self.pending = next(self.months, None)
+
+    def date_on(self, day : int) -> tuple[int, int, int] | None:
+        """(year, month, day) shown on a day, None if it falls in no month."""
+        i = bisect_right(self.starts, day) - 1
+        if i < 0 or day - self.starts[i] >= self.lengths[i]:
+            return None
+        year, month = divmod(self.keys[i], MONTH_KEY)
+        return year, month, self.first_days[i] + day - self.starts[i]
+
+    def day_of(self, year : int, month : int, day : int) -> int | None:
+        """The day a date (day may be LAST_DAY) is shown on, None if it isn't in the index."""
+        key = year * MONTH_KEY + month
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        offset = self.lengths[i] - 1 if day == LAST_DAY else day - self.first_days[i]
+        if not 0 <= offset < self.lengths[i]:
+            return None
+        return self.starts[i] + offset
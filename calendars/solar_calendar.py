@@ -1,32 +1,139 @@
+from bisect import bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from math import lcm
 from settings import SOLAR_CIVIL_YEAR as YEAR, SOLAR_MONTH_LENGTHS as MONTH_LENGTHS, SOLAR_CALENDAR_OFFSET as OFFSET
-from localization import SOLAR_MONTH_NAMES as MONTH_NAMES
-from calendars.date import Date
+from settings import SOLAR_LEAP_RULE, SOLAR_LEAP_MONTH, SOLAR_LEAP_DAYS, SOLAR_LEAP_KIND
+from localization import SOLAR_MONTH_NAMES as MONTH_NAMES, SOLAR_LEAP_MONTH_NAME
+from calendars.date import Date, LAST_DAY
 from calendars.enums import Calendar
 
-def find_month_and_day(year_day: int):
-    consumed_days = 0
-    month = 0
-    for ml in MONTH_LENGTHS:
-        if year_day >= consumed_days and year_day < (consumed_days + ml):
-            month_day = year_day - consumed_days
-            return month, month_day
-        month += 1
-        consumed_days += ml
-    return None, None
-
-def compute_solar_calendar(row: dict[str, str], day: int):
-    day -= OFFSET # account for the offset
-    year = day // YEAR
-    yd = day - (YEAR * year)
-    mi, month_day = find_month_and_day(yd)
-    month = mi + 1 if mi is not None else None
-    month_name = MONTH_NAMES[mi] if mi is not None and mi < len(MONTH_NAMES) else None
-    row["Solar_Year"] = str(year + 1)
-    if month is not None:
-        row["Solar_Month_#"] = str(month)
-    row["Solar_Month"] = str(month_name)
-    if month_day is not None:
-        row["Solar_Day"] = str(month_day + 1)
-
-    if month is not None and month_day is not None:
-        return Date(Calendar.Solar, year + 1, month, month_day + 1)
\ No newline at end of file
+class LeapRule:
+    """
+    Which (1-based) years are leap years. terms are (every_n_years, is_leap) pairs and the
+    longest period dividing a year decides, so [(4, True), (100, False), (400, True)] gives
+    Gregorian-style years and [(n, True)] a leap year every n years. No terms, no leap years.
+    """
+    def __init__(self, terms = ()):
+        self.terms = sorted(terms)
+        self.cycle = lcm(*(every for every, _ in self.terms)) if self.terms else 1 # the pattern repeats every cycle years
+
+    def is_leap(self, year : int) -> bool:
+        leap = False
+        for every, is_leap in self.terms:
+            if year % every == 0:
+                leap = is_leap
+        return leap
+
+class SolarCalendar:
+    """
+    A solar calendar's years, precomputed once: a day-of-year -> (month, day) table for common
+    and leap years and the start of every year in one leap cycle, so dating any day costs a
+    divmod and a bisect. A leap year either lengthens month leap_month by leap_days
+    (leap_kind "day") or inserts a month of leap_days days before it (leap_kind "month").
+    Tables are indexed by is_leap (False/True).
+    """
+    def __init__(self, year_length : int, month_lengths : list[int], offset : int, leap_rule : LeapRule | None = None,
+                 leap_month : int = 0, leap_days : int = 0, leap_kind : str = "day",
+                 month_names : list[str] = MONTH_NAMES, leap_month_name : str = SOLAR_LEAP_MONTH_NAME):
+        if leap_kind not in ("day", "month"):
+            raise ValueError(f"Unknown leap kind: {leap_kind}")
+        self.offset = offset
+        self.leap_rule = leap_rule or LeapRule()
+        self.leap_month_name = leap_month_name
+
+        leap_months, leap_names = list(month_lengths), list(month_names)
+        if leap_kind == "day":
+            leap_months[leap_month] += leap_days
+        else:
+            leap_months.insert(leap_month, leap_days)
+            leap_names.insert(leap_month, leap_month_name)
+        self.month_lengths = (list(month_lengths), leap_months)
+        self.month_names = (list(month_names), leap_names)
+        self.year_lengths = (year_length, year_length + leap_days)
+        self.month_starts = tuple([0, *accumulate(self.month_lengths[leap])] for leap in (False, True))
+
+        # --- (month index, month day, is last day) for every day of the year, None past the last month ---
+        self.year_days = tuple(self.build_year_days(self.year_lengths[leap], self.month_lengths[leap]) for leap in (False, True))
+
+        # --- start of each year of one leap cycle, relative to the start of the cycle ---
+        self.cycle_years = self.leap_rule.cycle
+        self.leap_years = [self.leap_rule.is_leap(y + 1) for y in range(self.cycle_years)]
+        self.year_starts = [0]
+        for leap in self.leap_years:
+            self.year_starts.append(self.year_starts[-1] + self.year_lengths[leap])
+        self.cycle_days = self.year_starts[-1]
+
+    @staticmethod
+    def build_year_days(year_length : int, month_lengths : list[int]):
+        year_days = []
+        for mi, ml in enumerate(month_lengths):
+            for month_day in range(ml):
+                year_days.append((mi, month_day, month_day + 1 == ml))
+        year_days = year_days[:year_length]
+        return year_days + [None] * (year_length - len(year_days))
+
+    def locate(self, day : int) -> tuple[int, int, bool]:
+        """The (0-based) year a simulated day falls in, its day of that year and whether the year is a leap year."""
+        cycles, rem = divmod(day - self.offset, self.cycle_days)
+        i = bisect_right(self.year_starts, rem) - 1
+        return cycles * self.cycle_years + i, rem - self.year_starts[i], self.leap_years[i]
+
+    def year_start(self, year : int) -> int:
+        """The simulated day the (0-based) year starts on."""
+        cycles, i = divmod(year, self.cycle_years)
+        return self.offset + cycles * self.cycle_days + self.year_starts[i]
+
+    def is_leap(self, year : int) -> bool:
+        """Whether the (0-based) year is a leap year."""
+        return self.leap_years[year % self.cycle_years]
+
+    def months(self, end_day : int | None = None):
+        """(start day, year, month, number of its first day, days) of every month shown from day 0 on (up to end_day if given), in order."""
+        if end_day is None:
+            end_day = float("inf")
+        year, _, _ = self.locate(0)
+        while self.year_start(year) < end_day:
+            leap = self.is_leap(year)
+            start = self.year_start(year)
+            for mi, length in enumerate(self.month_lengths[leap]):
+                month_start = self.month_starts[leap][mi]
+                length = min(length, self.year_lengths[leap] - month_start) # months past the end of the year are cut short
+                if length > 0 and start + month_start + length > 0 and start + month_start < end_day:
+                    yield start + month_start, year + 1, mi + 1, 1, length
+            year += 1
+
+    def day_of(self, year : int, month : int, day : int) -> int | None:
+        """The simulated day of a date as displayed (1-based, day may be LAST_DAY), None if there is no such date."""
+        leap = self.is_leap(year - 1)
+        lengths = self.month_lengths[leap]
+        if not 1 <= month <= len(lengths):
+            return None
+        day0 = lengths[month - 1] - 1 if day == LAST_DAY else day - 1
+        year_day = self.month_starts[leap][month - 1] + day0
+        if not 0 <= day0 < lengths[month - 1] or year_day >= self.year_lengths[leap]:
+            return None
+        return self.year_start(year - 1) + year_day
+
+    def date(self, day : int):
+        """Returns the (1-based) solar year of a simulated day and its Date, which is None if the day is in no month."""
+        year, yd, leap = self.locate(day)
+        entry = self.year_days[leap][yd]
+        if entry is None:
+            return year + 1, None
+        mi, month_day, is_last_day = entry
+        return year + 1, Date(Calendar.Solar, year + 1, mi + 1, month_day + 1, is_last_day)
+
+    def month_name(self, date : Date | None):
+        if date is None:
+            return None
+        names = self.month_names[self.is_leap(date.year - 1)]
+        mi = date.month - 1
+        return names[mi] if mi < len(names) else None
+
+@lru_cache(maxsize=None)
+def solar_calendar(offset : int = OFFSET) -> SolarCalendar:
+    """The solar calendar of settings.py and localization.py, starting `offset` days off the simulation (one per offset)."""
+    return SolarCalendar(
+        YEAR, MONTH_LENGTHS, offset, LeapRule(SOLAR_LEAP_RULE), SOLAR_LEAP_MONTH, SOLAR_LEAP_DAYS if SOLAR_LEAP_RULE else 0, SOLAR_LEAP_KIND
+    )
@@ -0,0 +1,88 @@
+import json
+import os
+from engine import CalendarEngine, DayState
+from output_files import sync_output
+
+# --- the fields of each part of a DayState that ticking changes ---
+BODY_FIELDS = ("remainder", "phase", "prev_phase")
+MOON_SET_FIELDS = ("remainders", "phases", "prev_phases")
+LUNISOLAR_FIELDS = ("year", "month", "day", "awaiting_new_year")
+LUNAR_FIELDS = ("year", "month", "day", "started")
+
+def checkpoint_path(output_file : str) -> str:
+    return f"{output_file}.ckpt"
+
+def fields(obj, names) -> dict | None:
+    return {name: getattr(obj, name) for name in names} if obj is not None else None
+
+def restore(obj, values : dict | None):
+    if obj is not None and values is not None:
+        for name, value in values.items():
+            setattr(obj, name, value)
+
+def dump_state(state : DayState) -> dict:
+    """Everything needed to rebuild `state` exactly, including accumulated legacy phases (floats survive JSON unchanged)."""
+    return {
+        "day": state.day,
+        "moons": fields(state.moons, MOON_SET_FIELDS),
+        "sun": fields(state.sun, BODY_FIELDS),
+        "ls_state": fields(state.ls_state, LUNISOLAR_FIELDS),
+        "lunar_states": [fields(lc_state, LUNAR_FIELDS) for lc_state in state.lunar_states],
+    }
+
+def load_state(data : dict, calendar_engine : CalendarEngine) -> DayState:
+    """The DayState dump_state() saved, built by the engine the state came from."""
+    state = calendar_engine.state_at(data["day"])
+    for name in ("moons", "sun", "ls_state"):
+        restore(getattr(state, name), data[name])
+    for lc_state, values in zip(state.lunar_states, data["lunar_states"]):
+        restore(lc_state, values)
+    return state
+
+class Checkpointer:
+    """
+    Periodically saves the state of a generation and how much of its output file is
+    complete, so an interrupted run can be resumed (see read_checkpoint). The checkpoint
+    is written to a temporary file and renamed over the old one, after the output it
+    refers to has reached the disk, so it is always either the previous or the new one.
+    """
+    def __init__(self, output_file : str, run : dict, every : int):
+        self.path = checkpoint_path(output_file)
+        self.run = run # the settings and window being generated, checked on resume
+        self.every = every # days between checkpoints
+        self.saved_day = None
+
+    def due(self, state : DayState) -> bool:
+        return self.saved_day is None or state.day - self.saved_day >= self.every
+
+    def save(self, state : DayState, f):
+        """Checkpoint `state`, all of whose days have been written to the open output file f."""
+        checkpoint = {"run": self.run, "offset": sync_output(f), "state": dump_state(state)}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as out:
+            json.dump(checkpoint, out)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, self.path)
+        self.saved_day = state.day
+
+    def finish(self):
+        """The run completed: its checkpoint is no longer needed."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def read_checkpoint(output_file : str, run : dict, calendar_engine : CalendarEngine) -> tuple[DayState, int] | None:
+    """
+    The state and output offset of the last checkpoint of output_file, or None if there is none.
+    Raises ValueError if the checkpoint was made by a run with different settings.
+    """
+    path = checkpoint_path(output_file)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint["run"] != json.loads(json.dumps(run)):
+        raise ValueError(f"{path} was made by a run with different settings; remove it to start over.")
+    if not os.path.exists(output_file) or os.path.getsize(output_file) < checkpoint["offset"]:
+        raise ValueError(f"{output_file} is shorter than its checkpoint; remove {path} to start over.")
+    return load_state(checkpoint["state"], calendar_engine), checkpoint["offset"]
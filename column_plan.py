@@ -0,0 +1,195 @@
+from localization import MOON_PHASE_NAMES, SOLAR_MARKER_NAMES
+from moon_registry import LunarCalendarDef
+from astronomy.enums import MoonPhase
+from astronomy.lunar_phases import syzygy_masks, alignment_name
+from astronomy.solar_phases import solar_marker
+from calendars.enums import Calendar
+from calendars.date import LAST_DAY
+from astronomy.core_math import phase_crossed
+from engine import DayState, event_times
+
+SMALL_INTS = [str(i) for i in range(1024)] # month and day numbers, formatted once
+
+PHASE_NAMES = [MOON_PHASE_NAMES[MoonPhase(i)] for i in range(len(MoonPhase))]
+
+def small_str(i : int) -> str:
+    return SMALL_INTS[i] if 0 <= i < len(SMALL_INTS) else str(i)
+
+class ColumnPlan:
+    """
+    The CSV columns the features state.spec enables fill, compiled once into a list of steps
+    that write straight into fixed slots of a reused row buffer. Columns of disabled
+    features are never touched and stay "".
+    """
+    def __init__(self, headers : list[str], state : DayState):
+        self.spec = spec = state.spec
+        self.slot = {h: i for i, h in enumerate(headers)}
+        self.day_slot = self.slot["Day"]
+        self.row = [""] * len(headers)
+        # the calendars dates are matched against events in, in order
+        self.calendars = [Calendar.Solar, Calendar.Lunisolar] + [definition.calendar for definition in state.registry.lunar_calendars if definition]
+        self.current = [None] * len(self.calendars) # (year, month, day, is_last_day) of each calendar today, None if it has no date
+        self.events = spec.events
+        # only look ahead for the end of the month in calendars that have events on their last day
+        self.needs_last_day = {key[0] for key in self.events.by_key if key[2] == LAST_DAY}
+        self.steps = []
+
+        registry = state.registry
+        if spec.include_lunar_phases:
+            for i, moon in enumerate(registry.enabled):
+                self.steps.append(self.moon_step(i, moon.key))
+            if len(registry.enabled) >= 2:
+                self.steps.append(self.aligned_step(tuple(moon.name for moon in registry.enabled)))
+        if spec.include_solar_phases:
+            self.steps.append(self.solar_phase_step())
+        if spec.include_solar_calendar:
+            self.steps.append(self.solar_calendar_step())
+        if state.ls_state:
+            self.steps.append(self.lunisolar_step())
+        for i, definition in enumerate(registry.lunar_calendars):
+            if definition:
+                self.steps.append(self.lunar_step(i, definition))
+        if spec.include_user_defined_events:
+            self.steps.append(self.events_step())
+        if spec.include_event_times:
+            self.steps.append(self.event_times_step())
+
+    def fill(self, state : DayState) -> list[str]:
+        """The row for the day `state` has been ticked to. The same list is returned every time."""
+        row = self.row
+        row[self.day_slot] = str(state.day)
+        for step in self.steps:
+            step(state, row)
+        return row
+
+    def moon_step(self, index : int, prefix : str):
+        name_slot = self.slot[f"{prefix}_Phase_Name"]
+        raw_slot = self.slot[f"{prefix}_Phase_Raw"] if self.spec.include_raw_phase_figures else None
+        n = len(PHASE_NAMES)
+
+        def step(state : DayState, row : list[str]):
+            p = state.moons.phases[index]
+            row[name_slot] = PHASE_NAMES[int((p * n) + 0.5) % n]
+            if raw_slot is not None:
+                row[raw_slot] = str(round(p, 6))
+        return step
+
+    def aligned_step(self, moon_names : tuple[str, ...]):
+        slot = self.slot["Moon_Phases_Aligned"]
+
+        def step(state : DayState, row : list[str]):
+            row[slot] = alignment_name(moon_names, *syzygy_masks(state.moons))
+        return step
+
+    def solar_phase_step(self):
+        raw_slot = self.slot["Solar_Phase_Raw"] if self.spec.include_raw_phase_figures else None
+        marker_slot = self.slot["Solar_Marker"]
+
+        def step(state : DayState, row : list[str]):
+            sun = state.sun
+            if raw_slot is not None:
+                row[raw_slot] = str(sun.phase)
+            sm = solar_marker(sun.prev_phase, sun.phase)
+            row[marker_slot] = SOLAR_MARKER_NAMES[sm] if sm is not None else ""
+        return step
+
+    def solar_calendar_step(self):
+        year_slot, month_num_slot, month_slot, day_slot = (self.slot[f"Solar_{c}"] for c in ("Year", "Month_#", "Month", "Day"))
+        calendar_index = self.calendars.index(Calendar.Solar)
+        current = self.current
+        solar_calendar = self.spec.solar_calendar
+        locate = solar_calendar.locate
+
+        # --- every day of a common and a leap year, formatted once: (month #, month name, day, (month, day, is_last_day)) ---
+        year_days = ([], [])
+        for leap in (False, True):
+            names = solar_calendar.month_names[leap]
+            for entry in solar_calendar.year_days[leap]:
+                if entry is None:
+                    year_days[leap].append(("", "None", "", None))
+                    continue
+                mi, month_day, is_last_day = entry
+                name = str(names[mi]) if mi < len(names) else "None"
+                year_days[leap].append((small_str(mi + 1), name, small_str(month_day + 1), (mi + 1, month_day + 1, is_last_day)))
+
+        def step(state : DayState, row : list[str]):
+            year, yd, leap = locate(state.day)
+            row[year_slot] = str(year + 1)
+            row[month_num_slot], row[month_slot], row[day_slot], month_day = year_days[leap][yd]
+            current[calendar_index] = (year + 1, *month_day) if month_day else None
+        return step
+
+    def lunisolar_step(self):
+        year_slot, month_num_slot, month_slot, day_slot = (self.slot[f"Lunisolar_{c}"] for c in ("Year", "Month_#", "Month", "Day"))
+        calendar_index = self.calendars.index(Calendar.Lunisolar)
+        current = self.current
+        needs_last_day = Calendar.Lunisolar in self.needs_last_day
+        rules = self.spec.lunisolar
+        month_names, starts_month = rules.month_names, rules.starts_month
+        name_index = rules.month_name_index if rules.scheme == "cycle" else None # months are named in order otherwise
+
+        def step(state : DayState, row : list[str]):
+            ls = state.ls_state
+            row[year_slot] = str(ls.year + 1)
+            row[month_num_slot] = small_str(ls.month + 1)
+            row[month_slot] = month_names[name_index(ls.year, ls.month) if name_index else ls.month]
+            row[day_slot] = small_str(ls.day + 1)
+            moon = state.moons[state.registry.lunisolar]
+            is_last_day = needs_last_day and starts_month(moon.phase, moon.next_phase())
+            current[calendar_index] = (ls.year + 1, ls.month + 1, ls.day + 1, is_last_day)
+        return step
+
+    def lunar_step(self, index : int, definition : LunarCalendarDef):
+        """Columns of the lunar calendar following the registry's index-th enabled moon."""
+        year_slot, month_num_slot, month_slot, day_slot = (self.slot[f"{definition.name}_{c}"] for c in ("Year", "Month_#", "Month", "Day"))
+        calendar_index = self.calendars.index(definition.calendar)
+        current = self.current
+        needs_last_day = definition.calendar in self.needs_last_day
+        month_names = definition.month_names
+
+        def step(state : DayState, row : list[str]):
+            lc = state.lunar_states[index]
+            if not lc.started:
+                row[year_slot] = row[month_num_slot] = row[month_slot] = row[day_slot] = ""
+                current[calendar_index] = None
+                return
+            row[year_slot] = str(lc.year + 1)
+            row[month_num_slot] = small_str(lc.month + 1)
+            row[month_slot] = month_names[lc.month]
+            row[day_slot] = small_str(lc.day + 1)
+            moon = state.moons[index]
+            is_last_day = needs_last_day and phase_crossed(moon.phase, moon.next_phase(), 0.5)
+            current[calendar_index] = (lc.year + 1, lc.month + 1, lc.day + 1, is_last_day)
+        return step
+
+    def events_step(self):
+        slot = self.slot["User_Defined_Events"]
+        current = self.current
+        events = self.events
+        calendars = [(i, calendar) for i, calendar in enumerate(self.calendars) if calendar in events.calendars]
+
+        def step(state : DayState, row : list[str]):
+            hits = []
+            for i, calendar in calendars:
+                date = current[i]
+                if date is not None:
+                    hits.extend(events.match(calendar, *date))
+            if len(hits) > 1:
+                hits.sort()
+            row[slot] = ", ".join([name for _, name in hits])
+        return step
+
+    def event_times_step(self):
+        """The *_Time columns: only the few days with an event have any, so just the slots written the day before are cleared."""
+        slot = self.slot
+        written = []
+
+        def step(state : DayState, row : list[str]):
+            for i in written:
+                row[i] = ""
+            written.clear()
+            for header, time in event_times(state).items():
+                i = slot[header]
+                row[i] = str(round(time, 6))
+                written.append(i)
+        return step
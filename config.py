@@ -1,11 +1,17 @@
-INCLUDE_FIRST_MOON : bool = True
-INCLUDE_SECOND_MOON : bool = True
-INCLUDE_DOUBLE_SYZYGIES : bool = True
-INCLUDE_SOLAR_CALENDAR : bool = True
-INCLUDE_LUNISOLAR_CALENDAR : bool = True
-INCLUDE_LUNAR_CALENDAR_A : bool = True
-INCLUDE_LUNAR_CALENDAR_B : bool = True
-INCLUDE_RAW_PHASE_FIGURES : bool = True
-INCLUDE_SOLAR_PHASES : bool = True
-INCLUDE_LUNAR_PHASES : bool = True
-INCLUDE_USER_DEFINED_EVENTS : bool = True
\ No newline at end of file
+# --- result cache (see result_cache.py) ---
+CACHE_DIR : str = ".calendar_cache"
+CACHE_MAX_BYTES : int = 1 << 30
+
+# --- checkpoints of serial CSV generation (see checkpoint.py) ---
+CHECKPOINT_DAYS : int = 1_000_000
+
+# --- query server (see server.py) ---
+SERVER_YEAR_TABLES : int = 64 # solar years of rows kept in memory
+SERVER_QUERY_THREADS : int = 8 # queries computed at once, off the event loop
+
+# --- date conversion (see conversion.py) ---
+CONVERSION_INDEX_DAYS : int = 4_000_000 # days covered by month indexes; dates past them are converted in closed form
+
+# --- compressed output (see output_files.py) ---
+WRITE_BUFFER : int = 1 << 20 # bytes gathered before each write to a compressor or the disk
+COMPRESSION_LEVELS : dict[str, int] = {"gzip": 6, "zstd": 3, "xz": 6}
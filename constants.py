@@ -19,3 +19,13 @@ SOLAR_MARKERS = {
     0.50: SolarMarker.SummerSolstice,
     0.75: SolarMarker.FallEquinox
 }
+
+# --- Syzygies (fraction of synodic month), new before full ---
+SYZYGIES = (0.0, 0.5)
+
+# --- Output resolutions (rows per day) ---
+RESOLUTIONS = {
+    "day": 1,
+    "hour": 24,
+    "minute": 24 * 60
+}
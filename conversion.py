@@ -0,0 +1,184 @@
+import config
+from calendars.date import Date, LAST_DAY
+from calendars.enums import Calendar
+from moon_registry import calendar_name
+from calendars.month_index import MonthIndex, MONTH_KEY
+from calendars.lunisolar_calendar import lunisolar_calendar
+from calendars.lunar_calendar import LunarCalendarState
+from calendar_gen import resolved_spec, engine_for
+
+class CalendarConverter:
+    """
+    Converts dates between the calendars of one profile through a MonthIndex per calendar,
+    so every conversion is two bisects. Indexes cover days [0, end_day) to begin with and
+    are extended whenever a day or date past them is asked about, up to `horizon` days
+    (config.CONVERSION_INDEX_DAYS); days and dates past that are converted in closed form by
+    each calendar's own day_of() and locate()/seek(), as CalendarQuery does, so a far-off input
+    costs one lookup rather than indexing every month before it.
+    """
+    def __init__(self, spec : dict, end_day : int | None = None, horizon : int | None = None):
+        self.spec = resolved_spec(spec)
+        engine = engine_for(self.spec)
+        self.horizon = config.CONVERSION_INDEX_DAYS if horizon is None else horizon
+        self.end_day = end_day if end_day is not None else self.spec["sim_days"]
+        self.sources = {} # calendar -> months(end_day), see MonthIndex
+        self.closed = {} # calendar -> (date_on(day), day_of(year, month, day)), in closed form
+        if engine.spec.include_solar_calendar:
+            solar = engine.spec.solar_calendar
+            self.sources[Calendar.Solar] = solar.months
+            self.closed[Calendar.Solar] = (lambda day: solar_date_on(solar, day), solar.day_of)
+        registry = engine.registry
+        if engine.include_lunisolar_calendar:
+            lunisolar = lunisolar_calendar(registry.enabled[registry.lunisolar].synodic_month, engine.astronomical_year, engine.spec.lunisolar)
+            self.sources[Calendar.Lunisolar] = lunisolar.months
+            self.closed[Calendar.Lunisolar] = (lambda day: lunisolar_date_on(lunisolar, day), lunisolar.day_of)
+        for moon, definition in zip(registry.enabled, registry.lunar_calendars):
+            if definition:
+                lunar = LunarCalendarState(definition.months_per_year, definition.day_start)
+                self.sources[definition.calendar] = lambda end_day, lunar=lunar, moon=moon: lunar.months(moon.synodic_month, end_day)
+                self.closed[definition.calendar] = (
+                    lambda day, definition=definition, moon=moon: lunar_date_on(definition, moon, day),
+                    lambda year, month, day, lunar=lunar, moon=moon: lunar.day_of(moon.synodic_month, year, month, day),
+                )
+        self.indexes : dict[Calendar | str, MonthIndex] = {}
+        self.horizon_keys : dict[Calendar | str, int] = {}
+
+    def index(self, calendar : Calendar | str, end_day : int = 0, key : int = 0) -> MonthIndex:
+        """
+        The calendar's index (a Calendar or a lunar calendar's name), extended to cover end_day and
+        the month with the given key, as far as the horizon allows.
+        """
+        if calendar not in self.sources:
+            raise ValueError(f"The {calendar_name(calendar)} calendar is disabled in this profile or doesn't exist.")
+        index = self.indexes.get(calendar)
+        if index is None:
+            index = self.indexes[calendar] = MonthIndex(self.sources[calendar](self.horizon))
+            index.extend(end_day=self.end_day)
+        index.extend(end_day, key)
+        return index
+
+    def horizon_key(self, calendar : Calendar | str) -> int:
+        """Key of the last month the index can hold: dates past it are converted in closed form without touching the index."""
+        key = self.horizon_keys.get(calendar)
+        if key is None:
+            index = self.index(calendar)
+            found = self.closed[calendar][0](self.horizon - 1) if self.horizon > 0 else None
+            if found is not None:
+                key = found[0] * MONTH_KEY + found[1]
+            else:
+                # no date on the last day, so go by what the index holds once complete
+                index.extend(self.horizon, 1 << 62)
+                key = index.keys[-1] if index.keys else -1
+            self.horizon_keys[calendar] = key
+        return key
+
+    # --- one date at a time ---
+
+    def month_date(self, calendar : Calendar | str, day : int) -> tuple[int, int, int] | None:
+        """(year, month, day) a calendar shows on a day (>= 0), None if it shows none."""
+        if day < self.horizon:
+            return self.index(calendar, end_day=day + 1).date_on(day)
+        self.index(calendar) # fails on a disabled calendar
+        return self.closed[calendar][0](day)
+
+    def date_day(self, calendar : Calendar | str, year : int, month : int, day : int) -> int | None:
+        """The day a date (day may be LAST_DAY) is shown on, None if it never is."""
+        key = year * MONTH_KEY + month
+        if key <= self.horizon_key(calendar):
+            found = self.index(calendar, key=key).day_of(year, month, day)
+        else:
+            found = self.closed[calendar][1](year, month, day)
+        return found if found is not None and found >= 0 else None
+
+    def date_on(self, day : int, calendar : Calendar | str) -> Date | None:
+        """The date a calendar shows on a day, None if it shows none."""
+        if day < 0:
+            return None
+        found = self.month_date(calendar, day)
+        if found is None:
+            return None
+        year, month, month_day = found
+        return Date(calendar, year, month, month_day, self.date_day(calendar, year, month, LAST_DAY) == day)
+
+    def day_of(self, date : Date) -> int | None:
+        """The day a date (day may be LAST_DAY) is shown on, None if it never is."""
+        return self.date_day(date.calendar, date.year, date.month, date.day)
+
+    def convert(self, date : Date, to_calendar : Calendar | str) -> Date | None:
+        """The date to_calendar shows on the day `date` is shown, None if either doesn't exist."""
+        day = self.day_of(date)
+        return self.date_on(day, to_calendar) if day is not None else None
+
+    # --- arrays of dates ---
+
+    def days_of_many(self, calendar : Calendar | str, years, months, days):
+        """day_of() over arrays of years, months and days (numpy arrays if numpy is installed), -1 where there is no such day."""
+        try:
+            import numpy as np
+        except ImportError:
+            found = [self.day_of(Date(calendar, y, m, d)) for y, m, d in zip(years, months, days)]
+            return [-1 if day is None else day for day in found]
+        years, months, days = (np.asarray(a, dtype=np.int64) for a in (years, months, days))
+        if len(years) == 0:
+            return np.zeros(0, dtype=np.int64)
+        keys = years * MONTH_KEY + months
+        beyond = keys > self.horizon_key(calendar)
+        index = self.index(calendar, key=int(keys[~beyond].max()) if not beyond.all() else 0)
+        result = np.full(len(keys), -1, dtype=np.int64)
+        if index.keys:
+            index_keys, starts, first_days, lengths = (np.frombuffer(a, dtype=np.int64) for a in (index.keys, index.starts, index.first_days, index.lengths))
+            i = np.minimum(np.searchsorted(index_keys, keys), len(index_keys) - 1)
+            offsets = np.where(days == LAST_DAY, lengths[i] - 1, days - first_days[i])
+            found = (index_keys[i] == keys) & (offsets >= 0) & (offsets < lengths[i])
+            result = np.where(found, starts[i] + offsets, -1)
+            result[result < 0] = -1
+        # dates past the horizon, one at a time in closed form
+        for i in np.flatnonzero(beyond).tolist():
+            found = self.date_day(calendar, int(years[i]), int(months[i]), int(days[i]))
+            result[i] = -1 if found is None else found
+        return result
+
+    def dates_on_many(self, day_numbers, calendar : Calendar | str):
+        """date_on() over an array of days: (years, months, days) arrays, all 0 where the calendar shows no date."""
+        try:
+            import numpy as np
+        except ImportError:
+            dates = [self.date_on(day, calendar) for day in day_numbers]
+            return tuple([getattr(d, field) if d else 0 for d in dates] for field in ("year", "month", "day"))
+        day_numbers = np.asarray(day_numbers, dtype=np.int64)
+        zeros = np.zeros(len(day_numbers), dtype=np.int64)
+        if len(day_numbers) == 0:
+            return zeros, zeros, zeros
+        beyond = day_numbers >= self.horizon
+        index = self.index(calendar, end_day=int(day_numbers[~beyond].max()) + 1 if not beyond.all() else 0)
+        if not index.starts:
+            years, months, days = zeros, zeros.copy(), zeros.copy()
+        else:
+            index_keys, starts, first_days, lengths = (np.frombuffer(a, dtype=np.int64) for a in (index.keys, index.starts, index.first_days, index.lengths))
+            j = np.searchsorted(starts, day_numbers, side="right") - 1
+            i = np.maximum(j, 0)
+            found = (day_numbers >= 0) & (j >= 0) & (day_numbers - starts[i] < lengths[i])
+            years, months = np.divmod(index_keys[i], MONTH_KEY)
+            days = first_days[i] + day_numbers - starts[i]
+            years, months, days = (np.where(found, a, 0) for a in (years, months, days))
+        # days past the horizon, one at a time in closed form
+        for i in np.flatnonzero(beyond).tolist():
+            years[i], months[i], days[i] = self.month_date(calendar, int(day_numbers[i])) or (0, 0, 0)
+        return years, months, days
+
+    def convert_many(self, calendar : Calendar | str, years, months, days, to_calendar : Calendar | str):
+        """convert() over arrays of dates: (years, months, days) arrays in to_calendar, all 0 where there is no counterpart."""
+        return self.dates_on_many(self.days_of_many(calendar, years, months, days), to_calendar)
+
+def solar_date_on(solar, day : int) -> tuple[int, int, int] | None:
+    _, date = solar.date(day)
+    return (date.year, date.month, date.day) if date is not None else None
+
+def lunisolar_date_on(lunisolar, day : int) -> tuple[int, int, int] | None:
+    year, month, month_day = lunisolar.locate(day)
+    return year + 1, month + 1, month_day + 1
+
+def lunar_date_on(definition, moon, day : int) -> tuple[int, int, int] | None:
+    lunar = LunarCalendarState(definition.months_per_year, definition.day_start)
+    lunar.seek(moon, day)
+    return (lunar.year + 1, lunar.month + 1, lunar.day + 1) if lunar.started else None
@@ -0,0 +1,178 @@
+from constants import SOLAR_MARKERS, SYZYGIES
+from moon_registry import MoonDef, LunarCalendarDef
+from calendar_spec import CalendarSpec
+from astronomy.core_math import phase_crossed, crossing_time
+from astronomy.celestial_bodies import MoonSet, Sun
+from astronomy.enums import SolarMarker
+from astronomy.lunar_phases import quantize_phase, syzygy_masks, alignment_name
+from astronomy.solar_phases import solar_marker
+from calendars.date import Date
+from calendars.lunar_calendar import LunarCalendarState
+from calendars.lunisolar_calendar import LunisolarState, seek_lunisolar_state, lunisolar_date, compute_lunisolar_state_tick as tick_ls_state
+
+class DayState:
+    """
+    Everything generate_calendar tracks for a single day of the calendar `spec` describes.
+    moons holds the registry's enabled moons; lunar_states the lunar calendar of each of them
+    (None where there is none). ls_state is None when the lunisolar calendar is disabled.
+    """
+    def __init__(self, day : int, spec : CalendarSpec, moons : MoonSet, sun : Sun,
+                 ls_state : LunisolarState | None, lunar_states : list[LunarCalendarState | None]):
+        self.day = day
+        self.spec = spec
+        self.registry = spec.registry
+        self.moons = moons
+        self.sun = sun
+        self.ls_state = ls_state
+        self.lunar_states = lunar_states
+
+    def tick(self):
+        """Advance everything by one day, the same way generate_calendar always has."""
+        self.day += 1
+        # --- tick moons and sun ---
+        moons = self.moons
+        moons.tick_day()
+        self.sun.tick_day()
+
+        # --- tick lunar calendars ---
+        for i, lc_state in enumerate(self.lunar_states):
+            if lc_state:
+                lc_state.tick(moons[i], self.day)
+
+        # --- update lunisolar state ---
+        if self.ls_state:
+            tick_ls_state(self.ls_state, moons[self.registry.lunisolar], self.sun, self.spec.lunisolar)
+
+class DayRecord:
+    """
+    Typed values of a single day of the calendar `spec` describes. Fields of disabled features are None;
+    moons_aligned is "" and events is empty when there is nothing to report.
+    moon_phases and moon_phase_names follow moons, the registry's enabled moons;
+    lunar_dates holds (calendar, date) for every enabled lunar calendar, date None until it starts.
+    event_times maps the *_Time columns of the day's events to their instants (see event_times()).
+    """
+    __slots__ = (
+        "day", "spec",
+        "moons", "moon_phases", "moon_phase_names",
+        "moons_aligned",
+        "solar_phase", "solar_marker",
+        "solar_year", "solar_date",
+        "lunisolar_date",
+        "lunar_dates",
+        "events",
+        "event_times",
+    )
+
+    def __init__(self, day : int, spec : CalendarSpec):
+        self.day = day
+        self.spec = spec
+        self.moons : list[MoonDef] | None = None
+        self.moon_phases : list[float] | None = None
+        self.moon_phase_names : list[str] | None = None
+        self.moons_aligned : str | None = None
+        self.solar_phase : float | None = None
+        self.solar_marker : SolarMarker | None = None
+        self.solar_year : int | None = None
+        self.solar_date : Date | None = None
+        self.lunisolar_date : Date | None = None
+        self.lunar_dates : list[tuple[LunarCalendarDef, Date | None]] = []
+        self.events : list[str] | None = None
+        self.event_times : dict[str, float] | None = None
+
+    def dates(self) -> list[Date]:
+        dates = [self.solar_date, self.lunisolar_date] + [date for _, date in self.lunar_dates]
+        return [d for d in dates if d is not None]
+
+def build_record(state : DayState) -> DayRecord:
+    """Read the features state.spec enables of the day `state` has been ticked to."""
+    record = DayRecord(state.day, state.spec)
+    spec, registry, moons, sun = state.spec, state.registry, state.moons, state.sun
+    if spec.include_lunar_phases and len(moons):
+        record.moons = registry.enabled
+        record.moon_phases = list(moons.phases)
+        record.moon_phase_names = [quantize_phase(p) for p in moons.phases]
+        if len(moons) >= 2:
+            record.moons_aligned = alignment_name(tuple(moon.name for moon in registry.enabled), *syzygy_masks(moons))
+    if spec.include_solar_phases:
+        record.solar_phase = sun.phase
+        record.solar_marker = solar_marker(sun.prev_phase, sun.phase)
+    if spec.include_solar_calendar:
+        record.solar_year, record.solar_date = spec.solar_calendar.date(state.day)
+    if state.ls_state:
+        record.lunisolar_date = lunisolar_date(state.ls_state, spec.lunisolar, moons[registry.lunisolar])
+    for i, lc_state in enumerate(state.lunar_states):
+        if lc_state:
+            definition = registry.lunar_calendars[i]
+            record.lunar_dates.append((definition, lc_state.date(definition.calendar, moons[i])))
+    if spec.include_user_defined_events:
+        record.events = spec.events.matching(record.dates())
+    if spec.include_event_times:
+        record.event_times = event_times(state)
+    return record
+
+def event_times(state : DayState) -> dict[str, float]:
+    """
+    The exact instants (astronomy.core_math.crossing_time) of the syzygies, solar marker and month
+    starts seen on the day `state` has been ticked to, keyed by their *_Time column. Only the
+    features state.spec enables are looked at, and only days with an event get a time.
+    """
+    spec, registry, moons, sun = state.spec, state.registry, state.moons, state.sun
+    ticks = state.day + 1
+    times = {}
+    if spec.include_lunar_phases:
+        for moon, prev, curr in zip(registry.enabled, moons.prev_phases, moons.phases):
+            for target in SYZYGIES:
+                if phase_crossed(prev, curr, target):
+                    times[f"{moon.key}_Syzygy_Time"] = crossing_time(ticks, moon.synodic_month, target)
+                    break
+    if spec.include_solar_phases:
+        for target in SOLAR_MARKERS:
+            if phase_crossed(sun.prev_phase, sun.phase, target):
+                times["Solar_Marker_Time"] = crossing_time(ticks, sun.solar_year, target)
+                break
+    if state.ls_state:
+        moon, rules = moons[registry.lunisolar], spec.lunisolar
+        if rules.starts_month(moon.prev_phase, moon.phase):
+            times["Lunisolar_Month_Start_Time"] = crossing_time(ticks, moon.synodic_month, rules.month_phase)
+    for i, lc_state in enumerate(state.lunar_states):
+        if lc_state and lc_state.started and phase_crossed(moons.prev_phases[i], moons.phases[i], 0.5):
+            times[f"{registry.lunar_calendars[i].name}_Month_Start_Time"] = crossing_time(ticks, moons.synodic_months[i], 0.5)
+    return times
+
+class CalendarEngine:
+    """
+    Random access to the calendar a CalendarSpec describes: the state of any day is computed
+    directly from the phase formulas instead of being simulated from day 0.
+    """
+    def __init__(self, spec : CalendarSpec):
+        self.spec = spec
+        self.registry = spec.registry
+        self.astronomical_year = spec.astronomical_year
+        self.include_lunisolar_calendar = spec.include_lunisolar_calendar
+        self.legacy_phases = spec.legacy_phases # bodies accumulate float phases when ticked (see astronomy.celestial_bodies.Body)
+
+    def state_at(self, day : int) -> DayState:
+        """
+        State after the bodies and calendars have been ticked through `day`.
+        state_at(-1) is the state before the first tick.
+        """
+        registry = self.registry
+        moons = MoonSet([moon.synodic_month for moon in registry.enabled], self.legacy_phases)
+        sun = Sun(self.astronomical_year, self.legacy_phases)
+        moons.seek(day)
+        sun.seek(day)
+
+        ls_state = None
+        if self.include_lunisolar_calendar:
+            ls_state = LunisolarState()
+            seek_lunisolar_state(ls_state, moons[registry.lunisolar], sun, day, self.spec.lunisolar)
+
+        lunar_states = []
+        for i, definition in enumerate(registry.lunar_calendars):
+            lc_state = None
+            if definition:
+                lc_state = LunarCalendarState(definition.months_per_year, definition.day_start)
+                lc_state.seek(moons[i], day)
+            lunar_states.append(lc_state)
+
+        return DayState(day, self.spec, moons, sun, ls_state, lunar_states)
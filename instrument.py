@@ -0,0 +1,244 @@
+import cProfile
+import importlib
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# --- the stages of a generation run, in report order ---
+STAGES = (
+    "body_ticks", # advancing the moons and the sun
+    "calendar_ticks", # advancing the calendar states (the numpy engine does this in each calendar's stage)
+    "compute_lunar_phases",
+    "compute_solar_phases",
+    "compute_solar_calendar",
+    "compute_lunisolar_calendar",
+    "compute_lunar_calendars",
+    "compute_events", # matching user-defined events
+    "compute_event_times", # exact instants of the syzygies, markers and month starts
+    "row_encoding", # assembling rows and records
+    "output", # the rest of the run: CSV encoding, record batches, file I/O, setup
+)
+
+# ColumnPlan step factory -> stage
+PLAN_STAGES = {
+    "moon_step": "compute_lunar_phases",
+    "aligned_step": "compute_lunar_phases",
+    "solar_phase_step": "compute_solar_phases",
+    "solar_calendar_step": "compute_solar_calendar",
+    "lunisolar_step": "compute_lunisolar_calendar",
+    "lunar_step": "compute_lunar_calendars",
+    "events_step": "compute_events",
+    "event_times_step": "compute_event_times",
+}
+
+# numpy_engine function -> stage (write_calendar_columns goes by the calendar it writes)
+NUMPY_STAGES = {
+    "body_phases": "body_ticks",
+    "step_phases": "body_ticks",
+    "finish_block": "body_ticks",
+    "compute_lunar_phases": "compute_lunar_phases",
+    "compute_solar_phases": "compute_solar_phases",
+    "compute_solar_calendar": "compute_solar_calendar",
+    "advance_lunisolar": "compute_lunisolar_calendar",
+    "lunisolar_name_index": "compute_lunisolar_calendar",
+    "advance_lunar_calendar": "compute_lunar_calendars",
+    "write_calendar_columns": lambda args: "compute_lunisolar_calendar" if args[1] == "Lunisolar" else "compute_lunar_calendars",
+    "compute_events": "compute_events",
+    "time_column": "compute_event_times",
+    "compute_block": "row_encoding", # what is left of a block: the Day column, sub-day rows and the column dict
+}
+
+# (module, function or Class.method, stage) timed while instrumenting; ColumnPlan steps are wrapped as plans are built
+HOOKS = [
+    ("astronomy.celestial_bodies", "MoonSet.tick_day", "body_ticks"),
+    ("astronomy.celestial_bodies", "MoonSet.seek", "body_ticks"),
+    ("astronomy.celestial_bodies", "Sun.tick_day", "body_ticks"),
+    ("astronomy.celestial_bodies", "Sun.seek", "body_ticks"),
+    ("engine", "DayState.tick", "calendar_ticks"),
+    ("calendar_gen", "advance_state", "calendar_ticks"),
+    ("column_plan", "ColumnPlan.fill", "row_encoding"),
+    ("calendar_gen", "build_record", "row_encoding"),
+    ("engine", "event_times", "compute_event_times"),
+    ("calendar_gen", "row_values", "row_encoding"),
+    *(("numpy_engine", name, stage) for name, stage in NUMPY_STAGES.items()),
+]
+
+# rows each call of a hooked function produces
+ROW_COUNTS = {
+    "ColumnPlan.fill": lambda args: 1,
+    "build_record": lambda args: 1,
+    "compute_block": lambda args: args[1] * (args[2] if len(args) > 2 else 1),
+}
+
+def peak_rss_kb() -> int | None:
+    """Peak resident set size of this process so far, None where the resource module is missing."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # bytes on macOS, KiB elsewhere
+
+def step_stage(step) -> str:
+    return PLAN_STAGES[step.__qualname__.split(".")[1]] # ColumnPlan.<factory>.<locals>.step
+
+def hook_target(module, attribute : str):
+    """(object holding it, name) of a module's function or Class.method."""
+    owner_name, _, name = attribute.rpartition(".")
+    return (getattr(module, owner_name) if owner_name else module), name
+
+@contextmanager
+def patched(targets : list[tuple[object, str, object]]):
+    """Set attribute `name` of each (owner, name, value) for the duration, restoring the originals after."""
+    saved = [(owner, name, getattr(owner, name)) for owner, name, _ in targets]
+    for owner, name, value in targets:
+        setattr(owner, name, value)
+    try:
+        yield
+    finally:
+        for owner, name, value in reversed(saved):
+            setattr(owner, name, value)
+
+class Instrumentation:
+    """
+    Wall time and call counts per stage of a generation run, rows per second over time, peak
+    resident memory and, with memory, peak traced memory (tracemalloc slows a run several
+    times over, so it is off by default). While active() the hot functions of every engine are swapped for timed
+    wrappers; nothing is patched otherwise, so runs that aren't instrumented pay nothing.
+    A stage's time excludes the stages it calls, and whatever no stage accounts for is "output".
+    Only this process is seen: with workers, chunks generated in the pool count as output.
+    """
+    def __init__(self, memory : bool = False, profile_path : str | None = None, sample_seconds : float = 1.0):
+        self.memory = memory
+        self.profile_path = profile_path
+        self.sample_seconds = sample_seconds
+        self.totals : dict[str, list] = {} # stage -> [seconds, calls]
+        self.rows = 0
+        self.samples : list[tuple[float, int]] = [] # (seconds since the start, rows so far)
+        self.wall = 0.0
+        self.peak_memory : int | None = None # bytes traced, with memory
+        self.peak_rss : int | None = None # KiB
+        self.nested = [] # time spent in stages called by each stage being timed
+
+    def stage_totals(self, stage : str) -> list:
+        return self.totals.setdefault(stage, [0.0, 0])
+
+    def wrap(self, stage, fn, rows = None):
+        """fn with its calls timed and counted under `stage` (or stage(args)) and, with rows(args), the rows they produce."""
+        nested, clock = self.nested, time.perf_counter
+        totals = None if callable(stage) else self.stage_totals(stage)
+
+        def wrapped(*args, **kwargs):
+            nested.append(0.0)
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                entry = totals or self.stage_totals(stage(args))
+                entry[0] += elapsed - nested.pop()
+                entry[1] += 1
+                if nested:
+                    nested[-1] += elapsed
+                if rows:
+                    self.rows += rows(args)
+        return wrapped
+
+    def hook_targets(self) -> list[tuple[object, str, object]]:
+        targets = []
+        for module_name, attribute, stage in HOOKS:
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError:
+                continue # the numpy engine without numpy
+            owner, name = hook_target(module, attribute)
+            targets.append((owner, name, self.wrap(stage, getattr(owner, name), ROW_COUNTS.get(attribute))))
+
+        from column_plan import ColumnPlan
+        init = ColumnPlan.__init__
+
+        def plan_init(plan, *args, **kwargs):
+            init(plan, *args, **kwargs)
+            plan.steps = [self.wrap(step_stage(step), step) for step in plan.steps]
+        targets.append((ColumnPlan, "__init__", plan_init))
+        return targets
+
+    def sample(self, start : float, stop : threading.Event):
+        while not stop.wait(self.sample_seconds):
+            self.samples.append((time.perf_counter() - start, self.rows))
+
+    @contextmanager
+    def active(self):
+        """Instrument whatever runs inside the block."""
+        targets = self.hook_targets()
+        profiler = cProfile.Profile() if self.profile_path else None
+        stop = threading.Event()
+        if self.memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        sampler = threading.Thread(target=self.sample, args=(start, stop), daemon=True)
+        sampler.start()
+        try:
+            with patched(targets):
+                if profiler:
+                    profiler.enable()
+                try:
+                    yield self
+                finally:
+                    if profiler:
+                        profiler.disable()
+        finally:
+            self.wall = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            self.samples.append((self.wall, self.rows))
+            if self.memory:
+                self.peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profiler:
+                profiler.dump_stats(self.profile_path)
+            self.peak_rss = peak_rss_kb()
+            self.stage_totals("output")[0] = max(self.wall - sum(seconds for seconds, _ in self.totals.values()), 0.0)
+
+    def throughput(self) -> list[dict]:
+        """Rows per second over each sampling interval."""
+        intervals = []
+        previous = (0.0, 0)
+        for seconds, rows in self.samples:
+            if seconds > previous[0]:
+                intervals.append({"seconds": seconds, "rows": rows, "rows_per_second": (rows - previous[1]) / (seconds - previous[0])})
+            previous = (seconds, rows)
+        return intervals
+
+    def report(self, rows : int | None = None) -> dict:
+        """The results as a JSON-ready dict. rows stands in for the rows counted when none were (e.g. every row came from the cache)."""
+        rows = self.rows or rows or 0
+        return {
+            "wall_seconds": self.wall,
+            "rows": rows,
+            "rows_per_second": rows / self.wall if self.wall else None,
+            "stages": {stage: {"seconds": self.totals[stage][0], "calls": self.totals[stage][1]} for stage in STAGES if self.totals.get(stage, [0, 0])[1] or stage == "output"},
+            "throughput": self.throughput() if self.rows else [],
+            "peak_memory_kb": self.peak_memory // 1024 if self.peak_memory is not None else None,
+            "peak_rss_kb": self.peak_rss,
+        }
+
+def format_report(report : dict) -> list[str]:
+    lines = [f"{'stage':28} {'seconds':>10} {'share':>7} {'calls':>13} {'ns/call':>10}"]
+    for stage, entry in report["stages"].items():
+        share = entry["seconds"] / report["wall_seconds"] if report["wall_seconds"] else 0.0
+        per_call = f"{entry['seconds'] / entry['calls'] * 1e9:>10,.0f}" if entry["calls"] else f"{'':>10}"
+        lines.append(f"{stage:28} {entry['seconds']:>10.3f} {share:>7.1%} {entry['calls']:>13,} {per_call}")
+    lines.append(f"{'total':28} {report['wall_seconds']:>10.3f}")
+    if report["rows_per_second"] is not None:
+        lines.append(f"{report['rows']:,} rows, {report['rows_per_second']:,.0f} rows/s")
+    rates = sorted(interval["rows_per_second"] for interval in report["throughput"])
+    if len(rates) > 1:
+        lines.append(f"rows/s over {len(rates)} intervals: min {rates[0]:,.0f}, median {rates[len(rates) // 2]:,.0f}, max {rates[-1]:,.0f}")
+    if report["peak_memory_kb"] is not None:
+        lines.append(f"peak traced memory: {report['peak_memory_kb']:,} KiB")
+    if report["peak_rss_kb"] is not None:
+        lines.append(f"peak resident memory: {report['peak_rss_kb']:,} KiB")
+    return lines
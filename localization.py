@@ -64,6 +64,7 @@ SOLAR_MONTH_NAMES = [
     "Heca",
     "Festivius"
 ]
+SOLAR_LEAP_MONTH_NAME = "Intercalaris" # the month a leap year inserts when SOLAR_LEAP_KIND is "month"
 MOON_PHASE_NAMES = {
     MoonPhase.New : "New",
     MoonPhase.WaxingCrescent : "WaxingCrescent",
@@ -83,4 +84,5 @@ SOLAR_MARKER_NAMES = {
     SolarMarker.SpringEquinox : "Spring Equinox",
     SolarMarker.SummerSolstice : "Summer Solstice",
     SolarMarker.FallEquinox : "Fall Equinox"
-}
\ No newline at end of file
+}
+MULTIPLE_NAMES = ["", "Single", "Double", "Triple", "Quadruple", "Quintuple", "Sextuple", "Septuple", "Octuple", "Nonuple", "Decuple", "Undecuple", "Duodecuple"] # of an alignment of n moons
@@ -1,17 +1,9 @@
-import csv
 import click
 import json
-from astronomy.celestial_bodies import Moon, Sun
-from calendars.lunar_calendar import LunarCalendarState, compute_lunar_calendars
-import config
+import os
+import time
 from settings import MOON_A_MONTH, MOON_B_MONTH, ASTRONOMICAL_YEAR, LUNAR_A_MONTHS_PER_YEAR, LUNAR_B_MONTHS_PER_YEAR, OUTPUT_FILE, LUNAR_A_DAY_START, LUNAR_B_DAY_START, SIM_DAYS
-from astronomy.lunar_phases import compute_phases as compute_lunar_phases
-from astronomy.solar_phases import compute_phases as compute_solar_phases
-from calendars.solar_calendar import compute_solar_calendar
-from calendars.lunisolar_calendar import compute_lunisolar_state_tick as tick_ls_state, LunisolarState, compute_lunisolar_calendar
-from user_defined_events import compute_user_defined_events as compute_events
-from calendars.date import Date
-from calendar_gen import generate_calendar
+# the calendar, astronomy and generation modules are imported by the commands that need them, so the others start fast
 
 def main():
     pass
@@ -65,6 +57,12 @@ DEFAULTS = {
     "include_lunar_phases": True,
     "include_user_defined_events": True,
     "interactive": False,
+    "events_file": None,
+    "legacy_phases": False,
+    "moons": None, # a list of moons replacing Moon A and Moon B, see moon_registry.parse_moons
+    "lunisolar_moon": None, # key of the moon the lunisolar calendar follows (default: the first)
+    "include_event_times": False,
+    "resolution": "day", # rows per day: "day", "hour" or "minute" (see constants.RESOLUTIONS)
 }
 
 CLI_TO_CONFIG = {
@@ -90,6 +88,10 @@ CLI_TO_CONFIG = {
     "lunar_phases": "include_lunar_phases",
     "user_events": "include_user_defined_events",
     "interactive": "interactive",
+    "events_file": "events_file",
+    "legacy_phases": "legacy_phases",
+    "event_times": "include_event_times",
+    "resolution": "resolution",
 }
 
 @cli.command()
@@ -117,9 +119,45 @@ CLI_TO_CONFIG = {
 @click.option('--lunar-phases/--no-lunar-phases', default=None)
 @click.option('--user-events/--no-user-events', default=None)
 @click.option('--interactive/--non-interactive', default=None)
+@click.option('--events-file', default=None, type=click.Path(exists=True), help='JSON or CSV file of events replacing the built-in ones')
+@click.option('--legacy-phases/--exact-phases', default=None, help='Accumulate float phases day by day like older versions')
+@click.option('--event-times/--no-event-times', default=None, help='Add the exact instant (fractional day) of every syzygy, solar marker and month start')
+@click.option('--resolution', type=click.Choice(['day', 'hour', 'minute']), default=None, help='A row per day, hour or minute (sub-day rows need --engine numpy)')
+@click.option('--start-day', default=0, type=int, help='First day to write (earlier days are not simulated)')
+@click.option('--end-day', default=None, type=int, help='Day to stop before (defaults to the simulation length)')
+@click.option('--engine', type=click.Choice(['python', 'numpy', 'events']), default='python', help='Generation backend')
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet', 'arrow', 'feather', 'tlog']), default='csv', help='Output file format')
+@click.option('--workers', default=1, type=int, help='Generate in parallel chunks across this many processes')
+@click.option('--keep-shards', is_flag=True, help='With --workers, keep one file per chunk instead of merging them')
+@click.option('--cache', is_flag=True, help='Serve CSV output from the result cache, computing only the days it lacks')
+@click.option('--checkpoint-every', default=None, type=int, help='Days between checkpoints of serial CSV runs, so they can be resumed (default: none, or config.CHECKPOINT_DAYS with --resume)')
+@click.option('--resume', is_flag=True, help='Continue an interrupted run from its last checkpoint (or shard), appending to the output')
+@click.option('--compression', type=click.Choice(['none', 'gzip', 'zstd', 'xz']), default=None, help='Compress CSV output (default: by extension, .gz/.zst/.xz)')
+@click.option('--shard-rows', default=None, type=int, help='Write one file per this many days, listed in a manifest')
+@click.option('--shard-years', default=None, type=int, help='Write one file per this many astronomical years, listed in a manifest')
+@click.option('--instrument', is_flag=True, help='Time each stage of the run and print a report')
+@click.option('--instrument-json', default=None, type=click.Path(), help='Also write the report as JSON to this file (implies --instrument)')
+@click.option('--instrument-profile', default=None, type=click.Path(), help='Also write cProfile stats to this file (implies --instrument)')
+@click.option('--instrument-memory', is_flag=True, help='Also trace peak memory with tracemalloc (slows the run several times over)')
 def generate(**cli_args):
     """Generate a calendar with the specified settings."""
     profile_path = cli_args.pop('profile')
+    start_day = cli_args.pop('start_day')
+    end_day = cli_args.pop('end_day')
+    engine = cli_args.pop('engine')
+    output_format = cli_args.pop('output_format')
+    workers = cli_args.pop('workers')
+    keep_shards = cli_args.pop('keep_shards')
+    cache = cli_args.pop('cache')
+    checkpoint_every = cli_args.pop('checkpoint_every')
+    resume = cli_args.pop('resume')
+    compression = cli_args.pop('compression')
+    shard_rows = cli_args.pop('shard_rows')
+    shard_years = cli_args.pop('shard_years')
+    instrument_json = cli_args.pop('instrument_json')
+    instrument_profile = cli_args.pop('instrument_profile')
+    instrument_memory = cli_args.pop('instrument_memory')
+    instrument = cli_args.pop('instrument') or instrument_json is not None or instrument_profile is not None
 
     # 1. Start with hard defaults
     config = DEFAULTS.copy()
@@ -136,12 +174,262 @@ def generate(**cli_args):
             config_key = CLI_TO_CONFIG[cli_key]
             config[config_key] = value
 
+    from calendar_gen import generate_calendar
+    run = lambda: generate_calendar(**config, start_day=start_day, end_day=end_day, engine=engine, output_format=output_format, workers=workers,
+                                    keep_shards=keep_shards, cache=cache, checkpoint_every=checkpoint_every, resume=resume,
+                                    compression=compression, shard_rows=shard_rows, shard_years=shard_years)
     try:
-        generate_calendar(**config)
+        if not instrument:
+            run()
+            return
+        from instrument import Instrumentation, format_report
+        instrumentation = Instrumentation(memory=instrument_memory, profile_path=instrument_profile)
+        with instrumentation.active():
+            run()
     except Exception as e:
         click.echo(f"✗ Error: {str(e)}", err=True)
         raise
 
+    from constants import RESOLUTIONS
+    report = instrumentation.report(rows=((end_day if end_day is not None else config["sim_days"]) - start_day) * RESOLUTIONS[config["resolution"]])
+    for line in format_report(report):
+        click.echo(line)
+    if workers > 1:
+        click.echo("⚠ Chunks generated by worker processes are counted as output")
+    if instrument_json:
+        with open(instrument_json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        click.echo(f"✓ Instrumentation report written to {instrument_json}")
+    if instrument_profile:
+        click.echo(f"✓ Profile written to {instrument_profile} (python -m pstats {instrument_profile})")
+
+
+def load_manifest(path) -> list[dict]:
+    """
+    The settings of every profile in a batch manifest: a JSON list of profile files (relative to
+    the manifest) or inline profile objects, or {"defaults": {...}, "profiles": [...]} to share settings.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if isinstance(manifest, list):
+        manifest = {"profiles": manifest}
+    base = DEFAULTS.copy()
+    base.update(manifest.get("defaults", {}))
+    base["interactive"] = False
+
+    configs = []
+    for entry in manifest.get("profiles", []):
+        if isinstance(entry, str):
+            entry = load_profile(os.path.join(os.path.dirname(path), entry))
+        else:
+            invalid_keys = set(entry.keys()) - set(DEFAULTS.keys())
+            if invalid_keys:
+                click.echo(f"⚠ Warning: Unknown settings in profile: {invalid_keys}", err=True)
+        config = base.copy()
+        config.update(entry)
+        configs.append(config)
+
+    outputs = [config["output_file"] for config in configs]
+    duplicates = {output for output in outputs if outputs.count(output) > 1}
+    if duplicates:
+        raise click.ClickException(f"Several profiles write to the same file: {duplicates}")
+    return configs
+
+
+@cli.command('generate-batch')
+@click.argument('manifest', type=click.Path(exists=True))
+@click.option('--workers', default=1, type=int, help='Render the profiles across this many processes')
+@click.option('--format', 'output_format', type=click.Choice(['csv', 'parquet', 'arrow', 'feather', 'tlog']), default='csv', help='Output file format')
+def generate_batch(manifest, workers, output_format):
+    """Generate every profile of a manifest, sharing the astronomy between profiles with the same bodies."""
+    from batch import generate_batch as run_batch
+    for path in run_batch(load_manifest(manifest), workers, output_format):
+        click.echo(f"✓ Calendar written to {path}")
+
+
+@cli.command()
+@click.option('--spool', default=None, type=click.Path(exists=True, file_okay=False), help='Take jobs from *.jsonl files dropped into this directory instead of stdin')
+@click.option('--poll', default=1.0, type=float, help='Seconds between looks at an empty spool')
+@click.option('--drain', is_flag=True, help='Exit once the spool is empty instead of waiting for more jobs')
+def worker(spool, poll, drain):
+    """
+    Run generation jobs, one JSON object per line, writing one JSON result per line to stdout.
+    A job has a "profile" (settings or a profile file), an "output" path, an optional "id" and any
+    run options of generate_calendar (engine, start_day, compression, ...). The process stays
+    up between jobs, so modules are imported and phase tables built once.
+    """
+    import sys
+    from worker import run_lines, run_spool
+
+    emit = lambda result: click.echo(json.dumps(result))
+    if spool:
+        run_spool(spool, DEFAULTS, load_profile, emit, poll, drain)
+    else:
+        run_lines(sys.stdin, DEFAULTS, load_profile, emit)
+
+
+@cli.command()
+@click.argument('store', type=click.Path(exists=True))
+@click.option('--output', '-o', default=OUTPUT_FILE, help='Output CSV file path')
+@click.option('--start-day', default=None, type=int, help='First day to write (defaults to the first stored day)')
+@click.option('--end-day', default=None, type=int, help='Day to stop before (defaults to the end of the store)')
+@click.option('--compression', type=click.Choice(['none', 'gzip', 'zstd', 'xz']), default=None, help='Compress the CSV (default: by extension, .gz/.zst/.xz)')
+def expand(store, output, start_day, end_day, compression):
+    """Expand a day range of a transition store (generate --format tlog) to CSV."""
+    from transition_store import expand_store
+    from output_files import output_compression
+    try:
+        expand_store(store, output, start_day, end_day, output_compression(output, compression))
+    except (ValueError, IndexError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"✓ Calendar written to {output}")
+
+
+@cli.command()
+@click.option('--profile', '-p', type=click.Path(exists=True), help='Profile JSON file')
+@click.option('--events-file', default=None, type=click.Path(exists=True), help='JSON or CSV file of events replacing the built-in ones')
+@click.option('--host', default='127.0.0.1', help='Address to listen on')
+@click.option('--port', default=8080, type=int, help='Port to listen on')
+@click.option('--unix-socket', default=None, help='Listen on this Unix socket instead of TCP')
+@click.option('--year-tables', default=None, type=int, help='Solar years of rows to keep in memory')
+def serve(profile, events_file, host, port, unix_socket, year_tables):
+    """Answer date queries about a profile over HTTP (see server.py for the endpoints)."""
+    import asyncio
+    from calendar_query import CalendarQuery
+    from server import QueryServer
+
+    config = DEFAULTS.copy()
+    if profile:
+        config.update(load_profile(profile))
+    if events_file:
+        config["events_file"] = events_file
+    config["interactive"] = False
+
+    query_server = QueryServer(CalendarQuery(config, year_tables))
+    click.echo(f"Serving on {unix_socket or f'http://{host}:{port}'}")
+    try:
+        asyncio.run(query_server.serve(host, port, unix_socket))
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_date_line(line : str) -> tuple[int, int, int]:
+    """A YEAR-MONTH-DAY line; DAY may be "last"."""
+    from calendars.date import LAST_DAY
+    year, month, day = line.rsplit("-", 2)
+    day = day.strip()
+    return int(year), int(month), LAST_DAY if day.lower() == "last" else int(day)
+
+def parse_dates(lines : list[str]):
+    """(years, months, days) of YEAR-MONTH-DAY lines, as numpy arrays when numpy is installed."""
+    from calendars.date import LAST_DAY
+    try:
+        import numpy as np
+    except ImportError:
+        return tuple(zip(*map(parse_date_line, lines)))
+    tokens = " ".join(lines).replace("-", " ").lower().replace("last", str(LAST_DAY)).split()
+    if len(tokens) != 3 * len(lines):
+        raise ValueError("Expected one YEAR-MONTH-DAY date per line.")
+    dates = np.array(tokens, dtype=np.int64).reshape(-1, 3)
+    return dates[:, 0], dates[:, 1], dates[:, 2]
+
+@cli.command()
+@click.option('--profile', '-p', type=click.Path(exists=True), help='Profile JSON file')
+@click.option('--from', 'from_calendar', required=True, help='Calendar of the input dates: Solar, Lunisolar, a lunar calendar (e.g. LunarA) or day for day numbers')
+@click.option('--to', 'to_calendar', required=True, help='Calendar to convert to: Solar, Lunisolar, a lunar calendar (e.g. LunarA) or day for day numbers')
+@click.option('--batch', default=1 << 16, type=int, help='Lines converted at once')
+def convert(profile, from_calendar, to_calendar, batch):
+    """
+    Convert dates read from stdin, one YEAR-MONTH-DAY (or day number) per line, writing one
+    per line to stdout. Dates with no counterpart are written as "-".
+    """
+    import sys
+    from itertools import islice
+    from moon_registry import calendar_named
+    from conversion import CalendarConverter
+
+    config = DEFAULTS.copy()
+    if profile:
+        config.update(load_profile(profile))
+    config["interactive"] = False
+    converter = CalendarConverter(config)
+
+    try:
+        while True:
+            lines = [line for line in islice(sys.stdin, batch) if line.strip()]
+            if not lines:
+                break
+            if from_calendar == 'day':
+                days = [int(line) for line in lines]
+            else:
+                days = converter.days_of_many(calendar_named(from_calendar), *parse_dates(lines))
+            if to_calendar == 'day':
+                out = [str(day) if day >= 0 else "-" for day in days]
+            else:
+                years, months, month_days = converter.dates_on_many(days, calendar_named(to_calendar))
+                out = [f"{y}-{m:02d}-{d:02d}" if m else "-" for y, m, d in zip(*(a.tolist() if hasattr(a, "tolist") else a for a in (years, months, month_days)))]
+            sys.stdout.write("\n".join(out) + "\n")
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+@cli.command('find-events')
+@click.option('--profile', '-p', type=click.Path(exists=True), help='Profile JSON file')
+@click.option('--event', '-e', 'events', multiple=True, required=True,
+              help='BODY:KIND, e.g. MoonA:full, MoonB:syzygy, Sun:solstice (BODY is a moon key or Sun); several find times they coincide')
+@click.option('--tolerance', default=None, type=float, help='Days the events may be apart (default: seen on the same day)')
+@click.option('--from-day', default=0, type=int, help='First day to search')
+@click.option('--to-day', default=None, type=int, help='Day to stop before (default: search forever)')
+@click.option('--limit', default=None, type=int, help='Stop after this many results')
+def find_events(profile, events, tolerance, from_day, to_day, limit):
+    """Stream astronomical events and alignments as JSON lines, computed analytically from the periods."""
+    from itertools import islice
+    from astronomy.event_search import parse_event, find_alignments
+    from moon_registry import moon_registry
+
+    config = DEFAULTS.copy()
+    if profile:
+        config.update(load_profile(profile))
+    try:
+        periods = {moon.key: moon.synodic_month for moon in moon_registry(config).moons}
+        periods["Sun"] = config["astronomical_year"]
+        series = [parse_event(event, periods) for event in events]
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for day, crossings in islice(find_alignments(series, from_day, to_day, tolerance), limit):
+        click.echo(json.dumps({
+            "day": day,
+            "spread": round(max(c.time for c in crossings) - min(c.time for c in crossings), 6),
+            "events": [{"event": c.event, "day": c.day, "time": round(c.time, 6)} for c in crossings],
+        }))
+
+
+@cli.group()
+def cache():
+    """Inspect or empty the result cache (generate --cache)."""
+    pass
+
+@cache.command()
+def stats():
+    """Show the cached calendars and the cache size."""
+    from result_cache import ResultCache
+    result_cache = ResultCache()
+    entries = result_cache.entries()
+    total = sum(meta["bytes"] for _, meta in entries)
+    click.echo(f"Cache directory:          {result_cache.directory}")
+    click.echo(f"Entries:                  {len(entries)}")
+    click.echo(f"Size:                     {total / 1e6:.1f} MB of {result_cache.max_bytes / 1e6:.1f} MB")
+    for key, meta in reversed(entries):
+        last_used = time.strftime("%Y-%m-%d %H:%M", time.localtime(meta["last_used"]))
+        click.echo(f"  {key}  {meta['days']:>12} days  {meta['bytes'] / 1e6:>9.1f} MB  last used {last_used}")
+
+@cache.command()
+def clear():
+    """Remove every cached calendar."""
+    from result_cache import ResultCache
+    click.echo(f"✓ Removed {ResultCache().clear()} cached calendars")
+
 
 @cli.command()
 def defaults():
@@ -182,6 +470,10 @@ def defaults():
 @click.option('--lunar-phases/--no-lunar-phases', default=True)
 @click.option('--user-events/--no-user-events', default=True)
 @click.option('--interactive/--non-interactive', default=False)
+@click.option('--events-file', default=None, help='JSON or CSV file of events replacing the built-in ones')
+@click.option('--legacy-phases/--exact-phases', default=False, help='Accumulate float phases day by day like older versions')
+@click.option('--event-times/--no-event-times', default=False, help='Add the exact instant (fractional day) of every syzygy, solar marker and month start')
+@click.option('--resolution', type=click.Choice(['day', 'hour', 'minute']), default='day', help='A row per day, hour or minute (sub-day rows need --engine numpy)')
 def create_profile(
     profile,
     output,
@@ -206,6 +498,10 @@ def create_profile(
     lunar_phases,
     user_events,
     interactive,
+    events_file,
+    legacy_phases,
+    event_times,
+    resolution,
 ):
     """Create a new profile with custom settings."""
 
@@ -236,6 +532,10 @@ def create_profile(
         "include_user_defined_events": user_events,
 
         "interactive": interactive,
+        "events_file": events_file,
+        "legacy_phases": legacy_phases,
+        "include_event_times": event_times,
+        "resolution": resolution,
     }
 
     with open(profile, "w", encoding="utf-8") as f:
@@ -0,0 +1,122 @@
+from calendars.enums import Calendar
+from localization import MOON_NAMES, LUNAR_A_MONTHS_NAMES, LUNAR_B_MONTHS_NAMES
+
+def calendar_named(name : str) -> Calendar | str:
+    """The Calendar member of a built-in calendar's name; any other lunar calendar is identified by its name."""
+    return Calendar[name] if name in Calendar.__members__ else name
+
+def calendar_name(calendar : Calendar | str) -> str:
+    return calendar.name if isinstance(calendar, Calendar) else calendar
+
+class LunarCalendarDef:
+    """
+    A lunar calendar following one moon: months start at its full moons, the first on or after day_start.
+    calendar is Calendar.LunarA or LunarB for the two built-in calendars and the calendar's name for any
+    other; the name also prefixes its columns.
+    """
+    def __init__(self, calendar : Calendar | str, months_per_year : int, day_start : int, month_names : list[str], enabled : bool = True):
+        self.calendar = calendar
+        self.months_per_year = months_per_year
+        self.day_start = day_start
+        self.month_names = month_names
+        self.enabled = enabled
+
+    @property
+    def name(self) -> str:
+        return calendar_name(self.calendar)
+
+class MoonDef:
+    """One moon: the key its columns are prefixed with, the name alignments call it by, its synodic month and its lunar calendar, if any."""
+    def __init__(self, key : str, name : str, synodic_month : float, lunar_calendar : LunarCalendarDef | None = None, enabled : bool = True):
+        self.key = key
+        self.name = name
+        self.synodic_month = synodic_month
+        self.lunar_calendar = lunar_calendar
+        self.enabled = enabled
+
+class MoonRegistry:
+    """
+    The moons of a profile in column order, disabled ones included (their columns stay blank).
+    enabled lists the moons that are simulated; lunar_calendars the enabled calendar of each of them
+    (None where there is none) and lunisolar the index among them of the moon the lunisolar calendar
+    follows (None if that moon is disabled).
+    """
+    def __init__(self, moons : list[MoonDef], lunisolar_moon : str | None = None):
+        self.moons = moons
+        self.enabled = [moon for moon in moons if moon.enabled]
+        self.lunar_calendars = [moon.lunar_calendar if moon.lunar_calendar and moon.lunar_calendar.enabled else None for moon in self.enabled]
+        if lunisolar_moon is not None and lunisolar_moon not in (moon.key for moon in moons):
+            raise ValueError(f"The lunisolar calendar follows an unknown moon {lunisolar_moon!r}")
+        key = lunisolar_moon if lunisolar_moon is not None else moons[0].key if moons else None
+        self.lunisolar = next((i for i, moon in enumerate(self.enabled) if moon.key == key), None)
+
+    def calendars(self) -> list[LunarCalendarDef]:
+        """Every declared lunar calendar, enabled or not."""
+        return [moon.lunar_calendar for moon in self.moons if moon.lunar_calendar]
+
+    def find_calendar(self, calendar : Calendar | str) -> tuple[int, LunarCalendarDef] | None:
+        """(index of its moon in enabled, definition) of an enabled lunar calendar, None if there is no such calendar."""
+        for i, definition in enumerate(self.lunar_calendars):
+            if definition and definition.calendar == calendar:
+                return i, definition
+        return None
+
+RESERVED_KEYS = ("Solar", "Lunisolar", "Moon") # prefixes of the sun's, the lunisolar calendar's and the alignment columns
+
+def default_moons(spec : dict) -> list[MoonDef]:
+    """Moon A and Moon B with their lunar calendars, from the moon_a_*/lunar_a_* and moon_b_*/lunar_b_* settings."""
+    return [
+        MoonDef("MoonA", MOON_NAMES[0], spec["moon_a_month"],
+                LunarCalendarDef(Calendar.LunarA, spec["lunar_a_months_per_year"], spec["lunar_a_day_start"], LUNAR_A_MONTHS_NAMES, spec["include_lunar_calendar_a"]),
+                spec["include_first_moon"]),
+        MoonDef("MoonB", MOON_NAMES[1], spec["moon_b_month"],
+                LunarCalendarDef(Calendar.LunarB, spec["lunar_b_months_per_year"], spec["lunar_b_day_start"], LUNAR_B_MONTHS_NAMES, spec["include_lunar_calendar_b"]),
+                spec["include_second_moon"]),
+    ]
+
+def parse_moons(entries : list[dict]) -> list[MoonDef]:
+    """
+    Moons from a profile's "moons" list. Each entry has a synodic_month and optionally a key
+    (default MoonA, MoonB, ... by position), a name, "enabled" and a lunar_calendar with
+    months_per_year and optionally a name (default LunarA, LunarB, ...), day_start,
+    month_names and "enabled".
+    """
+    moons = []
+    for i, entry in enumerate(entries):
+        letter = chr(ord("A") + i) if i < 26 else str(i + 1)
+        try:
+            synodic_month = float(entry["synodic_month"])
+            if synodic_month <= 0:
+                raise ValueError(f"Moon {i + 1} needs a positive synodic_month")
+            lunar_calendar = None
+            if entry.get("lunar_calendar"):
+                fields = entry["lunar_calendar"]
+                calendar = calendar_named(fields.get("name", f"Lunar{letter}"))
+                if calendar in (Calendar.Solar, Calendar.Lunisolar):
+                    raise ValueError(f"A lunar calendar can't be called {calendar.name}")
+                months_per_year = int(fields["months_per_year"])
+                default_names = {Calendar.LunarA: LUNAR_A_MONTHS_NAMES, Calendar.LunarB: LUNAR_B_MONTHS_NAMES}.get(calendar)
+                month_names = fields.get("month_names") or default_names or [f"Month {m + 1}" for m in range(months_per_year)]
+                if len(month_names) < months_per_year:
+                    raise ValueError(f"{calendar_name(calendar)} has {months_per_year} months but only {len(month_names)} month names")
+                lunar_calendar = LunarCalendarDef(calendar, months_per_year, int(fields.get("day_start", 0)), list(month_names), bool(fields.get("enabled", True)))
+            key = str(entry.get("key", f"Moon{letter}"))
+            moons.append(MoonDef(key, str(entry.get("name", key)), synodic_month, lunar_calendar, bool(entry.get("enabled", True))))
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Invalid moon {i + 1}: missing or malformed field {e}")
+
+    for label, names in (("moon key", [moon.key for moon in moons]), ("lunar calendar", [calendar.name for calendar in (moon.lunar_calendar for moon in moons) if calendar])):
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise ValueError(f"Duplicate {label}s: {sorted(duplicates)}")
+    # a moon's columns are prefixed with its key, so it can't take a prefix other columns use
+    calendars = {calendar_name(moon.lunar_calendar.calendar) for moon in moons if moon.lunar_calendar}
+    clashes = {moon.key for moon in moons if moon.key in RESERVED_KEYS or moon.key in calendars}
+    if clashes:
+        raise ValueError(f"Moon keys can't be {sorted(RESERVED_KEYS)} or a lunar calendar's name: {sorted(clashes)}")
+    return moons
+
+def moon_registry(spec : dict) -> MoonRegistry:
+    """The moons of a spec (keyed like main.DEFAULTS): its "moons" list if it has one, otherwise Moon A and Moon B."""
+    moons = parse_moons(spec["moons"]) if spec.get("moons") else default_moons(spec)
+    return MoonRegistry(moons, spec.get("lunisolar_moon"))
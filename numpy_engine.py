@@ -0,0 +1,432 @@
+from functools import lru_cache
+from itertools import accumulate, repeat
+import numpy as np
+from constants import SOLAR_MARKERS, SYZYGIES
+from localization import MOON_PHASE_NAMES, SOLAR_MARKER_NAMES
+from astronomy.enums import MoonPhase, SyzygyType
+from astronomy.core_math import accumulated_phase, crossing_time
+from astronomy.lunar_phases import alignment_name
+from calendars.enums import Calendar
+from calendars.date import LAST_DAY
+from calendars.solar_calendar import SolarCalendar
+from calendars.lunisolar_calendar import LunisolarRules
+from user_defined_events import EventIndex
+from engine import DayState
+
+BLOCK_DAYS = 1 << 16
+
+PHASE_NAMES = np.array([MOON_PHASE_NAMES[MoonPhase(i)] for i in range(len(MoonPhase))], dtype=object)
+
+def accumulate_phases(body, period : float, n : int):
+    """
+    Phases of a body over the next n ticks, starting with its current phase, bit-identical to tick_day().
+    Exact phases are computed for every tick at once; legacy phases keep their running sum sequential.
+    """
+    if body.legacy:
+        per_day_tick = 1 / period
+        phases = accumulate(repeat(per_day_tick, n), lambda p, t: (p + t) % 1.0, initial=body.phase)
+        return np.fromiter(phases, dtype=np.float64, count=n + 1)
+    return exact_phases(body.remainder, body.den, body.num, n)
+
+def exact_phases(remainder : int, den : int, num : int, n : int):
+    """The exact phases (remainder + i * den) % num / num for i in 0..n."""
+    if num < 1 << 53 and (num + n) * den < 1 << 62:
+        return (remainder + np.arange(n + 1, dtype=np.int64) * den) % num / num
+    # periods with many digits don't fit float64/int64 exactly, so stay in python ints
+    return np.fromiter(((remainder + i * den) % num / num for i in range(n + 1)), dtype=np.float64, count=n + 1)
+
+def moon_phase_rows(moons, n : int):
+    """
+    Phases of every moon of a MoonSet over the next n ticks as one (moons, n + 1) array, each row
+    bit-identical to accumulate_phases() of that moon. Exact phases of all moons are computed at once.
+    """
+    if not len(moons):
+        return np.zeros((0, n + 1))
+    if moons.legacy or not all(num < 1 << 53 and (num + n) * den < 1 << 62 for num, den in zip(moons.nums, moons.dens)):
+        return np.stack([accumulate_phases(moon, moon.synodic_month, n) for moon in moons])
+    nums = np.array(moons.nums, dtype=np.int64)[:, None]
+    dens = np.array(moons.dens, dtype=np.int64)[:, None]
+    remainders = np.array(moons.remainders, dtype=np.int64)[:, None]
+    return (remainders + np.arange(n + 1, dtype=np.int64) * dens) % nums / nums
+
+def phase_crossed(prev : np.ndarray, curr : np.ndarray, target : float):
+    """Vectorized astronomy.core_math.phase_crossed."""
+    return np.where(prev <= curr, (prev < target) & (target <= curr), (prev < target) | (target <= curr))
+
+def quantize_phase(p : np.ndarray):
+    n = len(MoonPhase)
+    return PHASE_NAMES[((p * n) + 0.5).astype(np.int64) % n]
+
+def last_index(mask : np.ndarray):
+    """For every position, the index of the latest True at or before it (-1 if none)."""
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+def to_str(values : np.ndarray):
+    """Format an integer column; low-cardinality columns (years, months, days) format each value once."""
+    lo, hi = int(values.min()), int(values.max())
+    if hi - lo < len(values):
+        table = np.array([str(v) for v in range(lo, hi + 1)], dtype=object)
+        return table[values - lo].tolist()
+    return list(map(str, values.tolist()))
+
+def to_str_or_blank(values : np.ndarray, blank : np.ndarray):
+    column = np.array(to_str(values), dtype=object)
+    column[blank] = ""
+    return column.tolist()
+
+def compute_lunar_phases(columns, moon_keys : list[str], moon_names : tuple[str, ...], moon_phases, include_raw : bool):
+    """
+    Phase columns of every moon and, with two or more, their alignments. Which moons are new and
+    which full on each day is reduced to a pair of bit masks per day, so the alignments of any
+    number of moons take a handful of array operations and one alignment_name() per distinct pair.
+    """
+    prev, curr = moon_phases[:, :-1], moon_phases[:, 1:]
+    names = quantize_phase(curr)
+    for key, row_names, row_phases in zip(moon_keys, names, curr):
+        columns[f"{key}_Phase_Name"] = row_names.tolist()
+        if include_raw:
+            columns[f"{key}_Phase_Raw"] = list(map(str, map(round, row_phases.tolist(), repeat(6))))
+
+    if len(moon_keys) >= 2:
+        new = phase_crossed(prev, curr, 0.0)
+        # as in syzygy_masks, a day is only "Full" if it isn't also "New"
+        full = phase_crossed(prev, curr, 0.5) & ~new
+        bits = np.left_shift(1, np.arange(len(moon_keys), dtype=np.int64))[:, None]
+        aligned = np.full(curr.shape[1], "", dtype=object)
+        days = np.flatnonzero((new | full).sum(axis=0) >= 2)
+        if len(days):
+            new_masks = (new[:, days] * bits).sum(axis=0)
+            full_masks = (full[:, days] * bits).sum(axis=0)
+            pairs, inverse = np.unique(np.stack([new_masks, full_masks]), axis=1, return_inverse=True)
+            labels = np.array([alignment_name(moon_names, int(new_mask), int(full_mask)) for new_mask, full_mask in pairs.T], dtype=object)
+            aligned[days] = labels[inverse.ravel()]
+        columns["Moon_Phases_Aligned"] = aligned.tolist()
+
+def compute_solar_phases(columns, sun_phases, include_raw : bool):
+    prev, curr = sun_phases[:-1], sun_phases[1:]
+    if include_raw:
+        columns["Solar_Phase_Raw"] = list(map(str, curr.tolist()))
+    crossed = [phase_crossed(prev, curr, k) for k in SOLAR_MARKERS]
+    names = [SOLAR_MARKER_NAMES[m] for m in SOLAR_MARKERS.values()]
+    columns["Solar_Marker"] = np.select(crossed, names, "").tolist()
+
+@lru_cache(maxsize=16)
+def solar_tables(cal : SolarCalendar):
+    """A solar calendar's lookup tables as arrays, built once per calendar."""
+    width = max(cal.year_lengths)
+    month = np.zeros((2, width), dtype=np.int64) # 1-based, 0 where the day is in no month
+    day = np.zeros((2, width), dtype=np.int64)
+    last = np.zeros((2, width), dtype=bool)
+    for leap in (0, 1):
+        for yd, entry in enumerate(cal.year_days[leap]):
+            if entry is not None:
+                month[leap, yd], day[leap, yd], last[leap, yd] = entry[0] + 1, entry[1] + 1, entry[2]
+    names = []
+    for leap in (0, 1):
+        leap_names = [str(name) for name in cal.month_names[leap]]
+        names.append(leap_names + ["None"] * (width + 1 - len(leap_names)))
+    names = np.array(names, dtype=object)
+    return np.array(cal.year_starts), np.array(cal.leap_years, dtype=np.int64), month, day, last, names
+
+def compute_solar_calendar(columns, days : np.ndarray, cal : SolarCalendar):
+    """
+    Vectorized SolarCalendar.date, writing the Solar_* columns.
+    Returns (year, month, day, is_last_day) arrays, year 1-based and month and day 0 where undefined.
+    """
+    year_starts, leap_years, month_table, day_table, last_table, names = solar_tables(cal)
+    cycles, rem = np.divmod(days - cal.offset, cal.cycle_days)
+    i = np.searchsorted(year_starts, rem, side="right") - 1
+    year = cycles * cal.cycle_years + i
+    yd = rem - year_starts[i]
+    leap = leap_years[i]
+    month, day = month_table[leap, yd], day_table[leap, yd]
+    valid = month > 0
+
+    columns["Solar_Year"] = to_str(year + 1)
+    columns["Solar_Month"] = names[leap, np.where(valid, month - 1, -1)].tolist()
+    if valid.all():
+        columns["Solar_Month_#"] = to_str(month)
+        columns["Solar_Day"] = to_str(day)
+    else:
+        columns["Solar_Month_#"] = to_str_or_blank(month, ~valid)
+        columns["Solar_Day"] = to_str_or_blank(day, ~valid)
+    return year + 1, month, day, last_table[leap, yd]
+
+def lunisolar_month_starts(prev, curr, rules : LunisolarRules):
+    """Vectorized LunisolarRules.starts_month."""
+    full = phase_crossed(prev, curr, 0.5)
+    if rules.starting_moon_phase == SyzygyType.Full:
+        return full
+    return ~full & phase_crossed(prev, curr, 0)
+
+def ends_month(moon, phases, starts):
+    """
+    Whether each day of a block is the last of its month, i.e. whether the next day starts one.
+    phases are the block's phases as from accumulate_phases, starting at moon's current phase;
+    the day after the block is looked ahead with the arithmetic of moon.next_phase(), exact unless
+    the moon accumulates legacy phases. starts(prev, curr) tells month starts apart.
+    """
+    if moon.legacy:
+        after = accumulated_phase(float(phases[-1]), moon.synodic_month)
+    else:
+        after = (moon.remainder + len(phases) * moon.den) % moon.num / moon.num
+    ahead = np.append(phases[1:], after)
+    return starts(ahead[:-1], ahead[1:])
+
+def advance_lunisolar(ls_state, moon_phases, sun_phases, rules : LunisolarRules):
+    """Vectorized compute_lunisolar_state_tick over a block; leaves ls_state at the last day and returns (year, month, day) arrays."""
+    n = len(moon_phases) - 1
+    idx = np.arange(n)
+    marker = phase_crossed(sun_phases[:-1], sun_phases[1:], rules.marker_phase)
+    month_start = lunisolar_month_starts(moon_phases[:-1], moon_phases[1:], rules)
+
+    last_marker = last_index(marker)
+    last_start = last_index(month_start)
+    day = np.where(last_start == -1, ls_state.day + idx + 1, idx - last_start)
+    if rules.scheme == "cycle":
+        year, month = lunisolar_cycle_months(ls_state, marker, month_start, rules)
+    else:
+        prev_start = np.concatenate(([-1], last_start[:-1]))
+        awaiting = (last_marker > prev_start) | ((prev_start == -1) & ls_state.awaiting_new_year)
+        new_year = month_start & awaiting
+
+        starts_so_far = np.cumsum(month_start)
+        year = ls_state.year + np.cumsum(new_year)
+        year_start = np.maximum.accumulate(np.where(new_year, starts_so_far, -1))
+        month = np.where(year_start == -1, ls_state.month + starts_so_far, starts_so_far - year_start)
+
+    ls_state.year, ls_state.month, ls_state.day = int(year[-1]), int(month[-1]), int(day[-1])
+    ls_state.awaiting_new_year = bool(last_marker[-1] > last_start[-1] or (last_start[-1] == -1 and ls_state.awaiting_new_year))
+    return year, month, day
+
+def lunisolar_cycle_months(ls_state, marker, month_start, rules : LunisolarRules):
+    """(year, month) arrays under the cycle scheme. Whether a month opens a year depends on the year, so the block's few month starts are walked one by one."""
+    markers = np.flatnonzero(marker)
+    year, month, awaiting = ls_state.year, ls_state.month, ls_state.awaiting_new_year
+    years, months = [year], [month]
+    prev = -1
+    for start in np.flatnonzero(month_start).tolist():
+        # markers are checked before month starts, so one on the same day counts
+        awaiting = awaiting or np.searchsorted(markers, start, side="right") > np.searchsorted(markers, prev, side="right")
+        month += 1
+        if (month >= rules.cycle_months(year)) if year > 0 else awaiting:
+            year, month, awaiting = year + 1, 0, False
+        years.append(year)
+        months.append(month)
+        prev = start
+    segment = np.cumsum(month_start)
+    return np.array(years)[segment], np.array(months)[segment]
+
+def lunisolar_name_index(year, month, rules : LunisolarRules):
+    """Vectorized LunisolarRules.month_name_index."""
+    if rules.scheme != "cycle":
+        return month
+    leap = np.isin((year - 1) % rules.cycle_years + 1, rules.cycle_leap_years)
+    shifted = (year > 0) & leap & (month >= rules.intercalary_month)
+    return np.where(shifted, np.where(month == rules.intercalary_month, rules.common_months, month - 1), month)
+
+def advance_lunar_calendar(lc_state, moon_phases, days : np.ndarray):
+    """Vectorized LunarCalendarState.tick over a block; leaves lc_state at the last day and returns (started, year, month, day) arrays."""
+    n = len(days)
+    idx = np.arange(n)
+    full = phase_crossed(moon_phases[:-1], moon_phases[1:], 0.5)
+
+    if lc_state.started:
+        first = 0
+    else:
+        candidates = np.flatnonzero(full & (days >= lc_state.start_day))
+        if len(candidates) == 0:
+            return np.zeros(n, dtype=bool), None, None, None
+        first = candidates[0]
+    started = idx >= first
+
+    months = lc_state.year * lc_state.month_num + lc_state.month + np.cumsum(full & started)
+    year, month = np.divmod(months, lc_state.month_num)
+    last_full = last_index(full & started)
+    day = np.where(last_full == -1, lc_state.day + idx + 1, idx - last_full)
+
+    lc_state.started = True
+    lc_state.year, lc_state.month, lc_state.day = int(year[-1]), int(month[-1]), int(day[-1])
+    return started, year, month, day
+
+def write_calendar_columns(columns, prefix : str, month_names, started, year, month, day, name_index = None):
+    """name_index, if given, is the index into month_names of each day's month (see lunisolar_name_index)."""
+    names = np.array(month_names, dtype=object)
+    if started is None:
+        columns[f"{prefix}_Year"] = to_str(year + 1)
+        columns[f"{prefix}_Month_#"] = to_str(month + 1)
+        columns[f"{prefix}_Month"] = names[month if name_index is None else name_index].tolist()
+        columns[f"{prefix}_Day"] = to_str(day + 1)
+        return
+    if year is None:
+        return
+    blank = ~started
+    columns[f"{prefix}_Year"] = to_str_or_blank(year + 1, blank)
+    columns[f"{prefix}_Month_#"] = to_str_or_blank(month + 1, blank)
+    columns[f"{prefix}_Month"] = np.where(blank, "", names[np.where(blank, 0, month)]).tolist()
+    columns[f"{prefix}_Day"] = to_str_or_blank(day + 1, blank)
+
+def occurs_in(annual, year):
+    """Vectorized AnnualDate.occurs_in."""
+    first = annual.first_year if annual.first_year is not None else 1
+    mask = (year - first) % annual.every_years == 0
+    if annual.first_year is not None:
+        mask &= year >= first
+    if annual.last_year is not None:
+        mask &= year <= annual.last_year
+    return mask
+
+def compute_events(columns, dates, n : int, events : EventIndex):
+    """
+    The User_Defined_Events column, as EventIndex.matching gives it for each day's dates.
+    dates maps Calendar -> (present, year, month, day, last) arrays, last being a callable
+    that computes the last-day-of-month mask on demand.
+    """
+    hits : dict[int, list[tuple[int, str]]] = {}
+    last_days = {}
+    for (calendar, month, day), annuals in events.by_key.items():
+        if calendar not in dates:
+            continue
+        present, year, months, days, last = dates[calendar]
+        if day == LAST_DAY:
+            if calendar not in last_days:
+                last_days[calendar] = last()
+            mask = present & (months == month) & last_days[calendar]
+        else:
+            mask = present & (months == month) & (days == day)
+        if not mask.any():
+            continue
+        for order, name, annual in annuals:
+            for i in np.flatnonzero(mask & occurs_in(annual, year)).tolist():
+                hits.setdefault(i, []).append((order, name))
+    column = [""] * n
+    for i, names in hits.items():
+        names.sort()
+        column[i] = ", ".join([name for _, name in names])
+    columns["User_Defined_Events"] = column
+
+def body_phases(state : DayState, n : int):
+    """Phases of the moons (one row per moon of state.moons) and the sun over the next n days."""
+    return moon_phase_rows(state.moons, n), accumulate_phases(state.sun, state.sun.solar_year, n)
+
+def step_phases(state : DayState, n : int, steps : int):
+    """
+    body_phases() at every 1/steps of a day (exact phases only): a body with period num / den days
+    has one of steps * num / den steps, so every steps-th phase is bit-identical to the daily one.
+    """
+    moons, sun = state.moons, state.sun
+    m = n * steps
+    moon_phases = np.zeros((0, m + 1))
+    if len(moons):
+        moon_phases = np.stack([exact_phases(r * steps, den, num * steps, m) for r, den, num in zip(moons.remainders, moons.dens, moons.nums)])
+    return moon_phases, exact_phases(sun.remainder * steps, sun.den, sun.num * steps, m)
+
+def time_column(crossed, period : float, first_tick : int, steps : int):
+    """
+    A *_Time column: crossed is a list of (mask, target) pairs, and each row in a mask gets the
+    exact instant of its crossing of target (astronomy.core_math.crossing_time), the first pair
+    taking precedence. Row i ends first_tick + i + 1 steps of 1/steps of a day in. Only the few
+    rows with a crossing are worked out, so the column costs next to nothing at any resolution.
+    """
+    column = [""] * len(crossed[0][0])
+    for mask, target in crossed:
+        for i in np.flatnonzero(mask).tolist():
+            if not column[i]:
+                column[i] = str(round(crossing_time(first_tick + i + 1, period, target, steps), 6))
+    return column
+
+def step_columns(columns, rows, n : int, steps : int):
+    """
+    The columns of a block at `steps` rows per day: the calendar and event columns of each day
+    repeated for each of its rows, the Hour (and Minute) of every row and the per-row columns as they are.
+    """
+    block = {key: np.repeat(np.array(column, dtype=object), steps).tolist() for key, column in columns.items()}
+    block["Hour"] = [str(step * 24 // steps) for step in range(steps)] * n
+    if steps > 24:
+        block["Minute"] = [str(step % (steps // 24)) for step in range(steps)] * n
+    block.update(rows)
+    return block
+
+def finish_block(state : DayState, moon_phases, sun_phases, n : int):
+    """Leave the bodies where tick_day() would have after the block."""
+    moons, sun = state.moons, state.sun
+    moons.prev_phases, moons.phases = moon_phases[:, -2].tolist(), moon_phases[:, -1].tolist()
+    moons.remainders = [(r + n * den) % num for r, den, num in zip(moons.remainders, moons.dens, moons.nums)]
+    sun.prev_phase, sun.phase = float(sun_phases[-2]), float(sun_phases[-1])
+    sun.remainder = (sun.remainder + n * sun.den) % sun.num
+    state.day += n
+
+def compute_block(state : DayState, n : int, steps : int = 1) -> dict[str, list[str]]:
+    """
+    Compute the next n days after `state` as whole columns of CSV strings, with `steps` rows per
+    day (see constants.RESOLUTIONS): the phases, syzygies, alignments, markers and event times are
+    those of every row, the calendars and events those of its day.
+    `state` is advanced to the last day of the block so blocks can be chained.
+    """
+    first_day = state.day + 1
+    days = np.arange(first_day, first_day + n, dtype=np.int64)
+    columns = {"Day": to_str(days)}
+    rows = {} # the columns with a value per row rather than per day
+    dates = {}
+    moon_phases, sun_phases = body_phases(state, n)
+    moon_rows, sun_rows = (moon_phases, sun_phases) if steps == 1 else step_phases(state, n, steps)
+    first_tick = first_day * steps # row i ends first_tick + i + 1 steps in
+
+    spec, registry = state.spec, state.registry
+    timed = spec.include_event_times
+    if spec.include_lunar_phases and len(state.moons):
+        compute_lunar_phases(rows, [moon.key for moon in registry.enabled], tuple(moon.name for moon in registry.enabled), moon_rows, spec.include_raw_phase_figures)
+        if timed:
+            for moon, phases in zip(registry.enabled, moon_rows):
+                crossed = [(phase_crossed(phases[:-1], phases[1:], target), target) for target in SYZYGIES]
+                rows[f"{moon.key}_Syzygy_Time"] = time_column(crossed, moon.synodic_month, first_tick, steps)
+    if spec.include_solar_phases:
+        compute_solar_phases(rows, sun_rows, spec.include_raw_phase_figures)
+        if timed:
+            crossed = [(phase_crossed(sun_rows[:-1], sun_rows[1:], target), target) for target in SOLAR_MARKERS]
+            rows["Solar_Marker_Time"] = time_column(crossed, state.sun.solar_year, first_tick, steps)
+    if spec.include_solar_calendar:
+        year, month, day, last = compute_solar_calendar(columns, days, spec.solar_calendar)
+        dates[Calendar.Solar] = (month > 0, year, month, day, lambda last=last: last)
+    if state.ls_state:
+        li, rules = registry.lunisolar, spec.lunisolar
+        year, month, day = advance_lunisolar(state.ls_state, moon_phases[li], sun_phases, rules)
+        write_calendar_columns(columns, "Lunisolar", rules.month_names, None, year, month, day, lunisolar_name_index(year, month, rules))
+        last = lambda: ends_month(state.moons[li], moon_phases[li], lambda prev, curr: lunisolar_month_starts(prev, curr, rules))
+        dates[Calendar.Lunisolar] = (np.ones(n, dtype=bool), year + 1, month + 1, day + 1, last)
+        if timed:
+            starts = lunisolar_month_starts(moon_rows[li][:-1], moon_rows[li][1:], rules)
+            rows["Lunisolar_Month_Start_Time"] = time_column([(starts, rules.month_phase)], state.moons[li].synodic_month, first_tick, steps)
+    for i, lc_state in enumerate(state.lunar_states):
+        if lc_state:
+            definition = registry.lunar_calendars[i]
+            started, year, month, day = advance_lunar_calendar(lc_state, moon_phases[i], days)
+            write_calendar_columns(columns, definition.name, definition.month_names, started, year, month, day)
+            if year is not None:
+                last = lambda i=i: ends_month(state.moons[i], moon_phases[i], lambda prev, curr: phase_crossed(prev, curr, 0.5))
+                dates[definition.calendar] = (started, year + 1, month + 1, day + 1, last)
+            if timed:
+                starts = phase_crossed(moon_rows[i][:-1], moon_rows[i][1:], 0.5) & np.repeat(started, steps)
+                rows[f"{definition.name}_Month_Start_Time"] = time_column([(starts, 0.5)], state.moons[i].synodic_month, first_tick, steps)
+    if spec.include_user_defined_events:
+        compute_events(columns, dates, n, spec.events)
+
+    finish_block(state, moon_phases, sun_phases, n)
+    if steps == 1:
+        columns.update(rows)
+        return columns
+    return step_columns(columns, rows, n, steps)
+
+def fast_forward(state : DayState, days : int):
+    """Advance `state` by `days` exactly as tick() would, without producing any output."""
+    while days > 0:
+        n = min(BLOCK_DAYS, days)
+        first_day = state.day + 1
+        moon_phases, sun_phases = body_phases(state, n)
+        if state.ls_state:
+            advance_lunisolar(state.ls_state, moon_phases[state.registry.lunisolar], sun_phases, state.spec.lunisolar)
+        for i, lc_state in enumerate(state.lunar_states):
+            if lc_state:
+                advance_lunar_calendar(lc_state, moon_phases[i], np.arange(first_day, first_day + n))
+        finish_block(state, moon_phases, sun_phases, n)
+        days -= n
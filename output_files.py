@@ -0,0 +1,96 @@
+import gzip
+import io
+import lzma
+import os
+import click
+import config
+
+# --- compressions, and the file extensions that imply them ---
+COMPRESSIONS = ("none", "gzip", "zstd", "xz")
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd", ".xz": "xz"}
+
+def output_compression(path : str, compression : str | None = None) -> str | None:
+    """The compression of an output file: `compression` if given ("none" for none), otherwise the one its extension implies."""
+    if compression is not None:
+        return None if compression == "none" else compression
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+def compressor(compression : str, file):
+    """A stream compressing into the open binary file; closing it ends the compressed stream but leaves the file open."""
+    level = config.COMPRESSION_LEVELS[compression]
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=level)
+    if compression == "xz":
+        return lzma.LZMAFile(file, mode="wb", preset=level)
+    try:
+        import zstandard
+    except ImportError:
+        raise click.ClickException("zstd output requires zstandard (pip install zstandard).")
+    return zstandard.ZstdCompressor(level=level).stream_writer(file, closefd=False)
+
+class CompressedFile(io.RawIOBase):
+    """
+    A file written through a compressor. sync() ends the compressed stream written so far
+    (a gzip member, a zstd frame, an xz stream) so the file up to there is complete on its
+    own; what is written after goes into a new stream appended to it, and decompressing
+    the file reads them all back as one.
+    """
+    def __init__(self, path : str, compression : str, append : bool = False):
+        self.file = open(path, "ab" if append else "wb")
+        self.compression = compression
+        self.stream = None # started on the first write after each sync
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.stream is None:
+            self.stream = compressor(self.compression, self.file)
+        self.stream.write(data)
+        return len(data)
+
+    def end_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def sync(self) -> int:
+        """End the current stream and push the file to disk, returning its size."""
+        self.end_stream()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def close(self):
+        if not self.closed:
+            try:
+                self.end_stream()
+            finally:
+                self.file.close()
+        super().close()
+
+def open_output(path : str, compression : str | None = None, append : bool = False, text : bool = True):
+    """
+    Open an output file for writing (or, with append, adding to), compressed with `compression`
+    if given. Writes are gathered into config.WRITE_BUFFER bytes before reaching the compressor
+    or the disk. Text files are UTF-8 with newlines left as written, as the csv module needs.
+    """
+    mode = "a" if append else "w"
+    if compression is None:
+        if text:
+            return open(path, mode, newline="", encoding="utf-8", buffering=config.WRITE_BUFFER)
+        return open(path, mode + "b", buffering=config.WRITE_BUFFER)
+    f = io.BufferedWriter(CompressedFile(path, compression, append), config.WRITE_BUFFER)
+    return io.TextIOWrapper(f, encoding="utf-8", newline="") if text else f
+
+def sync_output(f) -> int:
+    """
+    Push everything written to an open_output file to disk, returning how many bytes of it are
+    complete: the file can be cut back to that size and appended to later.
+    """
+    f.flush()
+    raw = (f.buffer if isinstance(f, io.TextIOWrapper) else f).raw
+    if isinstance(raw, CompressedFile):
+        return raw.sync()
+    os.fsync(raw.fileno())
+    return raw.tell()
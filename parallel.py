@@ -0,0 +1,74 @@
+import os
+import shutil
+import config
+from concurrent.futures import ProcessPoolExecutor
+from calendar_gen import seed_state, write_days
+
+CHUNKS_PER_WORKER = 4 # a few chunks per worker keeps every core busy until the end
+
+def chunk_bounds(start_day : int, end_day : int, chunks : int) -> list[tuple[int, int]]:
+    """Split [start_day, end_day) into at most `chunks` contiguous, near-equal ranges."""
+    total = max(end_day - start_day, 0)
+    chunks = max(min(chunks, total), 1)
+    bounds = []
+    for i in range(chunks):
+        first = start_day + total * i // chunks
+        stop = start_day + total * (i + 1) // chunks
+        bounds.append((first, stop))
+    return bounds
+
+def shard_path(output_file : str, index : int) -> str:
+    return f"{output_file}.part{index:05d}"
+
+def generate_chunk(spec : dict, path : str, window_start : int, first_day : int, stop_day : int, engine : str, output_format : str,
+                   compression : str | None = None, header : bool = True) -> str:
+    """Worker: write days [first_day, stop_day) of the window to their own file."""
+    state = seed_state(spec, window_start, first_day - 1, engine)
+    write_days(path, state, stop_day, engine, output_format, compression=compression, header=header)
+    return path
+
+def merge_csv(paths, output_file : str):
+    """
+    Concatenate CSV shards (consumed lazily, in order), removing them. Only the first has a
+    header, and compressed shards are whole compressed streams, so their bytes are joined as they are.
+    """
+    with open(output_file, "wb") as out:
+        for path in paths:
+            with open(path, "rb") as f:
+                shutil.copyfileobj(f, out, config.WRITE_BUFFER)
+            os.remove(path)
+
+def generate_parallel(spec : dict, output_file : str, start_day : int, end_day : int, workers : int,
+                      engine : str = "python", output_format : str = "csv", keep_shards : bool = False,
+                      compression : str | None = None) -> list[str]:
+    """
+    Generate [start_day, end_day) across a process pool. Every chunk is seeded at its own
+    first day, so the merged file is identical to a serial run. spec must already be resolved
+    (see calendar_gen.resolved_spec) so the workers don't prompt. CSV chunks are compressed
+    by the workers themselves. Returns the files written.
+    """
+    bounds = chunk_bounds(start_day, end_day, workers * CHUNKS_PER_WORKER)
+    paths = [shard_path(output_file, i) for i in range(len(bounds))]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        finished = pool.map(
+            generate_chunk,
+            [spec] * len(bounds),
+            paths,
+            [start_day] * len(bounds),
+            [first for first, _ in bounds],
+            [stop for _, stop in bounds],
+            [engine] * len(bounds),
+            [output_format] * len(bounds),
+            [compression] * len(bounds),
+            [keep_shards or i == 0 for i in range(len(bounds))], # merged chunks after the first go without a header
+        )
+        # map() yields in submission order, so each shard is merged as soon as it and its predecessors are done
+        if keep_shards:
+            return list(finished)
+        if output_format == "csv":
+            merge_csv(finished, output_file)
+        else:
+            from arrow_output import merge_files
+            merge_files(finished, output_file, output_format)
+    return [output_file]
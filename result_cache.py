@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from functools import lru_cache
+from itertools import islice
+import config
+import constants
+import localization
+import settings
+from constants import RESOLUTIONS
+from calendar_gen import seed_state, write_days
+from output_files import open_output
+
+# --- the spec keys that decide what a day's row looks like (sim_days only decides how many rows there are) ---
+CONTENT_SETTINGS = (
+    "moon_a_month", "moon_b_month", "astronomical_year",
+    "lunar_a_months_per_year", "lunar_b_months_per_year", "lunar_a_day_start", "lunar_b_day_start",
+    "solar_calendar_offset",
+    "include_first_moon", "include_second_moon", "include_double_syzygies", "include_solar_calendar",
+    "include_lunisolar_calendar", "include_lunar_calendar_a", "include_lunar_calendar_b",
+    "include_raw_phase_figures", "include_solar_phases", "include_lunar_phases", "include_user_defined_events",
+    "legacy_phases", "moons", "lunisolar_moon", "include_event_times", "resolution",
+)
+
+def file_digest(path : str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@lru_cache(maxsize=None)
+def source_digest() -> str:
+    """Hash of the modules holding calendar settings and names, so editing them invalidates the cache."""
+    return hashlib.sha256("".join(file_digest(m.__file__) for m in (settings, localization, constants)).encode()).hexdigest()
+
+def normalized_settings(spec : dict, engine : str = "python") -> dict:
+    """Everything a resolved spec's rows depend on, with the events file replaced by its contents' hash."""
+    normalized = {key: spec.get(key) for key in CONTENT_SETTINGS}
+    events_file = spec.get("events_file")
+    normalized["events"] = file_digest(events_file) if events_file else None
+    # the events engine doesn't accumulate legacy phases, so it writes different legacy rows
+    normalized["legacy_engine"] = engine == "events" if spec.get("legacy_phases") else None
+    normalized["sources"] = source_digest()
+    return normalized
+
+def cache_key(spec : dict, engine : str = "python") -> str:
+    return hashlib.sha256(json.dumps(normalized_settings(spec, engine), sort_keys=True).encode()).hexdigest()[:32]
+
+def copy_rows(source : str, output_file : str, start : int, end : int, compression : str | None = None):
+    """Copy the header and rows [start, end) of a CSV, compressed with `compression` if given."""
+    with open(source, "rb") as f, open_output(output_file, compression, text=False) as out:
+        out.write(f.readline())
+        out.writelines(islice(f, start, end))
+
+class ResultCache:
+    """
+    Generated CSV calendars on disk, one per distinct normalized spec: <key>.csv holds
+    days [0, days) and <key>.json its metadata. A request for more days than are cached
+    appends only the missing ones. Least recently used entries are evicted past max_bytes.
+    """
+    def __init__(self, directory : str | None = None, max_bytes : int | None = None):
+        self.directory = directory or config.CACHE_DIR
+        self.max_bytes = config.CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def data_path(self, key : str) -> str:
+        return os.path.join(self.directory, f"{key}.csv")
+
+    def meta_path(self, key : str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def meta(self, key : str) -> dict | None:
+        if not os.path.exists(self.data_path(key)):
+            return None
+        try:
+            with open(self.meta_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_meta(self, key : str, meta : dict):
+        meta["last_used"] = time.time()
+        tmp = self.meta_path(key) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(tmp, self.meta_path(key))
+
+    def entries(self) -> list[tuple[str, dict]]:
+        """(key, metadata) of every entry, least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                meta = self.meta(name[:-5])
+                if meta is not None:
+                    entries.append((name[:-5], meta))
+        return sorted(entries, key=lambda entry: entry[1]["last_used"])
+
+    def extend(self, key : str, spec : dict, end_day : int, engine : str = "python", workers : int = 1) -> dict:
+        """Make sure the entry holds days [0, end_day), computing only the days it is missing."""
+        meta = self.meta(key) or {"days": 0, "bytes": 0, "settings": normalized_settings(spec, engine)}
+        days = meta["days"]
+        if end_day > days:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self.data_path(key)
+            if days == 0:
+                write_days(path, seed_state(spec, 0, -1, engine), end_day, engine)
+            else:
+                # drop anything an interrupted extension left past the recorded rows
+                with open(path, "r+b") as f:
+                    f.truncate(meta["bytes"])
+                if workers > 1 and not spec.get("legacy_phases"):
+                    from parallel import generate_parallel
+                    part = path + ".part"
+                    generate_parallel(spec, part, days, end_day, workers, engine)
+                    with open(part, "rb") as f, open(path, "ab") as out:
+                        f.readline()
+                        shutil.copyfileobj(f, out, 1 << 20)
+                    os.remove(part)
+                else:
+                    write_days(path, seed_state(spec, 0, days - 1, engine), end_day, engine, append=True)
+            meta["days"], meta["bytes"] = end_day, os.path.getsize(path)
+        self.save_meta(key, meta)
+        self.evict(keep=key)
+        return meta
+
+    def generate(self, spec : dict, output_file : str, start_day : int, end_day : int, engine : str = "python", workers : int = 1,
+                 compression : str | None = None) -> bool:
+        """
+        Write days [start_day, end_day) of a resolved spec to output_file from the cache, extending
+        its entry first if needed. Entries are kept uncompressed; the output is compressed as it is
+        copied if `compression` is given. Returns False, writing nothing, if the window starts past the cached days.
+        """
+        key = cache_key(spec, engine)
+        cached = (self.meta(key) or {"days": 0})["days"]
+        if start_day > cached:
+            return False
+        self.extend(key, spec, end_day, engine, workers)
+        if start_day == 0 and end_day == self.meta(key)["days"] and compression is None:
+            shutil.copyfile(self.data_path(key), output_file)
+        else:
+            rows_per_day = RESOLUTIONS[spec.get("resolution", "day")]
+            copy_rows(self.data_path(key), output_file, start_day * rows_per_day, end_day * rows_per_day, compression)
+        return True
+
+    def evict(self, keep : str | None = None):
+        """Remove least recently used entries (never `keep`) until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(meta["bytes"] for _, meta in entries)
+        for key, meta in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self.remove(key)
+            total -= meta["bytes"]
+
+    def remove(self, key : str):
+        for path in (self.meta_path(key), self.data_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def clear(self) -> int:
+        """Remove every entry, and anything interrupted runs left behind; returns how many entries there were."""
+        entries = self.entries()
+        if os.path.isdir(self.directory):
+            shutil.rmtree(self.directory)
+        return len(entries)
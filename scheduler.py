@@ -0,0 +1,180 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from enum import Enum
+from itertools import count
+from constants import SOLAR_MARKERS
+from calendars.solar_calendar import SolarCalendar
+from astronomy.core_math import crossings, crossing_tick
+from astronomy.celestial_bodies import Moon, Sun
+from calendars.lunisolar_calendar import compute_lunisolar_state_tick as tick_ls_state
+from engine import DayState
+
+class EventType(Enum):
+    NewMoon = 0
+    FullMoon = 1
+    SolarMarker = 2
+    SolarMonthStart = 3
+
+class Event:
+    def __init__(self, day : int, event_type : EventType, source : str, detail = None):
+        self.day = day
+        self.event_type = event_type
+        self.source = source
+        self.detail = detail
+
+    def __repr__(self):
+        return f"Event({self.day}, {self.event_type.name}, {self.source}, {self.detail})"
+
+def crossing_events(period : float, target : float, event_type : EventType, source : str, start_day : int, detail = None):
+    """Every day from start_day on where a body with the given period crosses target."""
+    k = crossings(max(start_day, 0), period, target) + 1
+    while True:
+        yield Event(crossing_tick(k, period, target) - 1, event_type, source, detail)
+        k += 1
+
+def solar_month_events(start_day : int, cal : SolarCalendar):
+    """Every first day of a solar calendar month from start_day on; detail is (year, month) as shown in the calendar."""
+    month_starts = [[yd for yd, entry in enumerate(year_days) if entry is not None and entry[1] == 0] for year_days in cal.year_days]
+    year, _, _ = cal.locate(start_day)
+    while True:
+        year_start = cal.year_start(year)
+        for mi, month_start in enumerate(month_starts[cal.is_leap(year)]):
+            day = year_start + month_start
+            if day >= start_day:
+                yield Event(day, EventType.SolarMonthStart, "Solar", (year + 1, mi + 1))
+        year += 1
+
+class EventScheduler:
+    """
+    Merges the upcoming events of every registered body into one timeline.
+    Each source computes its next event analytically, so walking the timeline
+    costs one heap operation per event regardless of how many days lie between them.
+    """
+    def __init__(self, start_day : int = 0):
+        self.start_day = start_day
+        self.heap = []
+        self.order = count() # keeps same-day events in registration order
+
+    def add_source(self, events):
+        self.push(events)
+
+    def add_moon(self, name : str, moon : Moon):
+        self.push(crossing_events(moon.synodic_month, 0.0, EventType.NewMoon, name, self.start_day))
+        self.push(crossing_events(moon.synodic_month, 0.5, EventType.FullMoon, name, self.start_day))
+
+    def add_sun(self, sun : Sun, name : str = "Sun"):
+        for target, marker in SOLAR_MARKERS.items():
+            self.push(crossing_events(sun.solar_year, target, EventType.SolarMarker, name, self.start_day, marker))
+
+    def add_solar_months(self, calendar : SolarCalendar):
+        self.push(solar_month_events(self.start_day, calendar))
+
+    def push(self, events):
+        event = next(events)
+        heapq.heappush(self.heap, (event.day, next(self.order), event, events))
+
+    def peek_day(self) -> int | None:
+        return self.heap[0][0] if self.heap else None
+
+    def pop(self) -> Event:
+        _, _, event, events = heapq.heappop(self.heap)
+        self.push(events)
+        return event
+
+    def pop_day(self) -> list[Event]:
+        """All events of the next eventful day."""
+        day = self.peek_day()
+        events = []
+        while self.heap and self.heap[0][0] == day:
+            events.append(self.pop())
+        return events
+
+    def events(self, end_day : int):
+        """Events from start_day up to (not including) end_day, in day order."""
+        while self.peek_day() is not None and self.peek_day() < end_day:
+            yield self.pop()
+
+    def spans(self, end_day : int):
+        """
+        Split [start_day, end_day) into runs of days that start on an eventful day
+        (or start_day) and contain no further events: yields (first_day, stop_day, events_on_first_day).
+        """
+        day = self.start_day
+        while day < end_day:
+            events = self.pop_day() if self.peek_day() == day else []
+            next_day = self.peek_day()
+            stop = end_day if next_day is None else min(next_day, end_day)
+            yield day, stop, events
+            day = stop
+
+def event_days(synodic_months : list[float], astronomical_year : float, end_day : int) -> array:
+    """
+    Every day before end_day with an event of moons with the given synodic months or the sun,
+    as a sorted array. Calendars sharing these bodies can all be driven by it (see timeline_spans).
+    """
+    scheduler = EventScheduler(0)
+    for i, synodic_month in enumerate(synodic_months):
+        scheduler.add_moon(f"Moon{i}", Moon(synodic_month))
+    scheduler.add_sun(Sun(astronomical_year))
+    days = array("q")
+    for event in scheduler.events(end_day):
+        if not days or days[-1] != event.day:
+            days.append(event.day)
+    return days
+
+def timeline_spans(days, start_day : int, end_day : int):
+    """EventScheduler.spans over precomputed event days; yields (first_day, stop_day, first_day_is_eventful)."""
+    i = bisect_left(days, start_day)
+    day = start_day
+    while day < end_day:
+        eventful = i < len(days) and days[i] == day
+        if eventful:
+            i += 1
+        stop = min(days[i], end_day) if i < len(days) else end_day
+        yield day, stop, eventful
+        day = stop
+
+def scheduler_for(state : DayState) -> EventScheduler:
+    """Scheduler over every event that can change `state`, starting the day after it."""
+    scheduler = EventScheduler(state.day + 1)
+    for i, moon in enumerate(state.registry.enabled):
+        scheduler.add_moon(moon.key, state.moons[i])
+    scheduler.add_sun(state.sun)
+    return scheduler
+
+def advance_state(state : DayState, eventful : bool):
+    """
+    Advance `state` by one day. The calendar states are only ticked on eventful days;
+    on every other day nothing but their day counters can change.
+    """
+    state.day += 1
+    state.moons.seek(state.day)
+    state.sun.seek(state.day)
+
+    if eventful:
+        for i, lc_state in enumerate(state.lunar_states):
+            if lc_state:
+                lc_state.tick(state.moons[i], state.day)
+        if state.ls_state:
+            tick_ls_state(state.ls_state, state.moons[state.registry.lunisolar], state.sun, state.spec.lunisolar)
+        return
+
+    for lc_state in state.lunar_states:
+        if lc_state and lc_state.started:
+            lc_state.day += 1
+    if state.ls_state:
+        state.ls_state.day += 1
+
+def skip_quiet_days(state : DayState, days : int):
+    """Advance `state` by `days` days without events at once: only the day counters move."""
+    if days <= 0:
+        return
+    state.day += days
+    state.moons.seek(state.day)
+    state.sun.seek(state.day)
+    for lc_state in state.lunar_states:
+        if lc_state and lc_state.started:
+            lc_state.day += days
+    if state.ls_state:
+        state.ls_state.day += days
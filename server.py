@@ -0,0 +1,154 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs, unquote
+import config
+from calendars.date import LAST_DAY
+from calendar_query import CalendarQuery, UnknownCalendar
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+class Metrics:
+    """Request counts and latencies per endpoint since the server started."""
+    def __init__(self):
+        self.started = time.monotonic()
+        self.endpoints : dict[str, dict] = {}
+
+    def record(self, endpoint : str, seconds : float, status : int):
+        stats = self.endpoints.setdefault(endpoint, {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        stats["requests"] += 1
+        if status != 200:
+            stats["errors"] += 1
+        stats["total_seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+
+    def snapshot(self, query : CalendarQuery) -> dict:
+        uptime = time.monotonic() - self.started
+        requests = sum(stats["requests"] for stats in self.endpoints.values())
+        return {
+            "uptime_seconds": round(uptime, 3),
+            "requests": requests,
+            "requests_per_second": round(requests / uptime, 3) if uptime > 0 else 0.0,
+            "endpoints": {
+                endpoint: {
+                    "requests": stats["requests"],
+                    "errors": stats["errors"],
+                    "mean_ms": round(1000 * stats["total_seconds"] / stats["requests"], 3),
+                    "max_ms": round(1000 * stats["max_seconds"], 3),
+                }
+                for endpoint, stats in sorted(self.endpoints.items())
+            },
+            "year_tables": {"cached": len(query.tables), "capacity": query.year_tables, "hits": query.hits, "misses": query.misses, "direct": query.direct},
+        }
+
+class QueryServer:
+    """
+    A small JSON-over-HTTP/1.1 front end to a CalendarQuery, on TCP or a Unix socket:
+
+        GET /day/<day>                              every column of a day
+        GET /date/<calendar>/<year>/<month>/<day>   the day a date falls on (day may be "last")
+        GET /next-event/<name>?from=<day>           the next day with a user-defined event
+        GET /events                                 the names of the user-defined events
+        GET /metrics                                request counts, latencies and year table cache use
+
+    Connections are kept alive, so a client can pipeline any number of queries over one. Queries
+    are answered in a pool of `threads` threads, so one slow query (a far-off day, a new year
+    table) doesn't hold up the other connections.
+    """
+    def __init__(self, query : CalendarQuery, threads : int | None = None):
+        self.query = query
+        self.metrics = Metrics()
+        self.executor = ThreadPoolExecutor(config.SERVER_QUERY_THREADS if threads is None else threads)
+
+    def route(self, method : str, target : str) -> tuple[str, int, dict]:
+        """(endpoint, status, body) of a request."""
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        params = parse_qs(url.query)
+        endpoint = parts[0]
+        if method != "GET":
+            return endpoint, 405, {"error": "Only GET is supported."}
+        try:
+            if endpoint == "day" and len(parts) == 2:
+                return endpoint, 200, self.query.day(int(parts[1]))
+            if endpoint == "date" and len(parts) == 5:
+                calendar = self.query.calendar(parts[1])
+                year, month = int(parts[2]), int(parts[3])
+                day = LAST_DAY if parts[4].lower() == "last" else int(parts[4])
+                found = self.query.day_of(calendar, year, month, day)
+                if found is None:
+                    return endpoint, 404, {"error": f"{parts[1]} never shows {year}-{month}-{parts[4]}."}
+                return endpoint, 200, {"day": found}
+            if endpoint == "next-event" and len(parts) == 2:
+                from_day = int(params.get("from", ["0"])[0])
+                found = self.query.next_event(parts[1], from_day)
+                if found is None:
+                    return endpoint, 404, {"error": f"No {parts[1]!r} on or after day {from_day}."}
+                return endpoint, 200, {"event": parts[1], "day": found, "days_until": found - from_day}
+            if endpoint == "events" and len(parts) == 1:
+                return endpoint, 200, {"events": self.query.event_names()}
+            if endpoint == "metrics" and len(parts) == 1:
+                return endpoint, 200, self.metrics.snapshot(self.query)
+        except UnknownCalendar as e:
+            return endpoint, 400, {"error": f"Unknown calendar {e}."}
+        except ValueError as e:
+            return endpoint, 400, {"error": str(e)}
+        return "unknown", 404, {"error": f"No such endpoint: {url.path}"}
+
+    async def respond(self, method : str, target : str) -> tuple[str, int, dict]:
+        """route() in the query threads; metrics, which read the loop's own counters, are answered on the loop."""
+        if urlsplit(target).path.strip("/") == "metrics":
+            return self.route(method, target)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.route, method, target)
+
+    async def handle(self, reader : asyncio.StreamReader, writer : asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+
+                started = time.perf_counter()
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                    endpoint, status, body = await self.respond(method, target)
+                except ValueError:
+                    endpoint, status, body, version = "unknown", 400, {"error": "Malformed request line."}, "HTTP/1.0"
+                self.metrics.record(endpoint, time.perf_counter() - started, status)
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                payload = json.dumps(body).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host : str = "127.0.0.1", port : int = 8080, unix_socket : str | None = None):
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
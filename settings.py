@@ -22,8 +22,17 @@ LUNAR_B_MONTHS_PER_YEAR = 18
 SOLAR_CALENDAR_OFFSET = 22 # how many days the solar calendar started before or after the start of the simulation
 SOLAR_CIVIL_YEAR = 365
 SOLAR_MONTH_LENGTHS = [30] * 12 + [5] # adding a 5-day festival month at the end of the year
+SOLAR_LEAP_RULE = [] # (every N years, is leap) pairs, the longest period dividing the year decides; e.g. [(4, True), (100, False), (400, True)] for Gregorian-style leap years
+SOLAR_LEAP_KIND = "day" # "day" lengthens month SOLAR_LEAP_MONTH in leap years, "month" inserts an extra month before it
+SOLAR_LEAP_MONTH = 12 # index of the month a leap year lengthens or inserts a month before
+SOLAR_LEAP_DAYS = 1 # how many days a leap year adds
 
 
 # --- Lunisolar calendar ---
 STARTING_SOLAR_MARKER = SolarMarker.WinterSolstice # which solar marker the lunisolar calendar cares about
 STARTING_MOON_PHASE = SyzygyType.Full
+LUNISOLAR_SCHEME = "observational" # "observational": each year starts with the first month after STARTING_SOLAR_MARKER; "cycle": years follow a fixed cycle of common and leap years
+LUNISOLAR_COMMON_MONTHS = 12 # months in a common year of the cycle scheme
+LUNISOLAR_CYCLE_YEARS = 19 # length of the cycle scheme's cycle, counted from the first full year
+LUNISOLAR_CYCLE_LEAP_YEARS = [3, 6, 8, 11, 14, 17, 19] # years of the cycle with an intercalary month (Metonic-style by default)
+LUNISOLAR_INTERCALARY_MONTH = 12 # 0-based position of the intercalary month in a leap year; 12 puts it at the end
@@ -0,0 +1,137 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import click
+from calendar_gen import checkpoint_run, headers, seed_state, write_days
+from constants import RESOLUTIONS
+from moon_registry import moon_registry
+from output_files import COMPRESSION_EXTENSIONS
+from parallel import generate_chunk
+
+def shard_bounds(start_day : int, end_day : int, shard_rows : int | None = None, shard_years : int | None = None,
+                 astronomical_year : float | None = None) -> list[tuple[int, int]]:
+    """
+    Split [start_day, end_day) every shard_rows days, or else on every shard_years-th astronomical
+    year counted from day 0 (so the shards of different windows line up).
+    """
+    if shard_rows:
+        return [(first, min(first + shard_rows, end_day)) for first in range(start_day, end_day, shard_rows)]
+    span = shard_years * astronomical_year
+    bounds = []
+    first, k = start_day, int(start_day // span) + 1
+    while first < end_day:
+        stop = min(int(k * span), end_day)
+        if stop > first:
+            bounds.append((first, stop))
+            first = stop
+        k += 1
+    return bounds
+
+def split_extension(path : str) -> tuple[str, str]:
+    """cal.csv.gz -> (cal, .csv.gz)"""
+    base, extension = os.path.splitext(path)
+    if extension.lower() in COMPRESSION_EXTENSIONS:
+        base, inner = os.path.splitext(base)
+        extension = inner + extension
+    return base, extension
+
+def shard_file(output_file : str, index : int) -> str:
+    base, extension = split_extension(output_file)
+    return f"{base}-{index:05d}{extension}"
+
+def manifest_path(output_file : str) -> str:
+    return f"{split_extension(output_file)[0]}.manifest.json"
+
+def read_manifest(path : str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path : str, manifest : dict):
+    """Write the manifest to a temporary file renamed over the old one, so readers never see half of it."""
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, path)
+
+def finished_shards(previous : dict | None, run : dict, directory : str) -> list[dict]:
+    """The shards of a previous manifest of the same run that are still on disk as it recorded them."""
+    if previous is None:
+        return []
+    if previous["run"] != json.loads(json.dumps(run)):
+        raise click.ClickException("The existing manifest was made by a run with different settings; remove it to start over.")
+    shards = []
+    for shard in previous["shards"]:
+        path = os.path.join(directory, shard["path"])
+        if not os.path.exists(path) or os.path.getsize(path) != shard["bytes"]:
+            break
+        shards.append(shard)
+    return shards
+
+def generate_shards(spec : dict, output_file : str, start_day : int, end_day : int, engine : str = "python", output_format : str = "csv",
+                    compression : str | None = None, shard_rows : int | None = None, shard_years : int | None = None,
+                    workers : int = 1, resume : bool = False) -> str:
+    """
+    Write [start_day, end_day) as one file per shard (see shard_bounds), each with its own header,
+    named after output_file (cal.csv.gz -> cal-00000.csv.gz, ...). The manifest next to them lists
+    every finished shard with its days and size, and is rewritten as each one finishes, so readers
+    can start on the first shards early and resume skips the shards already done. A serial run
+    carries its state from one shard to the next; workers generate shards in a process pool.
+    spec must already be resolved and applied (see calendar_gen.resolved_spec). Returns the manifest's path.
+    """
+    bounds = shard_bounds(start_day, end_day, shard_rows, shard_years, spec["astronomical_year"])
+    paths = [shard_file(output_file, i) for i in range(len(bounds))]
+    path = manifest_path(output_file)
+    directory = os.path.dirname(path)
+    run = {**checkpoint_run(spec, start_day, end_day, engine), "format": output_format, "compression": compression,
+           "shard_rows": shard_rows, "shard_years": shard_years}
+    resolution = spec.get("resolution", "day")
+    manifest = {
+        "format": output_format,
+        "compression": compression,
+        "columns": headers(moon_registry(spec), spec.get("include_event_times", False), resolution),
+        "start_day": start_day,
+        "end_day": end_day,
+        "complete": False,
+        "shards": finished_shards(read_manifest(path), run, directory) if resume else [],
+        "run": run,
+    }
+    done = len(manifest["shards"])
+    if resume and done:
+        click.echo(f"Resuming {path} after {done} of {len(bounds)} shards")
+    save_manifest(path, manifest)
+
+    def finish(i : int):
+        first, stop = bounds[i]
+        manifest["shards"].append({"path": os.path.basename(paths[i]), "first_day": first, "stop_day": stop,
+                                   "rows": (stop - first) * RESOLUTIONS[resolution], "bytes": os.path.getsize(paths[i])})
+        save_manifest(path, manifest)
+
+    todo = range(done, len(bounds))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            finished = pool.map(
+                generate_chunk,
+                [spec] * len(todo),
+                [paths[i] for i in todo],
+                [start_day] * len(todo),
+                [bounds[i][0] for i in todo],
+                [bounds[i][1] for i in todo],
+                [engine] * len(todo),
+                [output_format] * len(todo),
+                [compression] * len(todo),
+            )
+            # in order, so the manifest always lists the leading shards that are done
+            for i, _ in zip(todo, finished):
+                finish(i)
+    elif todo:
+        state = seed_state(spec, start_day, bounds[done][0] - 1, engine)
+        for i in todo:
+            write_days(paths[i], state, bounds[i][1], engine, output_format, compression=compression)
+            finish(i)
+
+    manifest["complete"] = True
+    save_manifest(path, manifest)
+    return path
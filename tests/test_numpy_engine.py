@@ -0,0 +1,52 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import main
+import numpy_engine
+from astronomy.enums import SyzygyType
+from calendars.date import AnnualDate, LAST_DAY
+from calendars.enums import Calendar
+from calendars.lunisolar_calendar import LunisolarRules
+from calendar_gen import calendar_spec_for, spec_headers
+from column_plan import ColumnPlan
+from engine import CalendarEngine
+from user_defined_events import EventIndex
+
+def month_end_engine(legacy_phases : bool) -> CalendarEngine:
+    """A calendar with an event on the last day of every lunisolar and lunar month."""
+    spec = dict(main.DEFAULTS, moon_a_month=32.77, legacy_phases=legacy_phases)
+    events = [(f"LS End {m}", AnnualDate(Calendar.Lunisolar, m, LAST_DAY)) for m in range(1, 14)]
+    events += [(f"LA End {m}", AnnualDate(Calendar.LunarA, m, LAST_DAY)) for m in range(1, 13)]
+    calendar_spec = calendar_spec_for(spec).replace(lunisolar=LunisolarRules(starting_moon_phase=SyzygyType.New), events=EventIndex(events))
+    return CalendarEngine(calendar_spec)
+
+def python_events(engine : CalendarEngine, seed_day : int, days : int) -> list[str]:
+    state = engine.state_at(seed_day)
+    columns = spec_headers(engine.spec)
+    plan = ColumnPlan(columns, state)
+    i = columns.index("User_Defined_Events")
+    events = []
+    for _ in range(days):
+        state.tick()
+        events.append(plan.fill(state)[i])
+    return events
+
+@pytest.mark.parametrize("legacy_phases", [False, True])
+def test_month_end_on_block_boundary(legacy_phases):
+    # the last day of a block needs the phase of the day after it to know whether it ends a month
+    engine = month_end_engine(legacy_phases)
+    seed_day = 2
+    expected = python_events(engine, seed_day, 2000)
+    month_ends = [i + 1 for i, events in enumerate(expected) if "End" in events]
+    assert len(month_ends) > 10
+    for n in month_ends:
+        state = engine.state_at(seed_day)
+        assert numpy_engine.compute_block(state, n)["User_Defined_Events"] == expected[:n]
+
+def test_month_end_on_default_block_boundary():
+    engine = month_end_engine(False)
+    n = numpy_engine.BLOCK_DAYS
+    expected = python_events(engine, 2, n)
+    assert expected[-1] == "LS End 4"
+    assert numpy_engine.compute_block(engine.state_at(2), n)["User_Defined_Events"] == expected
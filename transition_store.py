@@ -0,0 +1,355 @@
+import csv
+import json
+import mmap
+import struct
+from array import array
+from functools import cached_property
+from bisect import bisect_left, bisect_right
+from moon_registry import moon_registry, calendar_named, calendar_name
+from astronomy.core_math import phase
+from astronomy.enums import SolarMarker
+from astronomy.lunar_phases import quantize_phase, alignment_name
+from calendars.date import Date, LAST_DAY
+from calendars.enums import Calendar
+from calendars.solar_calendar import SolarCalendar
+from engine import DayRecord
+from scheduler import EventType, scheduler_for, advance_state, skip_quiet_days
+from user_defined_events import EventIndex
+
+MAGIC = b"CALTLOG2"
+
+# --- Every array of a store: its typecode. Each moon adds <key>.new and <key>.full ("q"), each calendar <name>.<field> of MONTH_FIELDS ---
+MONTH_FIELDS = {"start": "q", "year": "q", "month": "h", "base": "i"}
+POINT_ARRAYS = {
+    "markers.day": "q", "markers.kind": "b",
+    "events.day": "q", "events.label": "i",
+}
+
+class MonthLog:
+    """
+    The months of one calendar as parallel arrays: the day each run of dates starts on,
+    its year and month and the day-of-month shown on that first day (base).
+    Month 0 is a day outside every month (the solar calendar's gap days), month -1 no date at all
+    (a lunar calendar that hasn't started). Only runs that don't continue the previous one are stored.
+    """
+    def __init__(self):
+        self.fields = {name: array(code) for name, code in MONTH_FIELDS.items()}
+
+    def append(self, start : int, year : int, month : int, base : int):
+        for name, value in zip(MONTH_FIELDS, (start, year, month, base)):
+            self.fields[name].append(value)
+
+    def observe(self, day : int, year : int, month : int, day_of_month : int):
+        f = self.fields
+        if f["start"]:
+            continues = f["year"][-1] == year and f["month"][-1] == month
+            if continues and (month == -1 or f["base"][-1] + day - f["start"][-1] == day_of_month):
+                return
+        self.append(day, year, month, day_of_month)
+
+def solar_log(start_day : int, end_day : int, cal : SolarCalendar) -> MonthLog:
+    """The solar calendar's months over [start_day, end_day], straight from its year tables."""
+    log = MonthLog()
+    first_year, _, _ = cal.locate(start_day)
+    last_year, _, _ = cal.locate(end_day)
+    for year in range(first_year, last_year + 1):
+        year_start = cal.year_start(year)
+        leap = cal.is_leap(year)
+        for yd, entry in enumerate(cal.year_days[leap]):
+            if entry is None:
+                if yd == 0 or cal.year_days[leap][yd - 1] is not None:
+                    log.append(year_start + yd, year + 1, 0, 0)
+            elif entry[1] == 0:
+                log.append(year_start + yd, year + 1, entry[0] + 1, 1)
+    # --- clip the run start_day falls in ---
+    starts = log.fields["start"]
+    first = max(bisect_right(starts, start_day) - 1, 0)
+    for name in MONTH_FIELDS:
+        del log.fields[name][:first]
+    if starts and starts[0] < start_day:
+        if log.fields["month"][0] > 0:
+            log.fields["base"][0] += start_day - starts[0]
+        starts[0] = start_day
+    return log
+
+def month_events(calendar : Calendar, log : MonthLog, start_day : int, end_day : int, events : EventIndex):
+    """(day, order, name) of every event falling in the logged months of a calendar within [start_day, end_day)."""
+    by_month = {}
+    for (event_calendar, month, day), annuals in events.by_key.items():
+        if event_calendar == calendar:
+            by_month.setdefault(month, []).append((day, annuals))
+    f = log.fields
+    starts = f["start"]
+    for i in range(len(starts)):
+        month = f["month"][i]
+        if month not in by_month:
+            continue
+        start, year, base = starts[i], f["year"][i], f["base"][i]
+        stop = starts[i + 1] if i + 1 < len(starts) else None # None: the month runs past the log
+        for day, annuals in by_month[month]:
+            if day == LAST_DAY:
+                if stop is None:
+                    continue
+                hit = stop - 1
+            else:
+                hit = start + day - base
+                if hit < start or (stop is not None and hit >= stop):
+                    continue
+            if not start_day <= hit < end_day:
+                continue
+            for order, name, annual in annuals:
+                if annual.occurs_in(year):
+                    yield hit, order, name
+
+def write_store(path : str, spec : dict, state, end_day : int):
+    """
+    Write the transitions of the days after `state` up to end_day to a store at `path`.
+    spec is the resolved spec (see calendar_gen.resolved_spec) the state was built from.
+    Walks the astronomical events, so the cost is proportional to the number of events, not days.
+    """
+    start_day = state.day + 1
+    calendar_spec = state.spec
+    logs = {}
+    if calendar_spec.include_solar_calendar:
+        logs[Calendar.Solar] = solar_log(start_day, end_day, calendar_spec.solar_calendar)
+    registry = state.registry
+    calendar_states = {Calendar.Lunisolar: state.ls_state}
+    for definition, lc_state in zip(registry.lunar_calendars, state.lunar_states):
+        if definition:
+            calendar_states[definition.calendar] = lc_state
+    for calendar, calendar_state in calendar_states.items():
+        if calendar_state:
+            logs[calendar] = MonthLog()
+
+    points = {name: array(code) for name, code in POINT_ARRAYS.items()}
+    syzygy_keys = {}
+    for moon in registry.enabled:
+        for event_type, kind in ((EventType.NewMoon, "new"), (EventType.FullMoon, "full")):
+            syzygy_keys[(event_type, moon.key)] = f"{moon.key}.{kind}"
+            points[f"{moon.key}.{kind}"] = array("q")
+    marker_kinds = list(SolarMarker)
+
+    # --- walk one day past the end, so a month ending on the last day is known to end ---
+    for first_day, stop_day, events in scheduler_for(state).spans(end_day + 1):
+        advance_state(state, eventful=bool(events))
+        if first_day < end_day:
+            for event in events:
+                if event.event_type == EventType.SolarMarker:
+                    points["markers.day"].append(first_day)
+                    points["markers.kind"].append(marker_kinds.index(event.detail))
+                else:
+                    points[syzygy_keys[(event.event_type, event.source)]].append(first_day)
+        for calendar, calendar_state in calendar_states.items():
+            if not calendar_state:
+                continue
+            if calendar != Calendar.Lunisolar and not calendar_state.started:
+                logs[calendar].observe(first_day, 0, -1, 0)
+            else:
+                logs[calendar].observe(first_day, calendar_state.year + 1, calendar_state.month + 1, calendar_state.day + 1)
+        skip_quiet_days(state, stop_day - first_day - 1)
+
+    labels = []
+    if calendar_spec.include_user_defined_events:
+        hits = sorted(hit for calendar, log in logs.items() for hit in month_events(calendar, log, start_day, end_day, calendar_spec.events))
+        label_index = {}
+        i = 0
+        while i < len(hits):
+            day = hits[i][0]
+            names = []
+            while i < len(hits) and hits[i][0] == day:
+                names.append(hits[i][2])
+                i += 1
+            label = tuple(names)
+            if label not in label_index:
+                label_index[label] = len(labels)
+                labels.append(list(label))
+            points["events.day"].append(day)
+            points["events.label"].append(label_index[label])
+
+    arrays = dict(points)
+    for calendar, log in logs.items():
+        for name, values in log.fields.items():
+            arrays[f"{calendar_name(calendar)}.{name}"] = values
+
+    header = {
+        "spec": spec,
+        "start_day": start_day,
+        "end_day": end_day,
+        "calendars": [calendar_name(calendar) for calendar in logs],
+        "labels": labels,
+        "arrays": {},
+    }
+    offset = 0
+    for name, values in arrays.items():
+        header["arrays"][name] = [values.typecode, offset, len(values)]
+        offset += len(values) * values.itemsize
+        offset += -offset % 8 # keep every array aligned
+    header_bytes = json.dumps(header).encode("utf-8")
+    header_bytes += b" " * (-(len(header_bytes) + len(MAGIC) + 8) % 8)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for values in arrays.values():
+            data = values.tobytes()
+            f.write(data)
+            f.write(b"\0" * (-len(data) % 8))
+
+class TransitionStore:
+    """
+    Read access to a store written by write_store. The file is memory-mapped and every
+    query bisects the stored arrays, so any day costs O(log n) without reading the rest.
+    Phases are not stored: they are a pure function of the day and the periods in the spec.
+    """
+    def __init__(self, path : str):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a calendar transition store")
+        (header_length,) = struct.unpack_from("<Q", self.map, len(MAGIC))
+        data_start = len(MAGIC) + 8 + header_length
+        header = json.loads(bytes(self.map[len(MAGIC) + 8:data_start]))
+        self.spec = header["spec"]
+        self.start_day = header["start_day"]
+        self.end_day = header["end_day"]
+        self.labels = header["labels"]
+        self.calendars = [calendar_named(name) for name in header["calendars"]]
+        self.registry = moon_registry(self.spec)
+
+        view = memoryview(self.map)
+        self.arrays = {}
+        for name, (typecode, offset, count) in header["arrays"].items():
+            size = array(typecode).itemsize
+            start = data_start + offset
+            self.arrays[name] = view[start:start + count * size].cast(typecode)
+
+    @cached_property
+    def calendar_spec(self):
+        """The CalendarSpec of the stored spec, built (and its events file read) the first time a record needs it."""
+        from calendar_gen import calendar_spec_for
+        return calendar_spec_for(self.spec)
+
+    def close(self):
+        self.arrays = {}
+        try:
+            self.map.close()
+        except BufferError:
+            pass # a caller still holds a view; the map closes with the last one
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def check_day(self, day : int):
+        if not self.start_day <= day < self.end_day:
+            raise IndexError(f"Day {day} is outside the stored days [{self.start_day}, {self.end_day})")
+
+    def day_range(self, start : int | None = None, end : int | None = None) -> tuple[int, int]:
+        """[start, end) with None for the first or last stored day; IndexError unless it is within the stored days."""
+        start = self.start_day if start is None else start
+        end = self.end_day if end is None else end
+        if not self.start_day <= start <= end <= self.end_day:
+            raise IndexError(f"Days [{start}, {end}) are outside the stored days [{self.start_day}, {self.end_day})")
+        return start, end
+
+    @staticmethod
+    def contains(values, day : int) -> bool:
+        i = bisect_left(values, day)
+        return i < len(values) and values[i] == day
+
+    def date(self, calendar : Calendar, day : int) -> tuple[int | None, Date | None]:
+        """The (year, Date) of a calendar on a day. Date is None outside every month; year too if the calendar has no date."""
+        self.check_day(day)
+        key = calendar_name(calendar)
+        starts = self.arrays[f"{key}.start"]
+        i = bisect_right(starts, day) - 1
+        year, month = self.arrays[f"{key}.year"][i], self.arrays[f"{key}.month"][i]
+        if month == -1:
+            return None, None
+        if month == 0:
+            return year, None
+        is_last_day = i + 1 < len(starts) and starts[i + 1] == day + 1
+        return year, Date(calendar, year, month, self.arrays[f"{key}.base"][i] + day - starts[i], is_last_day)
+
+    def solar_marker(self, day : int) -> SolarMarker | None:
+        self.check_day(day)
+        days = self.arrays["markers.day"]
+        i = bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            return list(SolarMarker)[self.arrays["markers.kind"][i]]
+        return None
+
+    def syzygy(self, moon : str, day : int) -> str | None:
+        """ "New", "Full" or None for the moon with the given key on a day."""
+        self.check_day(day)
+        if self.contains(self.arrays[f"{moon}.new"], day):
+            return "New"
+        if self.contains(self.arrays[f"{moon}.full"], day):
+            return "Full"
+        return None
+
+    def events(self, day : int) -> list[str]:
+        self.check_day(day)
+        days = self.arrays["events.day"]
+        i = bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            return list(self.labels[self.arrays["events.label"][i]])
+        return []
+
+    def record(self, day : int) -> DayRecord:
+        """The DayRecord of a day, as build_record would have produced it."""
+        self.check_day(day)
+        spec = self.spec
+        record = DayRecord(day, self.calendar_spec)
+        moons = self.registry.enabled
+        if spec["include_lunar_phases"] and moons:
+            record.moons = moons
+            record.moon_phases = [phase(day + 1, moon.synodic_month) for moon in moons]
+            record.moon_phase_names = [quantize_phase(p) for p in record.moon_phases]
+            if len(moons) >= 2:
+                new = full = 0
+                for i, moon in enumerate(moons):
+                    syzygy = self.syzygy(moon.key, day)
+                    if syzygy == "New":
+                        new |= 1 << i
+                    elif syzygy == "Full":
+                        full |= 1 << i
+                record.moons_aligned = alignment_name(tuple(moon.name for moon in moons), new, full)
+        if spec["include_solar_phases"]:
+            record.solar_phase = phase(day + 1, spec["astronomical_year"])
+            record.solar_marker = self.solar_marker(day)
+        for calendar in self.calendars:
+            year, date = self.date(calendar, day)
+            if calendar == Calendar.Solar:
+                record.solar_year, record.solar_date = year, date
+            elif calendar == Calendar.Lunisolar:
+                record.lunisolar_date = date
+            else:
+                record.lunar_dates.append((self.registry.find_calendar(calendar)[1], date))
+        if spec["include_user_defined_events"]:
+            record.events = self.events(day)
+        return record
+
+    def records(self, start : int | None = None, end : int | None = None):
+        """Lazily yield the DayRecord of every day in [start, end), by default every stored day."""
+        start, end = self.day_range(start, end)
+        for day in range(start, end):
+            yield self.record(day)
+
+def expand_store(path : str, output_file : str, start : int | None = None, end : int | None = None, compression : str | None = None):
+    """Write the days [start, end) of a store as CSV, exactly as generate writes them, compressed with `compression` if given."""
+    from calendar_gen import headers, format_row
+    from output_files import open_output
+    with TransitionStore(path) as store:
+        # checked before the output is opened, so a bad range leaves any file at output_file alone
+        start, end = store.day_range(start, end)
+        columns = headers(store.registry)
+        with open_output(output_file, compression) as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(format_row(record, columns) for record in store.records(start, end))
@@ -1,5 +1,8 @@
-from calendars.date import AnnualDate, Date
+import csv
+import json
+from calendars.date import AnnualDate, Date, LAST_DAY
 from calendars.enums import Calendar
+from moon_registry import calendar_named
 
 USER_DEFINED_EVENTS : dict[str, AnnualDate] = {
     "Traditional Lunar New Year": AnnualDate(Calendar.LunarA, 1, 2),
@@ -9,9 +12,66 @@ USER_DEFINED_EVENTS : dict[str, AnnualDate] = {
     "New Year's Day": AnnualDate(Calendar.Solar, 1, 1),
 }
 
-def compute_user_defined_events(row : dict[str, str], dates : list[Date]):
-    row["User_Defined_Events"] = ""
-    for event, date in USER_DEFINED_EVENTS.items():
-        for comp_date in dates:
-            if date.matches(comp_date):
-                row["User_Defined_Events"] += f", {event}" if row["User_Defined_Events"] else event
\ No newline at end of file
+class EventIndex:
+    """
+    Events hashed by (Calendar, month, day), so matching a date costs one lookup
+    (two on the last day of a month) no matter how many events there are.
+    Matches come back in the order the events were defined.
+    """
+    def __init__(self, events):
+        self.by_key : dict[tuple[Calendar, int, int], list[tuple[int, str, AnnualDate]]] = {}
+        self.size = 0
+        for order, (name, date) in enumerate(events):
+            self.by_key.setdefault((date.calendar, date.month, date.day), []).append((order, name, date))
+            self.size += 1
+        self.calendars = {calendar for calendar, _, _ in self.by_key}
+
+    def match(self, calendar : Calendar, year : int, month : int, day : int, is_last_day : bool = False) -> list[tuple[int, str]]:
+        hits = []
+        for key in ((calendar, month, day), (calendar, month, LAST_DAY)) if is_last_day else ((calendar, month, day),):
+            for order, name, date in self.by_key.get(key, ()):
+                if date.occurs_in(year):
+                    hits.append((order, name))
+        return hits
+
+    def matching(self, dates : list[Date]) -> list[str]:
+        hits = []
+        for date in dates:
+            if date.calendar in self.calendars:
+                hits.extend(self.match(date.calendar, date.year, date.month, date.day, date.is_last_day))
+        if len(hits) > 1:
+            hits.sort()
+        return [name for _, name in hits]
+
+def parse_event(entry : dict) -> tuple[str, AnnualDate]:
+    day = entry["day"]
+    day = LAST_DAY if str(day).strip().lower() == "last" else int(day)
+
+    def optional_int(key):
+        value = entry.get(key)
+        return int(value) if value not in (None, "") else None
+
+    # lunar calendars of a profile's own moons are named by it, so unknown names are checked once the moons are known
+    calendar = calendar_named(str(entry["calendar"]).strip())
+    every_years = optional_int("every_years") or 1
+    date = AnnualDate(calendar, int(entry["month"]), day, every_years, optional_int("first_year"), optional_int("last_year"))
+    return str(entry["name"]), date
+
+def load_events(path : str) -> list[tuple[str, AnnualDate]]:
+    """
+    Load events from a .json or .csv file. JSON is a list of objects (or an object keyed by
+    event name); CSV has a header row. Fields: name, calendar (Solar, Lunisolar, LunarA, LunarB or
+    the name of a lunar calendar of the profile's moons), month, day (a number or "last") and
+    optionally every_years, first_year, last_year.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            entries = list(csv.DictReader(f))
+        else:
+            entries = json.load(f)
+    if isinstance(entries, dict):
+        entries = [{"name": name, **fields} for name, fields in entries.items()]
+    try:
+        return [parse_event(entry) for entry in entries]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid event in {path}: missing or malformed field {e}")
@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from calendar_gen import generate_calendar
+
+# --- the keys of a job besides id, profile and output: generate_calendar's run options ---
+JOB_OPTIONS = (
+    "start_day", "end_day", "engine", "output_format", "workers", "keep_shards", "cache",
+    "checkpoint_every", "resume", "compression", "shard_rows", "shard_years",
+)
+
+def job_config(job : dict, defaults : dict, load_profile) -> dict:
+    """The settings of a job: defaults, overlaid with its profile (a settings object or a profile file) and its output path."""
+    unknown = set(job) - {"id", "profile", "output"} - set(JOB_OPTIONS)
+    if unknown:
+        raise ValueError(f"Unknown job keys: {sorted(unknown)}")
+    config = dict(defaults)
+    profile = job.get("profile") or {}
+    config.update(load_profile(profile) if isinstance(profile, str) else profile)
+    if "output" in job:
+        config["output_file"] = job["output"]
+    config["interactive"] = False
+    return config
+
+def run_job(job : dict, defaults : dict, load_profile) -> dict:
+    """
+    Run one job, returning its result: {"id", "status": "ok", "written", "days", "seconds"}, or
+    {"id", "status": "error", "error"} if it failed. What generation prints goes to stderr.
+    """
+    start = time.perf_counter()
+    try:
+        config = job_config(job, defaults, load_profile)
+        options = {key: job[key] for key in JOB_OPTIONS if key in job}
+        with redirect_stdout(sys.stderr):
+            written = generate_calendar(**config, **options)
+    except Exception as e:
+        return {"id": job.get("id"), "status": "error", "error": str(e) or type(e).__name__}
+    end_day = options.get("end_day")
+    days = (config["sim_days"] if end_day is None else end_day) - options.get("start_day", 0)
+    return {"id": job.get("id"), "status": "ok", "written": written, "days": days, "seconds": round(time.perf_counter() - start, 6)}
+
+def run_lines(lines, defaults : dict, load_profile, emit):
+    """Run the job on each non-blank JSON line, emitting its result (a line that isn't JSON gets an error result)."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("A job must be a JSON object.")
+        except ValueError as e:
+            emit({"id": None, "status": "error", "error": f"Invalid job: {e}"})
+            continue
+        emit(run_job(job, defaults, load_profile))
+
+def claim(path : str) -> str | None:
+    """Rename a spool file to mark it as taken, or None if another worker got to it first."""
+    working = path + ".working"
+    try:
+        os.rename(path, working)
+    except FileNotFoundError:
+        return None
+    return working
+
+def run_spool(directory : str, defaults : dict, load_profile, emit, poll_seconds : float = 1.0, drain : bool = False):
+    """
+    Run the jobs of every *.jsonl file dropped into directory, oldest name first. Each file is
+    claimed by renaming it to *.jsonl.working, so several workers can share a spool, and is
+    renamed to *.jsonl.done once its jobs have run. Producers should write a file under another
+    name and rename it to *.jsonl when it is complete. Waits poll_seconds between looks at an
+    empty spool, or with drain returns once it is empty.
+    """
+    while True:
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+        for name in names:
+            working = claim(os.path.join(directory, name))
+            if working is None:
+                continue
+            with open(working, "r", encoding="utf-8") as f:
+                run_lines(f, defaults, load_profile, emit)
+            os.replace(working, os.path.join(directory, name + ".done"))
+        if not names:
+            if drain:
+                return
+            time.sleep(poll_seconds)